@@ -24,6 +24,24 @@ class ProfileService {
     });
   }
 
+  /**
+   * Method: subscribeToRealtimeWeather
+   * Description: Opens a Server-Sent Events subscription to the realtime weather of a location.
+   *              The server pushes every update, so there is no need to poll.
+   * @param {string} location_name - The name of the location to subscribe to
+   * @param {function} onForecast - Called with each forecast object pushed by the server
+   * @returns {EventSource} The open subscription, call close() on it to unsubscribe
+   */
+  static subscribeToRealtimeWeather(location_name, onForecast) {
+    const url = new URL(API_URL + "/realtime/subscribe");
+    url.searchParams.set("location_name", location_name);
+    const source = new EventSource(url);
+    source.addEventListener("forecast", (event) => {
+      onForecast(JSON.parse(event.data));
+    });
+    return source;
+  }
+
   /**
    * Method: getUserProfile
    * Description: Sends a GET request to the API endpoint to retrieve user profile information.
@@ -6,12 +6,12 @@ import uuid
 from typing import Annotated, Any, Union
 from fastapi import Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from jose import JWTError, jwt
 from datetime import datetime, timedelta, timezone
 from fastapi.security import OAuth2PasswordBearer
 
 import crud
-from models.token_blocklist import TokenBlocklist
+from cache import principal_cache
+from models.token_blocklist import blocklist_index
 import schemas
 from database import get_db
 from models.user import Hasher, User
@@ -37,8 +37,14 @@ blocklisted_token_exception = HTTPException(
     headers={"WWW-Authenticate": "Bearer"},
 )
 
+hashing_pool_saturated_exception = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="Too many password changes in progress, please retry shortly.",
+    headers={"Retry-After": "1"},
+)
+
 
-def authenticate_user(db: Session, phone: str, password: str):
+async def authenticate_user(db: Session, phone: str, password: str):
     """
     Authenticates a user by checking if the provided phone and password
       match a user in the database.
@@ -51,11 +57,14 @@ def authenticate_user(db: Session, phone: str, password: str):
     Returns:
         Union[User, bool]: The authenticated user if the phone and password match,
           False otherwise.
+
+    Raises:
+        HashingPoolSaturated: If too many password checks are already in progress.
     """
     user = crud.get_user_by_phone(db, phone)
     if not user:
         return False
-    if not Hasher.verify_password(password, user.password):
+    if not await Hasher.averify_password(password, user.password):
         return False
     return user
 
@@ -80,6 +89,8 @@ def create_access_token(
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=30)
     to_encode.update({"exp": expire, "jti": str(uuid.uuid4())})
+    from jose import jwt
+
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -104,6 +115,8 @@ def create_refresh_token(
     else:
         expire = datetime.now(timezone.utc) + timedelta(days=1)
     to_encode.update({"exp": expire, "jti": str(uuid.uuid4())})
+    from jose import jwt
+
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -114,6 +127,9 @@ async def get_current_user(
     """
     Retrieves the current user based on the provided token.
 
+    Users are cached for a short TTL per (sub, jti), so repeated requests
+    with the same token do not query the database.
+
     Args:
         token (str): The authentication token.
         db (Session, optional): The database session. Defaults to Depends(get_db).
@@ -124,11 +140,13 @@ async def get_current_user(
     Raises:
         credentials_exception: If the token is invalid or the user does not exist.
     """
+    from jose import JWTError, jwt
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=ALGORITHM)
         # check if token is blacklisted
         jti: str = payload.get("jti", None)
-        if TokenBlocklist.is_jti_blocklisted(jti, db):
+        if blocklist_index.is_blocklisted(jti, db):
             raise blocklisted_token_exception
         username: Any | None = payload.get("sub")
         if username is None:
@@ -136,7 +154,24 @@ async def get_current_user(
         token_data = schemas.TokenData(username=username)
     except JWTError:
         raise credentials_exception
+    principal_key = (username, jti)
+    user = principal_cache.get(principal_key)
+    if user is not None:
+        return user
     user = crud.get_user_by_phone(db, phone=username)
     if user is None:
         raise credentials_exception
+    principal_cache.set(principal_key, _detached_copy(user), tag=user.user_id)
     return user
+
+
+def _detached_copy(user: User) -> User:
+    """
+    Copy a user's columns into a new instance bound to no session.
+
+    Cached principals outlive the session they were loaded in, so they must
+    not be expired by that session's commits.
+    """
+    return User(
+        **{column.name: getattr(user, column.name) for column in User.__table__.columns}
+    )
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+
+"""Generate a synthetic weather dataset and benchmark the service's lookups on it.
+
+`generate` bulk-loads locations, forecasts and historical reports, with COPY
+on PostgreSQL and batched inserts on SQLite. Forecasts are spread evenly over
+the locations and over the days from `--days` ago to five days ahead, each
+issued up to five days before the period it covers. Reports cover the past
+days only, with at most one per location and day.
+
+`bench` runs the lookups the forecast endpoints make, for a random sample of
+the generated locations, and reports their latency percentiles.
+
+Example usage from the repository root:
+```bash
+python -m migrate
+python -m benchmarks.dataset generate --locations 100000 --forecasts 10000000 \
+    --reports 2000000 --days 90
+python -m benchmarks.dataset bench --samples 500
+```
+"""
+
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from sqlalchemy import create_engine, func, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+LOCATION_COLUMNS = (
+    "location_id",
+    "name",
+    "latitude",
+    "longitude",
+    "city_name",
+    "country",
+    "location_type",
+)
+WEATHER_COLUMNS = (
+    "location_id",
+    "date_time",
+    "start_time",
+    "end_time",
+    "temperature",
+    "humidity",
+    "wind_speed",
+    "precipitation_probability",
+)
+# Forecasts reach this many days past the generation date, like Tomorrow.io's.
+FORECAST_DAYS_AHEAD = 5
+COUNTRIES = ("KE", "UG", "TZ", "RW", "ET", "NG", "GH", "ZA")
+
+
+def make_engine(database_url: str) -> Engine:
+    """Create an engine for the target database."""
+    if database_url.startswith("postgres://"):
+        database_url = database_url.replace("postgres://", "postgresql://", 1)
+    return create_engine(database_url)
+
+
+def location_rows(
+    count: int, first_id: int, generator: random.Random
+) -> Iterator[tuple]:
+    """Generate locations named "synthetic-<n>" with random coordinates."""
+    for number in range(count):
+        location_id = first_id + number
+        yield (
+            location_id,
+            f"synthetic-{location_id}",
+            round(generator.uniform(-35, 37), 6),
+            round(generator.uniform(-17, 51), 6),
+            f"Synthetic City {location_id}",
+            generator.choice(COUNTRIES),
+            "city",
+        )
+
+
+def weather_rows(
+    count: int,
+    location_ids: range,
+    days: list[datetime],
+    generator: random.Random,
+    issued_days_before: int,
+) -> Iterator[tuple]:
+    """
+    Generate daily weather rows spread evenly over locations and days.
+
+    Args:
+        count (int): The number of rows.
+        location_ids (range): The locations the rows belong to.
+        days (list[datetime]): The start of every day covered.
+        generator (random.Random): The source of randomness.
+        issued_days_before (int): How many days before its period a row may
+          have been issued, 0 for reports issued at the end of the period.
+
+    Yields:
+        tuple: The values of `WEATHER_COLUMNS`.
+    """
+    for number in range(count):
+        location_id = location_ids[number % len(location_ids)]
+        start = days[(number // len(location_ids)) % len(days)]
+        end = start + timedelta(days=1)
+        if issued_days_before:
+            issued = start - timedelta(
+                hours=generator.uniform(0, 24 * issued_days_before)
+            )
+        else:
+            issued = end
+        # A seasonal baseline per location, with day to day noise.
+        baseline = 18 + (location_id % 17)
+        yield (
+            location_id,
+            issued,
+            start,
+            end,
+            round(baseline + generator.gauss(0, 3), 2),
+            round(min(100, max(5, generator.gauss(65, 15))), 2),
+            round(abs(generator.gauss(4, 2)), 2),
+            round(min(100, max(0, generator.gauss(30, 25))), 2),
+        )
+
+
+def bulk_load(
+    engine: Engine,
+    table: str,
+    columns: tuple[str, ...],
+    rows: Iterable[tuple],
+    batch_size: int,
+) -> int:
+    """
+    Load rows into a table, with COPY on PostgreSQL and batched inserts otherwise.
+
+    Returns:
+        int: The number of rows loaded.
+    """
+    loaded = 0
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        if engine.dialect.name == "sqlite":
+            cursor.execute("PRAGMA synchronous=OFF")
+            rows = (tuple(map(_sqlite_value, row)) for row in rows)
+        placeholders = ", ".join(
+            ["%s" if engine.dialect.name != "sqlite" else "?"] * len(columns)
+        )
+        insert = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                _load_batch(engine, cursor, table, columns, insert, batch)
+                connection.commit()
+                loaded += len(batch)
+                batch = []
+        if batch:
+            _load_batch(engine, cursor, table, columns, insert, batch)
+            connection.commit()
+            loaded += len(batch)
+    finally:
+        connection.close()
+    return loaded
+
+
+def _sqlite_value(value):
+    # SQLite compares timestamps as text, store them the way SQLAlchemy does.
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S.%f")
+    return value
+
+
+def _load_batch(engine, cursor, table, columns, insert, batch) -> None:
+    if engine.dialect.name == "postgresql":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(batch)
+        buffer.seek(0)
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+    else:
+        cursor.executemany(insert, batch)
+
+
+def generate(args: argparse.Namespace) -> dict:
+    """Generate and load the dataset described by the command line."""
+    engine = make_engine(args.database_url)
+    generator = random.Random(args.seed)
+    with engine.connect() as connection:
+        first_id = (
+            connection.execute(text("SELECT MAX(location_id) FROM location")).scalar()
+            or 0
+        ) + 1
+    location_ids = range(first_id, first_id + args.locations)
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    past_days = [today - timedelta(days=day) for day in range(args.days, 0, -1)]
+    forecast_days = past_days + [
+        today + timedelta(days=day) for day in range(FORECAST_DAYS_AHEAD + 1)
+    ]
+
+    report = {}
+    started = time.perf_counter()
+    report["location"] = bulk_load(
+        engine,
+        "location",
+        LOCATION_COLUMNS,
+        location_rows(args.locations, first_id, generator),
+        args.batch_size,
+    )
+    report["weather_forecast"] = bulk_load(
+        engine,
+        "weather_forecast",
+        WEATHER_COLUMNS,
+        weather_rows(
+            args.forecasts,
+            location_ids,
+            forecast_days,
+            generator,
+            FORECAST_DAYS_AHEAD,
+        ),
+        args.batch_size,
+    )
+    report["weather_reports"] = bulk_load(
+        engine,
+        "weather_reports",
+        WEATHER_COLUMNS,
+        weather_rows(
+            min(args.reports, len(location_ids) * len(past_days)),
+            location_ids,
+            past_days,
+            generator,
+            0,
+        ),
+        args.batch_size,
+    )
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as connection:
+            for table, key in (
+                ("location", "location_id"),
+                ("weather_forecast", "forecast_id"),
+                ("weather_reports", "report_id"),
+            ):
+                connection.execute(
+                    text(
+                        f"SELECT setval(pg_get_serial_sequence('{table}', '{key}'), "
+                        f"COALESCE((SELECT MAX({key}) FROM {table}), 1))"
+                    )
+                )
+                connection.execute(text(f"ANALYZE {table}"))
+    seconds = time.perf_counter() - started
+    rows = sum(report.values())
+    report["seconds"] = round(seconds, 2)
+    report["rows_per_second"] = round(rows / seconds) if seconds else 0
+    return report
+
+
+async def bench(args: argparse.Namespace) -> dict:
+    """Time the service's lookups for a sample of the synthetic locations."""
+    import models.location
+    from services.weather_service import (
+        is_forecast_cached,
+        query_forecast_validator,
+        query_weather_forecast,
+        stream_forecast_rows,
+    )
+
+    engine = make_engine(args.database_url)
+    generator = random.Random(args.seed)
+    db = Session(bind=engine)
+    Location = models.location.Location
+    low, high = (
+        db.query(func.min(Location.location_id), func.max(Location.location_id))
+        .filter(Location.name.like("synthetic-%"))
+        .one()
+    )
+    if low is None:
+        raise SystemExit("No synthetic locations found, run `generate` first")
+    names = [
+        f"synthetic-{generator.randint(low, high)}" for _ in range(args.samples)
+    ]
+    timings: dict[str, list[float]] = {
+        "get_or_create_location": [],
+        "query_forecast_validator": [],
+        "query_weather_forecast.5d": [],
+        "stream_forecast_rows": [],
+    }
+    upstream_fallbacks = 0
+    try:
+        for name in names:
+            started = time.perf_counter()
+            location = await models.location.get_or_create_location(name, db)
+            timings["get_or_create_location"].append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            _, periods = query_forecast_validator(location, db, "5d")
+            timings["query_forecast_validator"].append(time.perf_counter() - started)
+
+            # Only time the lookups served from the database, not upstream calls.
+            if is_forecast_cached(periods, "5d"):
+                started = time.perf_counter()
+                await query_weather_forecast(location, db, "5d")
+                timings["query_weather_forecast.5d"].append(
+                    time.perf_counter() - started
+                )
+            else:
+                upstream_fallbacks += 1
+
+            started = time.perf_counter()
+            for _ in stream_forecast_rows(db, location_id=location.location_id):
+                pass
+            timings["stream_forecast_rows"].append(time.perf_counter() - started)
+            db.rollback()
+    finally:
+        db.close()
+
+    report = {"samples": args.samples, "upstream_fallbacks": upstream_fallbacks}
+    for lookup, samples in timings.items():
+        if not samples:
+            continue
+        samples.sort()
+        report[lookup] = {
+            "p50_ms": round(samples[len(samples) // 2] * 1000, 3),
+            "p95_ms": round(
+                samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 3
+            ),
+            "mean_ms": round(statistics.fmean(samples) * 1000, 3),
+        }
+    return report
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Generate a synthetic dataset or benchmark the lookups on it."""
+    from config import settings
+
+    parser = argparse.ArgumentParser(description="Synthetic weather dataset.")
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--seed", type=int, default=0)
+    commands = parser.add_subparsers(dest="command", required=True)
+    generate_parser = commands.add_parser("generate", help="Load a synthetic dataset.")
+    generate_parser.add_argument("--locations", type=int, default=1000)
+    generate_parser.add_argument("--forecasts", type=int, default=100_000)
+    generate_parser.add_argument("--reports", type=int, default=100_000)
+    generate_parser.add_argument(
+        "--days", type=int, default=30, help="Days of history to cover."
+    )
+    generate_parser.add_argument("--batch-size", type=int, default=10_000)
+    bench_parser = commands.add_parser("bench", help="Time the service's lookups.")
+    bench_parser.add_argument("--samples", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        report = generate(args)
+    else:
+        report = asyncio.run(bench(args))
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
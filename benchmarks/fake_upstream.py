@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+
+"""A local stand-in for the Tomorrow.io and OpenWeatherMap APIs.
+
+Serves payloads shaped like `v4/weather/realtime`, `v4/weather/forecast`,
+`v4/weather/history/recent` and `geo/1.0/direct`, with a configurable latency
+distribution, error rate and periodic bursts of 429 responses. Calls are
+counted per endpoint and status under `GET /_stats`, and reset with
+`POST /_reset`.
+
+Example usage from the repository root:
+```bash
+python -m benchmarks.fake_upstream --port 9000 --latency-ms 120 --error-rate 0.01
+```
+Then start the app with `TOMORROW_IO_BASE_URL` and `OPENWEATHERMAP_BASE_URL`
+set to `http://127.0.0.1:9000`.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import random
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+
+@dataclass
+class UpstreamProfile:
+    """
+    How the stand-in behaves.
+
+    Attributes:
+        latency_ms (float): The median latency of a response.
+        latency_sigma (float): The spread of the log-normal latency distribution,
+          0 for a constant latency.
+        error_rate (float): The share of requests answered with a 500.
+        burst_every (float): Seconds between the starts of two 429 bursts, 0 to
+          disable them.
+        burst_seconds (float): How long each 429 burst lasts.
+    """
+
+    latency_ms: float = 100.0
+    latency_sigma: float = 0.5
+    error_rate: float = 0.0
+    burst_every: float = 0.0
+    burst_seconds: float = 5.0
+
+    def latency(self) -> float:
+        """Draw the latency of a response, in seconds."""
+        if self.latency_ms <= 0:
+            return 0.0
+        if self.latency_sigma <= 0:
+            return self.latency_ms / 1000
+        return random.lognormvariate(0, self.latency_sigma) * self.latency_ms / 1000
+
+    def in_burst(self, elapsed: float) -> bool:
+        """Tell whether the upstream is rate limiting every request right now."""
+        if self.burst_every <= 0:
+            return False
+        return elapsed % self.burst_every < self.burst_seconds
+
+
+def _seed(*parts) -> random.Random:
+    """A random generator that is stable for the same location."""
+    digest = hashlib.sha1(":".join(map(str, parts)).encode()).digest()
+    return random.Random(int.from_bytes(digest[:8], "big"))
+
+
+def _values(generator: random.Random, suffix: str = "") -> dict:
+    return {
+        f"temperature{suffix}": round(generator.uniform(5, 38), 2),
+        f"humidity{suffix}": round(generator.uniform(20, 100), 2),
+        f"windSpeed{suffix}": round(generator.uniform(0, 15), 2),
+        f"precipitationProbability{suffix}": round(generator.uniform(0, 100), 2),
+    }
+
+
+def realtime_payload(location: str, now: datetime) -> dict:
+    """Build a payload shaped like Tomorrow.io's realtime weather."""
+    generator = _seed(location, now.strftime("%Y%m%d%H"))
+    return {
+        "data": {
+            "time": now.strftime("%Y-%m-%dT%H:%M:00Z"),
+            "values": _values(generator),
+        },
+        "location": {"lat": location.split(",")[0], "lon": location.split(",")[-1]},
+    }
+
+
+def forecast_payload(
+    location: str, now: datetime, days: int = 6, first_day: int = 0
+) -> dict:
+    """Build a payload shaped like Tomorrow.io's daily forecast, or history."""
+    today = now.replace(hour=3, minute=0, second=0, microsecond=0)
+    daily = []
+    for offset in range(first_day, first_day + days):
+        start = today + timedelta(days=offset)
+        generator = _seed(location, start.date())
+        daily.append(
+            {
+                "time": start.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "values": _values(generator, "Avg"),
+            }
+        )
+    return {"timelines": {"daily": daily}, "location": {}}
+
+
+def geocode_payload(name: str) -> list:
+    """Build a payload shaped like OpenWeatherMap's direct geocoding."""
+    generator = _seed(name.lower())
+    return [
+        {
+            "name": name.title(),
+            "lat": round(generator.uniform(-35, 35), 4),
+            "lon": round(generator.uniform(-20, 50), 4),
+            "country": "KE",
+        }
+    ]
+
+
+def create_app(profile: UpstreamProfile) -> FastAPI:
+    """Build the stand-in application for a profile."""
+    app = FastAPI(title="Fake upstream")
+    calls: Counter = Counter()
+    started = time.monotonic()
+
+    async def respond(endpoint: str, build) -> JSONResponse:
+        await asyncio.sleep(profile.latency())
+        if profile.in_burst(time.monotonic() - started):
+            status = 429
+        elif random.random() < profile.error_rate:
+            status = 500
+        else:
+            status = 200
+        calls[(endpoint, status)] += 1
+        if status == 429:
+            return JSONResponse(
+                {"code": 429001, "message": "Rate limit exceeded"},
+                status_code=429,
+                headers={"Retry-After": str(int(profile.burst_seconds))},
+            )
+        if status == 500:
+            return JSONResponse({"message": "Internal error"}, status_code=500)
+        return JSONResponse(build())
+
+    @app.get("/v4/weather/realtime")
+    async def realtime(location: str):
+        now = datetime.now(timezone.utc)
+        return await respond("realtime", lambda: realtime_payload(location, now))
+
+    @app.get("/v4/weather/forecast")
+    async def forecast(location: str):
+        now = datetime.now(timezone.utc)
+        return await respond("forecast", lambda: forecast_payload(location, now))
+
+    @app.get("/v4/weather/history/recent")
+    async def history(location: str):
+        now = datetime.now(timezone.utc)
+        return await respond(
+            "history",
+            lambda: forecast_payload(location, now, days=1, first_day=-1),
+        )
+
+    @app.get("/geo/1.0/direct")
+    async def geocode(q: str):
+        return await respond("geocode", lambda: geocode_payload(q))
+
+    @app.get("/_stats")
+    async def stats():
+        totals: Counter = Counter()
+        by_status: dict[str, dict[str, int]] = {}
+        for (endpoint, status), count in calls.items():
+            totals[endpoint] += count
+            by_status.setdefault(endpoint, {})[str(status)] = count
+        return {"calls": dict(totals), "by_status": by_status}
+
+    @app.post("/_reset")
+    async def reset():
+        calls.clear()
+        return {}
+
+    return app
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Serve the stand-in."""
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve a fake weather upstream.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=100.0)
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--burst-every", type=float, default=0.0)
+    parser.add_argument("--burst-seconds", type=float, default=5.0)
+    args = parser.parse_args(argv)
+
+    profile = UpstreamProfile(
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate,
+        burst_every=args.burst_every,
+        burst_seconds=args.burst_seconds,
+    )
+    uvicorn.run(
+        create_app(profile), host=args.host, port=args.port, log_level="warning"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+
+"""Drive the forecast endpoints with a realistic mix of locations.
+
+Locations are drawn from a Zipf-like distribution, so a few popular cities
+receive most of the traffic while a long tail keeps missing the caches.
+Reports throughput, p50/p95/p99 latency per endpoint and the number of calls
+the app made to the upstream stand-in.
+
+Example usage from the repository root, starting the fake upstream and the
+app on a throwaway SQLite database:
+```bash
+python -m benchmarks.load --spawn --duration 30 --concurrency 32
+```
+Or against servers that are already running:
+```bash
+python -m benchmarks.load --target http://127.0.0.1:8000 \
+    --upstream http://127.0.0.1:9000
+```
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import httpx
+
+# Relative weights of the endpoints in the traffic mix.
+ENDPOINTS = {
+    "/api/v1/current_weather": 60,
+    "/api/v1/five-day_weather": 25,
+    "/api/v1/weather_and_recommendations/current_weather": 15,
+}
+
+
+def location_mix(count: int, skew: float = 1.1) -> tuple[list[str], list[float]]:
+    """
+    Build the names and weights of `count` locations following Zipf's law.
+
+    Args:
+        count (int): The number of distinct locations.
+        skew (float, optional): The Zipf exponent. Defaults to 1.1.
+
+    Returns:
+        tuple[list[str], list[float]]: The location names and their weights.
+    """
+    names = [f"city-{rank:04d}" for rank in range(1, count + 1)]
+    weights = [1 / rank**skew for rank in range(1, count + 1)]
+    return names, weights
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    """Return a percentile of sorted samples, by the nearest-rank method."""
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, max(0, round(fraction * len(samples)) - 1))
+    return samples[index]
+
+
+async def run_load(
+    target: str,
+    duration: float,
+    concurrency: int,
+    locations: int,
+    seed: int = 0,
+) -> dict:
+    """
+    Send requests from `concurrency` clients for `duration` seconds.
+
+    Args:
+        target (str): The base URL of the app.
+        duration (float): How long to send requests, in seconds.
+        concurrency (int): The number of concurrent clients.
+        locations (int): The number of distinct locations requested.
+        seed (int, optional): Seed of the traffic mix. Defaults to 0.
+
+    Returns:
+        dict: Throughput, latency percentiles and status codes per endpoint.
+    """
+    generator = random.Random(seed)
+    names, weights = location_mix(locations)
+    endpoints = list(ENDPOINTS)
+    endpoint_weights = list(ENDPOINTS.values())
+    latencies: dict[str, list[float]] = {endpoint: [] for endpoint in endpoints}
+    statuses: dict[str, Counter] = {endpoint: Counter() for endpoint in endpoints}
+    deadline = time.perf_counter() + duration
+
+    async def client(http: httpx.AsyncClient) -> None:
+        while time.perf_counter() < deadline:
+            endpoint = generator.choices(endpoints, endpoint_weights)[0]
+            name = generator.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                response = await http.get(endpoint, params={"location_name": name})
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies[endpoint].append(time.perf_counter() - started)
+            statuses[endpoint][status] += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    started = time.perf_counter()
+    async with httpx.AsyncClient(base_url=target, timeout=30, limits=limits) as http:
+        await asyncio.gather(*(client(http) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    report = {"duration_s": round(elapsed, 2), "concurrency": concurrency}
+    every = sorted(sample for samples in latencies.values() for sample in samples)
+    report["total"] = _summary(every, elapsed, sum(statuses.values(), Counter()))
+    report["endpoints"] = {
+        endpoint: _summary(sorted(latencies[endpoint]), elapsed, statuses[endpoint])
+        for endpoint in endpoints
+    }
+    return report
+
+
+def _summary(samples: list[float], elapsed: float, statuses: Counter) -> dict:
+    return {
+        "requests": len(samples),
+        "throughput_rps": round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(samples, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 1),
+        "statuses": dict(statuses),
+    }
+
+
+def _free_ports(count: int) -> list[int]:
+    """Find distinct free ports, holding each until all are found."""
+    probes = [socket.socket() for _ in range(count)]
+    try:
+        for probe in probes:
+            probe.bind(("127.0.0.1", 0))
+        return [probe.getsockname()[1] for probe in probes]
+    finally:
+        for probe in probes:
+            probe.close()
+
+
+def _wait_until_up(url: str, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.05)
+    raise TimeoutError(f"{url} did not come up in time")
+
+
+@contextmanager
+def spawn_servers(upstream_args: list[str], workers: int, concurrency: int):
+    """
+    Start the fake upstream and the app, on a throwaway SQLite database.
+
+    The connection pool is sized for `concurrency`: a request holds its
+    connection while it awaits the upstream, and a worker whose pool is
+    exhausted blocks its event loop until a connection is released.
+
+    Yields:
+        tuple[str, str]: The base URLs of the app and of the fake upstream.
+    """
+    upstream_port, app_port = _free_ports(2)
+    upstream = f"http://127.0.0.1:{upstream_port}"
+    directory = tempfile.mkdtemp(prefix="forecast-planner-load-")
+    env = {
+        **os.environ,
+        "SECRET_KEY": os.getenv("SECRET_KEY", "load-test"),
+        "DATABASE_URL": f"sqlite:///{directory}/load.db",
+        "TOMORROW_IO_BASE_URL": upstream,
+        "OPENWEATHERMAP_BASE_URL": upstream,
+        "LOGIN_THROTTLE_PATH": f"{directory}/throttle.db",
+        "DATABASE_POOL_SIZE": str(concurrency),
+    }
+    subprocess.run(
+        [sys.executable, "-m", "migrate"],
+        env=env,
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.fake_upstream"]
+            + ["--port", str(upstream_port)]
+            + upstream_args,
+            env=env,
+        ),
+        subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--log-level", "warning"]
+            + ["--port", str(app_port), "--workers", str(workers)],
+            env=env,
+        ),
+    ]
+    try:
+        _wait_until_up(f"{upstream}/_stats")
+        _wait_until_up(f"http://127.0.0.1:{app_port}/openapi.json")
+        yield f"http://127.0.0.1:{app_port}", upstream
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run the load test and print the report as JSON."""
+    parser = argparse.ArgumentParser(description="Load test the forecast endpoints.")
+    parser.add_argument("--target", default="http://127.0.0.1:8000")
+    parser.add_argument("--upstream", default="http://127.0.0.1:9000")
+    parser.add_argument("--spawn", action="store_true")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--locations", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--upstream-args",
+        default="",
+        help='Options of the spawned fake upstream, e.g. "--error-rate 0.02"',
+    )
+    args = parser.parse_args(argv)
+
+    def run(target: str, upstream: str) -> dict:
+        httpx.post(f"{upstream}/_reset")
+        report = asyncio.run(
+            run_load(target, args.duration, args.concurrency, args.locations, args.seed)
+        )
+        report["upstream"] = httpx.get(f"{upstream}/_stats").json()
+        return report
+
+    if args.spawn:
+        with spawn_servers(
+            args.upstream_args.split(), args.workers, args.concurrency
+        ) as urls:
+            report = run(*urls)
+    else:
+        report = run(args.target, args.upstream)
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+
+"""Micro-benchmarks of the hot functions, with regression gates.
+
+Each benchmark is timed over several repeats of a calibrated number of calls,
+and reported as the median and best time per call. Results are saved as JSON
+and compared with a stored baseline; the comparison fails when a benchmark's
+best time is slower than its baseline by more than the tolerance. The best
+time is compared because it is the least sensitive to other load on the host.
+
+Example usage from the repository root:
+```bash
+python -m benchmarks.micro run --save benchmarks/baselines/micro.json
+python -m benchmarks.micro compare benchmarks/baselines/micro.json --tolerance 0.3
+```
+Baselines are only comparable on the machine that recorded them.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+PAYLOADS = Path(__file__).parent / "payloads"
+
+# Maps a benchmark name to a function building its (sync or async) workload.
+BENCHMARKS: dict[str, Callable[[], Callable]] = {}
+
+
+def benchmark(name: str):
+    """Register a function that sets up a benchmark and returns its workload."""
+
+    def register(setup: Callable[[], Callable]) -> Callable[[], Callable]:
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+def _memory_session():
+    """Open a session on a fresh in-memory database holding every table."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+
+    import migrate  # noqa: F401, registers every model
+    from database import Base
+
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+
+@benchmark("recommendation.analyze_weather")
+def _analyze_weather():
+    from services.recommendation_service import WeatherAnalyzer
+
+    analyzer = WeatherAnalyzer()
+    return lambda: analyzer.analyze_weather(28.7, 84.4, 35.0)
+
+
+@benchmark("recommendation.generate_recommendations")
+def _generate_recommendations():
+    from services.recommendation_service import WeatherAnalyzer, WeatherRecommender
+
+    analysis = WeatherAnalyzer().analyze_weather(28.7, 84.4, 35.0)
+    recommender = WeatherRecommender()
+    return lambda: recommender.generate_recommendations(**analysis)
+
+
+@benchmark("weather.parse_weather_data.realtime")
+def _parse_realtime():
+    return _parse_weather_data("realtime")
+
+
+@benchmark("weather.parse_weather_data.5d")
+def _parse_five_days():
+    return _parse_weather_data("5d")
+
+
+def _parse_weather_data(forecast_type: str):
+    import models.location
+    from services.weather_service import parse_weather_data
+
+    name = "realtime" if forecast_type == "realtime" else "forecast"
+    payload = json.loads((PAYLOADS / f"{name}.json").read_text())
+    db = _memory_session()
+    location = models.location.Location(
+        name="nairobi", latitude=-1.2833, longitude=36.8167, city_name="Nairobi"
+    )
+    db.add(location)
+    db.commit()
+
+    async def parse():
+        await parse_weather_data(payload, location, forecast_type, db)
+
+    return parse
+
+
+@benchmark("location.get_or_create_location")
+def _get_or_create_location():
+    import models.location
+
+    db = _memory_session()
+    db.add_all(
+        models.location.Location(name=f"city-{number}", city_name=f"City {number}")
+        for number in range(5000)
+    )
+    db.commit()
+
+    async def lookup():
+        await models.location.get_or_create_location("city-2500", db)
+
+    return lookup
+
+
+@benchmark("schemas.weather_forecast_list.dump_json")
+def _dump_forecasts():
+    from datetime import datetime, timedelta
+    from decimal import Decimal
+    from typing import List
+
+    from pydantic import TypeAdapter
+
+    import schemas
+
+    now = datetime(2024, 3, 20, 9)
+    forecasts = [
+        schemas.WeatherForecast(
+            forecast_id=number,
+            location_id=1,
+            location_name="nairobi",
+            date_time=now,
+            start_time=now + timedelta(days=number),
+            end_time=now + timedelta(days=number + 1),
+            temperature=Decimal("24.50"),
+            humidity=Decimal("61.20"),
+            wind_speed=Decimal("3.10"),
+            precipitation_probability=Decimal("20.00"),
+        )
+        for number in range(100)
+    ]
+    adapter = TypeAdapter(List[schemas.WeatherForecast])
+    return lambda: adapter.dump_json(forecasts)
+
+
+def measure(workload: Callable, repeat: int = 5, min_seconds: float = 0.2) -> dict:
+    """
+    Time a workload.
+
+    The number of calls per repeat is doubled until a repeat lasts at least
+    `min_seconds`, so that timer resolution does not matter.
+
+    Args:
+        workload (Callable): A function, or a coroutine function, to time.
+        repeat (int, optional): The number of timed repeats. Defaults to 5.
+        min_seconds (float, optional): The minimum duration of a repeat.
+
+    Returns:
+        dict: The calls per repeat and the median and best time per call.
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        if asyncio.iscoroutinefunction(workload):
+
+            def run(number: int) -> float:
+                async def calls():
+                    started = time.perf_counter()
+                    for _ in range(number):
+                        await workload()
+                    return time.perf_counter() - started
+
+                return loop.run_until_complete(calls())
+
+        else:
+
+            def run(number: int) -> float:
+                started = time.perf_counter()
+                for _ in range(number):
+                    workload()
+                return time.perf_counter() - started
+
+        number = 1
+        while run(number) < min_seconds:
+            number *= 2
+        timings = [run(number) / number for _ in range(repeat)]
+    finally:
+        loop.close()
+    return {
+        "number": number,
+        "median_us": round(statistics.median(timings) * 1e6, 3),
+        "best_us": round(min(timings) * 1e6, 3),
+    }
+
+
+def run_benchmarks(selected: str | None = None, repeat: int = 5) -> dict:
+    """Run the benchmarks whose name contains `selected`, or all of them."""
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if selected and selected not in name:
+            continue
+        results[name] = measure(setup(), repeat=repeat)
+        print(f"{name}: {results[name]['median_us']} us", file=sys.stderr)
+    return {
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor() or platform.machine(),
+        },
+        "results": results,
+    }
+
+
+def compare_results(baseline: dict, current: dict, tolerance: float) -> list[dict]:
+    """
+    Compare the best time per call of each benchmark with its baseline.
+
+    Args:
+        baseline (dict): Results saved by `run`.
+        current (dict): Results of the run to check.
+        tolerance (float): The allowed slowdown, e.g. 0.25 for 25%.
+
+    Returns:
+        list[dict]: One row per benchmark present in both, flagged as regressed
+          when slower than the baseline by more than the tolerance.
+    """
+    rows = []
+    for name, result in current["results"].items():
+        reference = baseline["results"].get(name)
+        if reference is None:
+            continue
+        change = result["best_us"] / reference["best_us"] - 1
+        rows.append(
+            {
+                "name": name,
+                "baseline_us": reference["best_us"],
+                "current_us": result["best_us"],
+                "change": round(change, 3),
+                "regressed": change > tolerance,
+            }
+        )
+    return rows
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run or compare the micro-benchmarks."""
+    parser = argparse.ArgumentParser(description="Run the micro-benchmarks.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="Run the benchmarks and print the results.")
+    run.add_argument("--filter")
+    run.add_argument("--repeat", type=int, default=7)
+    run.add_argument("--save", type=Path, help="Also save the results to this file.")
+    compare = commands.add_parser(
+        "compare", help="Fail when a benchmark regressed against a baseline."
+    )
+    compare.add_argument("baseline", type=Path)
+    compare.add_argument(
+        "--current", type=Path, help="Saved results to check instead of a new run."
+    )
+    compare.add_argument("--filter")
+    compare.add_argument("--repeat", type=int, default=7)
+    compare.add_argument("--tolerance", type=float, default=0.3)
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        results = run_benchmarks(args.filter, args.repeat)
+        if args.save:
+            args.save.parent.mkdir(parents=True, exist_ok=True)
+            args.save.write_text(json.dumps(results, indent=2) + "\n")
+        json.dump(results, sys.stdout, indent=2)
+        print()
+        return 0
+
+    baseline = json.loads(args.baseline.read_text())
+    if args.current:
+        current = json.loads(args.current.read_text())
+    else:
+        current = run_benchmarks(args.filter, args.repeat)
+    rows = compare_results(baseline, current, args.tolerance)
+    for row in rows:
+        status = "REGRESSED" if row["regressed"] else "ok"
+        print(
+            f"{row['name']:<45} {row['baseline_us']:>12.3f} us "
+            f"{row['current_us']:>12.3f} us {row['change']:>+8.1%}  {status}"
+        )
+    return 1 if any(row["regressed"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
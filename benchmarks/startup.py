@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+"""Benchmark how long a worker takes to boot.
+
+Measures, in fresh interpreters, the time to import the application (what
+every worker pays when gunicorn does not `--preload` it) and the time until a
+uvicorn worker answers its first request.
+
+Example usage from the repository root:
+```bash
+python -m benchmarks.startup --runs 5
+```
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+IMPORT_SNIPPET = (
+    "import time; started = time.perf_counter(); import main; "
+    "print(time.perf_counter() - started)"
+)
+
+
+def time_import(env: dict) -> float:
+    """Import the application in a fresh interpreter and return the seconds taken."""
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def time_first_response(env: dict, timeout: float = 30) -> float:
+    """Start a uvicorn worker and return the seconds until it answers a request."""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(
+                    f"http://127.0.0.1:{port}/openapi.json", timeout=1
+                ):
+                    return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError("The worker did not answer in time")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def summarize(samples: list[float]) -> dict:
+    """Summarize timings in milliseconds."""
+    return {
+        "median_ms": round(statistics.median(samples) * 1000, 1),
+        "min_ms": round(min(samples) * 1000, 1),
+        "max_ms": round(max(samples) * 1000, 1),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run the startup benchmark and print the results as JSON."""
+    parser = argparse.ArgumentParser(description="Benchmark worker boot time.")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    env = {**os.environ, "SECRET_KEY": os.getenv("SECRET_KEY", "benchmark")}
+    imports = [time_import(env) for _ in range(args.runs)]
+    responses = [time_first_response(env) for _ in range(args.runs)]
+    json.dump(
+        {
+            "runs": args.runs,
+            "import": summarize(imports),
+            "first_response": summarize(responses),
+        },
+        sys.stdout,
+        indent=2,
+    )
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+"""Module for small in-process caches."""
+
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from config import settings
+from metrics import record_cache_lookup
+
+
+class TTLCache:
+    """
+    A bounded, least recently used cache whose entries expire after a TTL.
+
+    Entries can be tagged so that every entry derived from the same object
+    is invalidated at once. Each worker process holds its own cache. Lookups
+    in a named cache are also counted in the `cache_lookups_total` metric.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float, name: str | None = None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.name = name
+        self._entries: OrderedDict[Hashable, tuple[float, Any, Hashable]] = (
+            OrderedDict()
+        )
+        self._tags: dict[Hashable, set[Hashable]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for a key, or `default` if missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self._count(hit=False)
+            return default
+        expires_at, value, _ = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self._count(hit=False)
+            return default
+        self._entries.move_to_end(key)
+        self._count(hit=True)
+        return value
+
+    def set(self, key: Hashable, value: Any, tag: Hashable = None) -> None:
+        """Cache a value, evicting the least recently used entry when full."""
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value, tag)
+        if tag is not None:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drop a single entry."""
+        if key in self._entries:
+            self._remove(key)
+            self.invalidations += 1
+
+    def invalidate_tag(self, tag: Hashable) -> None:
+        """Drop every entry cached with a tag."""
+        for key in list(self._tags.get(tag, ())):
+            self.invalidate(key)
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        self._entries.clear()
+        self._tags.clear()
+
+    def stats(self) -> dict[str, int | float]:
+        """Report the size and hit rate of the cache."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def _count(self, hit: bool) -> None:
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        if self.name is not None:
+            record_cache_lookup(self.name, hit)
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, tag = self._entries.pop(key)
+        if tag is not None:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+# Authenticated users keyed by (sub, jti) and tagged with their user_id.
+principal_cache = TTLCache(
+    settings.PRINCIPAL_CACHE_SIZE,
+    settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    name="principal",
+)
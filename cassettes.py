@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+
+"""Module to record and replay the traffic to the upstream weather providers.
+
+Exchanges made through `upstream_client` are written to, or served from, a
+cassette: a gzipped NDJSON file with one request and response per line, API
+keys removed. Replays match requests on their method, path and query, and
+can reproduce the recorded latencies or answer at full speed.
+
+Set `UPSTREAM_CASSETTE` to the cassette path and `UPSTREAM_CASSETTE_MODE` to
+"record" or "replay" to enable it; `UPSTREAM_REPLAY_SPEED` divides the
+recorded latencies, 0 replaying without any delay. Record with a single
+worker so that the exchanges land in one file. To summarize a cassette:
+```bash
+python -m cassettes summary upstream.ndjson.gz
+```
+"""
+
+import asyncio
+import gzip
+import json
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from urllib.parse import urlencode
+
+import httpx
+
+from config import settings
+from metrics import InstrumentedTransport
+
+# Query parameters holding credentials, never written to a cassette.
+SECRET_PARAMS = {"apikey", "appid"}
+# Response headers kept in a cassette; the body is stored decoded.
+KEPT_HEADERS = {"content-type", "retry-after"}
+
+
+class CassetteMiss(httpx.TransportError):
+    """Raised when a replayed request was never recorded."""
+
+
+def request_key(request: httpx.Request) -> str:
+    """Identify a request by its method, path and query, without credentials."""
+    params = sorted(
+        (key, value)
+        for key, value in request.url.params.multi_items()
+        if key not in SECRET_PARAMS
+    )
+    return f"{request.method} {request.url.path}?{urlencode(params)}"
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Forward requests to the network and append each exchange to a cassette."""
+
+    def __init__(self, path: str, transport: httpx.AsyncBaseTransport | None = None):
+        self.path = path
+        self.transport = transport or httpx.AsyncHTTPTransport()
+        self._lock = threading.Lock()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        response = await self.transport.handle_async_request(request)
+        try:
+            # Reading undoes the content encoding, the body is stored decoded.
+            await response.aread()
+        finally:
+            await response.aclose()
+        elapsed = time.perf_counter() - started
+        headers = {
+            key: value
+            for key, value in response.headers.items()
+            if key.lower() in KEPT_HEADERS
+        }
+        exchange = {
+            "key": request_key(request),
+            "recorded_at": time.time(),
+            "elapsed_ms": round(elapsed * 1000, 3),
+            "status": response.status_code,
+            "headers": headers,
+            "body": response.text,
+        }
+        line = json.dumps(exchange, separators=(",", ":")) + "\n"
+        with self._lock, gzip.open(self.path, "at") as cassette:
+            cassette.write(line)
+        return httpx.Response(
+            response.status_code, headers=headers, content=exchange["body"].encode()
+        )
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """
+    Answer requests from a cassette, without touching the network.
+
+    Exchanges recorded for the same request are replayed in their recorded
+    order, starting over once exhausted, so that a replay is deterministic.
+    """
+
+    def __init__(self, path: str, speed: float = 1.0):
+        self.speed = speed
+        self._exchanges: dict[str, list[dict]] = defaultdict(list)
+        with gzip.open(path, "rt") as cassette:
+            for line in cassette:
+                exchange = json.loads(line)
+                self._exchanges[exchange["key"]].append(exchange)
+        self._next: dict[str, deque] = {}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        key = request_key(request)
+        if key not in self._exchanges:
+            raise CassetteMiss(f"No recorded exchange for {key}", request=request)
+        pending = self._next.get(key)
+        if not pending:
+            pending = self._next[key] = deque(self._exchanges[key])
+        exchange = pending.popleft()
+        if self.speed > 0:
+            await asyncio.sleep(exchange["elapsed_ms"] / 1000 / self.speed)
+        return httpx.Response(
+            exchange["status"],
+            headers=exchange["headers"],
+            content=exchange["body"].encode(),
+            request=request,
+        )
+
+
+_transport: httpx.AsyncBaseTransport | None = None
+_transport_loaded = False
+
+
+def cassette_transport() -> httpx.AsyncBaseTransport | None:
+    """Return the transport configured by the cassette settings, if any."""
+    global _transport, _transport_loaded
+    if not _transport_loaded:
+        if settings.UPSTREAM_CASSETTE_MODE == "record":
+            _transport = RecordingTransport(settings.UPSTREAM_CASSETTE)
+        elif settings.UPSTREAM_CASSETTE_MODE == "replay":
+            _transport = ReplayTransport(
+                settings.UPSTREAM_CASSETTE, settings.UPSTREAM_REPLAY_SPEED
+            )
+        _transport_loaded = True
+    return _transport
+
+
+def upstream_client() -> httpx.AsyncClient:
+    """Build the client used to call the upstream providers, timing each call."""
+    transport = cassette_transport() or httpx.AsyncHTTPTransport()
+    return httpx.AsyncClient(transport=InstrumentedTransport(transport))
+
+
+def summarize(path: str) -> dict:
+    """
+    Summarize the exchanges of a cassette per endpoint.
+
+    Args:
+        path (str): The cassette path.
+
+    Returns:
+        dict: The number of exchanges, status codes and latency percentiles
+          per method and path.
+    """
+    latencies: dict[str, list[float]] = defaultdict(list)
+    statuses: dict[str, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    with gzip.open(path, "rt") as cassette:
+        for line in cassette:
+            exchange = json.loads(line)
+            endpoint = exchange["key"].split("?", 1)[0]
+            latencies[endpoint].append(exchange["elapsed_ms"])
+            statuses[endpoint][str(exchange["status"])] += 1
+    summary = {}
+    for endpoint, samples in latencies.items():
+        samples.sort()
+        summary[endpoint] = {
+            "exchanges": len(samples),
+            "statuses": dict(statuses[endpoint]),
+            "p50_ms": samples[len(samples) // 2],
+            "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+            "mean_ms": round(statistics.fmean(samples), 3),
+        }
+    return summary
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != "summary":
+        print("Usage: python -m cassettes summary CASSETTE", file=sys.stderr)
+        sys.exit(2)
+    json.dump(summarize(sys.argv[2]), sys.stdout, indent=2)
+    print()
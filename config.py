@@ -4,42 +4,202 @@
 
 import os
 from typing import Any, Container, Mapping
-from dotenv import load_dotenv
 from pathlib import Path
 
 
-env_path = Path(".") / ".env"
-load_dotenv(dotenv_path=env_path)
-
-
 class Settings:
-    """Configure some settings on the app."""
+    """
+    Configure some settings on the app.
+
+    Settings are read from the environment, and from a `.env` file in the
+    working directory, when the instance is created rather than when the
+    class is defined.
+    """
 
     PROJECT_NAME: str = "Forecast Planner API"
     PROJECT_VERSION: str = "0.0.1"
 
-    if os.getenv("POSTGRES_DB"):
-        POSTGRES_USER: None | str = os.getenv("POSTGRES_USER")
-        POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD")
-        POSTGRES_SERVER: str = os.getenv("POSTGRES_SERVER", "localhost")
-        POSTGRES_PORT: str | int = os.getenv(
-            "POSTGRES_PORT", 5432
-        )  # default postgres port is 5432
-        POSTGRES_DB: str = os.getenv("POSTGRES_DB", "forecast_planner")
-        DATABASE_URL = f"postgresql+psycopg2://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_SERVER}:{POSTGRES_PORT}/{POSTGRES_DB}"
-    else:
-        DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./forecast-planner.db")
-
-    SECRET_KEY: str | bytes | Mapping[str, Any] | Any = os.getenv("SECRET_KEY")
-    if SECRET_KEY is None:
-        raise ValueError("SECRET_KEY must be set")
-    ALGORITHM: str | Container[str] | None = os.getenv("ALGORITHM", "HS256")
-    ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
-    REFRESH_TOKEN_EXPIRE_DAYS: int = int(os.getenv("REFRESH_TOKEN", 1))
-    TOMORROW_IO_API_KEY: str | None = os.getenv("TOMORROW_IO_API_KEY")
-    DEFAULT_LOCATION = os.getenv("DEFAULT_LOCATION", "Nairobi")
-    DEFAULT_UNITS = os.getenv("DEFAULT_UNITS", "metric")
-    OPENWEATHERMAP_API_KEY = os.getenv("OPENWEATHERMAP_API_KEY")
+    def __init__(self, env_path: Path | None = Path(".") / ".env"):
+        if env_path is not None:
+            from dotenv import load_dotenv
+
+            load_dotenv(dotenv_path=env_path)
+
+        if os.getenv("POSTGRES_DB"):
+            self.POSTGRES_USER: None | str = os.getenv("POSTGRES_USER")
+            self.POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD")
+            self.POSTGRES_SERVER: str = os.getenv("POSTGRES_SERVER", "localhost")
+            self.POSTGRES_PORT: str | int = os.getenv(
+                "POSTGRES_PORT", 5432
+            )  # default postgres port is 5432
+            self.POSTGRES_DB: str = os.getenv("POSTGRES_DB", "forecast_planner")
+            self.DATABASE_URL = (
+                f"postgresql+psycopg2://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}"
+                f"@{self.POSTGRES_SERVER}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
+            )
+        else:
+            self.DATABASE_URL = os.getenv(
+                "DATABASE_URL", "sqlite:///./forecast-planner.db"
+            )
+        # Each in-flight request holds a connection while awaiting upstream calls.
+        self.DATABASE_POOL_SIZE: int = int(os.getenv("DATABASE_POOL_SIZE", 5))
+        self.DATABASE_MAX_OVERFLOW: int = int(os.getenv("DATABASE_MAX_OVERFLOW", 10))
+        # Create the tables on startup instead of with `python -m migrate`.
+        self.AUTO_MIGRATE: bool = os.getenv("AUTO_MIGRATE", "").lower() in (
+            "1",
+            "true",
+            "yes",
+        )
+
+        self.SECRET_KEY: str | bytes | Mapping[str, Any] | Any = os.getenv(
+            "SECRET_KEY"
+        )
+        if self.SECRET_KEY is None:
+            raise ValueError("SECRET_KEY must be set")
+        self.ALGORITHM: str | Container[str] | None = os.getenv("ALGORITHM", "HS256")
+        self.ACCESS_TOKEN_EXPIRE_MINUTES: int = int(
+            os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30)
+        )
+        self.REFRESH_TOKEN_EXPIRE_DAYS: int = int(os.getenv("REFRESH_TOKEN", 1))
+        self.TOMORROW_IO_API_KEY: str | None = os.getenv("TOMORROW_IO_API_KEY")
+        self.DEFAULT_LOCATION = os.getenv("DEFAULT_LOCATION", "Nairobi")
+        self.DEFAULT_UNITS = os.getenv("DEFAULT_UNITS", "metric")
+        self.OPENWEATHERMAP_API_KEY = os.getenv("OPENWEATHERMAP_API_KEY")
+        # Overridden to point the upstream calls at a stand-in when load testing.
+        self.TOMORROW_IO_BASE_URL: str = os.getenv(
+            "TOMORROW_IO_BASE_URL", "https://api.tomorrow.io"
+        )
+        self.OPENWEATHERMAP_BASE_URL: str = os.getenv(
+            "OPENWEATHERMAP_BASE_URL", "https://api.openweathermap.org"
+        )
+        # Record the upstream traffic to, or replay it from, a cassette file.
+        self.UPSTREAM_CASSETTE: str | None = os.getenv("UPSTREAM_CASSETTE")
+        self.UPSTREAM_CASSETTE_MODE: str | None = os.getenv("UPSTREAM_CASSETTE_MODE")
+        self.UPSTREAM_REPLAY_SPEED: float = float(
+            os.getenv("UPSTREAM_REPLAY_SPEED", 1.0)
+        )
+        self.REALTIME_CACHE_MAX_AGE: int = int(
+            os.getenv("REALTIME_CACHE_MAX_AGE", 300)
+        )
+        self.FORECAST_CACHE_MAX_AGE: int = int(
+            os.getenv("FORECAST_CACHE_MAX_AGE", 3600)
+        )
+        # A token revoked by another worker is still accepted for up to this long.
+        self.BLOCKLIST_REFRESH_SECONDS: int = int(
+            os.getenv("BLOCKLIST_REFRESH_SECONDS", 5)
+        )
+        # Blocklist ids re-read on each refresh, to catch rows committed out of
+        # id order by concurrent transactions.
+        self.BLOCKLIST_REFRESH_OVERLAP: int = int(
+            os.getenv("BLOCKLIST_REFRESH_OVERLAP", 100)
+        )
+        self.BLOCKLIST_RELOAD_SECONDS: int = int(
+            os.getenv("BLOCKLIST_RELOAD_SECONDS", 300)
+        )
+        self.PASSWORD_HASH_WORKERS: int = int(
+            os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1))
+        )
+        self.PASSWORD_HASH_MAX_PENDING: int = int(
+            os.getenv("PASSWORD_HASH_MAX_PENDING", 32)
+        )
+        self.LOGIN_THROTTLE_PATH: str | None = os.getenv("LOGIN_THROTTLE_PATH")
+        self.LOGIN_THROTTLE_WINDOW_SECONDS: int = int(
+            os.getenv("LOGIN_THROTTLE_WINDOW_SECONDS", 300)
+        )
+        self.LOGIN_MAX_ATTEMPTS_PER_PHONE: int = int(
+            os.getenv("LOGIN_MAX_ATTEMPTS_PER_PHONE", 5)
+        )
+        self.LOGIN_MAX_ATTEMPTS_PER_IP: int = int(
+            os.getenv("LOGIN_MAX_ATTEMPTS_PER_IP", 20)
+        )
+        self.USER_IMPORT_BATCH_SIZE: int = int(
+            os.getenv("USER_IMPORT_BATCH_SIZE", 500)
+        )
+        self.REPORT_INGEST_BATCH_SIZE: int = int(
+            os.getenv("REPORT_INGEST_BATCH_SIZE", 5000)
+        )
+        self.PRINCIPAL_CACHE_SIZE: int = int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000))
+        self.PRINCIPAL_CACHE_TTL_SECONDS: int = int(
+            os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", 30)
+        )
+        self.BLOCKLIST_CLEANUP_INTERVAL_SECONDS: int = int(
+            os.getenv("BLOCKLIST_CLEANUP_INTERVAL_SECONDS", 3600 * 6)
+        )
+        self.BLOCKLIST_CLEANUP_BATCH_SIZE: int = int(
+            os.getenv("BLOCKLIST_CLEANUP_BATCH_SIZE", 1000)
+        )
+        self.REALTIME_POLL_INTERVAL: int = int(os.getenv("REALTIME_POLL_INTERVAL", 60))
+        self.REALTIME_QUEUE_SIZE: int = int(os.getenv("REALTIME_QUEUE_SIZE", 8))
+        self.REALTIME_MAX_PENDING_BYTES: int = int(
+            os.getenv("REALTIME_MAX_PENDING_BYTES", 64 * 1024)
+        )
+        self.MAX_FAVORITE_LOCATIONS: int = int(
+            os.getenv("MAX_FAVORITE_LOCATIONS", 20)
+        )
+        self.DASHBOARD_CACHE_SIZE: int = int(os.getenv("DASHBOARD_CACHE_SIZE", 5000))
+        self.DASHBOARD_CACHE_TTL_SECONDS: int = int(
+            os.getenv("DASHBOARD_CACHE_TTL_SECONDS", 120)
+        )
+        self.DASHBOARD_MAX_CONCURRENT_FETCHES: int = int(
+            os.getenv("DASHBOARD_MAX_CONCURRENT_FETCHES", 8)
+        )
+        self.NOTIFICATION_INTERVAL_SECONDS: int = int(
+            os.getenv("NOTIFICATION_INTERVAL_SECONDS", 900)
+        )
+        self.NOTIFICATION_HORIZON_HOURS: int = int(
+            os.getenv("NOTIFICATION_HORIZON_HOURS", 24)
+        )
+        self.NOTIFICATION_RAIN_THRESHOLD: float = float(
+            os.getenv("NOTIFICATION_RAIN_THRESHOLD", 60)
+        )
+        self.NOTIFICATION_HEAT_THRESHOLD: float = float(
+            os.getenv("NOTIFICATION_HEAT_THRESHOLD", 30)
+        )
+        self.NOTIFICATION_BATCH_SIZE: int = int(
+            os.getenv("NOTIFICATION_BATCH_SIZE", 5000)
+        )
+        self.NOTIFICATION_OUTBOX_PATH: str | None = os.getenv(
+            "NOTIFICATION_OUTBOX_PATH"
+        )
+        # Log statements slower than this with their parameters, 0 to disable it.
+        self.SLOW_QUERY_SECONDS: float = float(os.getenv("SLOW_QUERY_SECONDS", 0.1))
+        # Flag a statement run this many times in one request as an N+1 pattern.
+        self.N_PLUS_ONE_THRESHOLD: int = int(os.getenv("N_PLUS_ONE_THRESHOLD", 5))
+        # Warn when a request runs more queries than this, 0 for no budget.
+        self.QUERY_BUDGET_PER_REQUEST: int = int(
+            os.getenv("QUERY_BUDGET_PER_REQUEST", 0)
+        )
+        # Requests carrying this token are profiled, unset to disable profiling.
+        self.PROFILING_TOKEN: str | None = os.getenv("PROFILING_TOKEN")
+        self.PROFILING_DIR: str | None = os.getenv("PROFILING_DIR")
+        self.PROFILING_INTERVAL_SECONDS: float = float(
+            os.getenv("PROFILING_INTERVAL_SECONDS", 0.001)
+        )
+        self.PROFILING_MAX_PER_WINDOW: int = int(
+            os.getenv("PROFILING_MAX_PER_WINDOW", 10)
+        )
+        self.PROFILING_WINDOW_SECONDS: int = int(
+            os.getenv("PROFILING_WINDOW_SECONDS", 600)
+        )
+        self.PROFILING_THROTTLE_PATH: str | None = os.getenv("PROFILING_THROTTLE_PATH")
+        self.PROFILING_KEEP: int = int(os.getenv("PROFILING_KEEP", 50))
+        # Export request traces to a "file" or an "otlp" collector, unset to not.
+        self.TRACING_EXPORTER: str | None = os.getenv("TRACING_EXPORTER")
+        self.TRACING_FILE: str = os.getenv("TRACING_FILE", "traces.ndjson")
+        self.TRACING_OTLP_ENDPOINT: str = os.getenv(
+            "TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces"
+        )
+        self.TRACING_SERVICE_NAME: str = os.getenv(
+            "TRACING_SERVICE_NAME", "forecast-planner"
+        )
+        self.TRACING_EXPORT_INTERVAL_SECONDS: float = float(
+            os.getenv("TRACING_EXPORT_INTERVAL_SECONDS", 5)
+        )
+        self.TRACING_MAX_PENDING: int = int(os.getenv("TRACING_MAX_PENDING", 10000))
+        # How often to measure the event loop lag, 0 to disable it.
+        self.EVENT_LOOP_LAG_INTERVAL_SECONDS: float = float(
+            os.getenv("EVENT_LOOP_LAG_INTERVAL_SECONDS", 1.0)
+        )
 
 
 settings = Settings()
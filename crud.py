@@ -5,8 +5,11 @@
 from pydantic import EmailStr
 from sqlalchemy.orm import Session
 
+import models.location
+import models.notification
 import models.user
 import schemas
+from cache import principal_cache
 from models.user import Hasher
 
 
@@ -54,36 +57,50 @@ def get_user_by_email(db: Session, email: EmailStr | None) -> models.user.User:
     return db.query(models.user.User).filter(models.user.User.email == email).first()
 
 
-def get_users(db: Session, skip: int = 0, limit: int = 100) -> list[models.user.User]:
+def get_users(
+    db: Session, skip: int = 0, limit: int = 100, after_id: int | None = None
+) -> list[models.user.User]:
     """
-    Retrieve a list of users from the database.
+    Retrieve a list of users from the database, ordered by user_id.
+
+    Pass `after_id` to page by key: the primary key index seeks straight to
+    the page, so deep pages cost the same as the first one, unlike `skip`.
 
     Args:
         db (Session): The database session.
         skip (int, optional): Number of records to skip. Defaults to 0.
         limit (int, optional): Maximum number of records to retrieve.
           Defaults to 100.
+        after_id (int, optional): Only retrieve users with a greater user_id.
+          Defaults to None.
 
     Returns:
         list[models.user.User]: A list of user objects.
     """
-    return db.query(models.user.User).offset(skip).limit(limit).all()
+    query = db.query(models.user.User).order_by(models.user.User.user_id)
+    if after_id is not None:
+        return query.filter(models.user.User.user_id > after_id).limit(limit).all()
+    return query.offset(skip).limit(limit).all()
 
 
-def create_user(db: Session, user: schemas.UserCreate) -> models.user.User:
+def create_user(
+    db: Session, user: schemas.UserCreate, password_hash: str | None = None
+) -> models.user.User:
     """
     Create a new user in the database.
 
     Args:
         db (Session): The database session.
         user (UserCreate): The user data to be created.
+        password_hash (str, optional): The hash of the user's password, when
+          it was already computed. Defaults to hashing it here.
 
     Returns:
         User: The created user object.
     """
-    db_user = models.user.User(
-        phone=user.phone, password=Hasher.get_password_hash(user.password)
-    )
+    if password_hash is None:
+        password_hash = Hasher.get_password_hash(user.password)
+    db_user = models.user.User(phone=user.phone, password=password_hash)
     for attribute, value in user.model_dump().items():
         if (
             attribute != "password"
@@ -98,7 +115,10 @@ def create_user(db: Session, user: schemas.UserCreate) -> models.user.User:
 
 
 def update_user(
-    db: Session, user: schemas.UserUpdate, user_id: int
+    db: Session,
+    user: schemas.UserUpdate,
+    user_id: int,
+    password_hash: str | None = None,
 ) -> models.user.User:
     """
     Update a user in the database.
@@ -107,6 +127,8 @@ def update_user(
         db (Session): The database session.
         user (schemas.UserUpdate): The updated user data.
         user_id (int): The ID of the user to be updated.
+        password_hash (str, optional): The hash of the new password, when it
+          was already computed. Defaults to hashing it here.
 
     Returns:
         schemas.User: The updated user object.
@@ -126,7 +148,9 @@ def update_user(
         setattr(db_user, "email", user.email)
 
     if user.password:
-        setattr(db_user.password, "password", Hasher.get_password_hash(user.password))
+        if password_hash is None:
+            password_hash = Hasher.get_password_hash(user.password)
+        db_user.password = password_hash
 
     for attribute, value in user.dict(exclude_unset=True).items():
         if attribute not in ["email", "password", "phone"] and hasattr(
@@ -136,6 +160,7 @@ def update_user(
 
     db.commit()
     db.refresh(db_user)
+    principal_cache.invalidate_tag(user_id)
     return db_user
 
 
@@ -168,6 +193,9 @@ def delete_user(db: Session, user_id: int) -> dict:
     """
     Deletes a user from the database.
 
+    The rows referencing the user are deleted first, in the same transaction,
+    since their foreign keys do not cascade.
+
     Args:
         db (Session): The database session.
         user_id (int): The ID of the user to be deleted.
@@ -178,8 +206,17 @@ def delete_user(db: Session, user_id: int) -> dict:
     db_user = (
         db.query(models.user.User).filter(models.user.User.user_id == user_id).first()
     )
+    Favorite_Location = models.user.Favorite_Location
+    Notification = models.notification.Notification
+    db.query(Favorite_Location).filter(Favorite_Location.user_id == user_id).delete(
+        synchronize_session=False
+    )
+    db.query(Notification).filter(Notification.user_id == user_id).delete(
+        synchronize_session=False
+    )
     db.delete(db_user)
     db.commit()
+    principal_cache.invalidate_tag(user_id)
     return {}
 
 
@@ -200,3 +237,82 @@ def get_user_preferences(db: Session, user_id: int) -> models.user.User_Preferen
         .filter(models.user.User_Preferences.user_id == user_id)
         .first()
     )
+
+
+def get_favorite_locations(db: Session, user_id: int) -> list[models.location.Location]:
+    """
+    Retrieve all the favorite locations of a user with a single query.
+
+    Args:
+        db (Session): The database session.
+        user_id (int): The ID of the user.
+
+    Returns:
+        list[models.location.Location]: The locations, in the user's order.
+    """
+    Favorite_Location = models.user.Favorite_Location
+    return (
+        db.query(models.location.Location)
+        .join(
+            Favorite_Location,
+            Favorite_Location.location_id == models.location.Location.location_id,
+        )
+        .filter(Favorite_Location.user_id == user_id)
+        .order_by(Favorite_Location.position, Favorite_Location.favorite_id)
+        .all()
+    )
+
+
+def add_favorite_location(
+    db: Session, user_id: int, location: models.location.Location
+) -> models.user.Favorite_Location:
+    """
+    Add a location to the favorites of a user, after the existing ones.
+
+    Args:
+        db (Session): The database session.
+        user_id (int): The ID of the user.
+        location (models.location.Location): The location to add.
+
+    Returns:
+        models.user.Favorite_Location: The new or already existing favorite.
+    """
+    Favorite_Location = models.user.Favorite_Location
+    favorites = (
+        db.query(Favorite_Location).filter(Favorite_Location.user_id == user_id).all()
+    )
+    for favorite in favorites:
+        if favorite.location_id == location.location_id:
+            return favorite
+    favorite = Favorite_Location(
+        user_id=user_id,
+        location_id=location.location_id,
+        position=max((favorite.position for favorite in favorites), default=-1) + 1,
+    )
+    db.add(favorite)
+    db.commit()
+    db.refresh(favorite)
+    return favorite
+
+
+def remove_favorite_location(db: Session, user_id: int, location_id: int) -> bool:
+    """
+    Remove a location from the favorites of a user.
+
+    Args:
+        db (Session): The database session.
+        user_id (int): The ID of the user.
+        location_id (int): The ID of the location to remove.
+
+    Returns:
+        bool: Whether the location was a favorite of the user.
+    """
+    Favorite_Location = models.user.Favorite_Location
+    removed = (
+        db.query(Favorite_Location)
+        .filter(Favorite_Location.user_id == user_id)
+        .filter(Favorite_Location.location_id == location_id)
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return bool(removed)
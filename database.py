@@ -5,6 +5,7 @@
 import os
 from typing import Generator
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import declarative_base, sessionmaker, Session
 
 from config import settings
@@ -13,11 +14,26 @@ from config import settings
 # if postgress is the db:
 if settings.DATABASE_URL.startswith("postgres"):
     engine = create_engine(
-        settings.DATABASE_URL.replace("postgres://", "postgresql://", 1)
+        settings.DATABASE_URL.replace("postgres://", "postgresql://", 1),
+        pool_size=settings.DATABASE_POOL_SIZE,
+        max_overflow=settings.DATABASE_MAX_OVERFLOW,
     )
 elif settings.DATABASE_URL.startswith("sqlite"):
+    url = make_url(settings.DATABASE_URL)
+    # An in-memory database uses a SingletonThreadPool, which takes no sizes.
+    in_memory = url.database in (None, "", ":memory:") or (
+        url.query.get("mode") == "memory"
+    )
+    pool_arguments = {}
+    if not in_memory:
+        pool_arguments = {
+            "pool_size": settings.DATABASE_POOL_SIZE,
+            "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+        }
     engine = create_engine(
-        settings.DATABASE_URL, connect_args={"check_same_thread": False}
+        settings.DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        **pool_arguments,
     )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+"""Gunicorn configuration.
+
+The application is imported once by the master and shared with the workers
+copy-on-write, so a worker boots without importing anything.
+
+Workers write their metrics to `PROMETHEUS_MULTIPROC_DIR`, emptied here when
+the master starts, before the application and `prometheus_client` are loaded.
+"""
+
+import os
+import shutil
+
+metrics_dir = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR",
+    os.path.join(
+        "/dev/shm" if os.path.isdir("/dev/shm") else "/tmp",
+        "forecast-planner-metrics",
+    ),
+)
+shutil.rmtree(metrics_dir, ignore_errors=True)
+os.makedirs(metrics_dir)
+
+workers = int(os.getenv("WEB_CONCURRENCY", 4))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+# Proxies whose X-Forwarded-For header names the client, e.g. for the login
+# throttle. A Heroku dyno is only reachable through the router, whose address
+# changes, so every peer is trusted there.
+forwarded_allow_ips = os.getenv(
+    "FORWARDED_ALLOW_IPS", "*" if "DYNO" in os.environ else "127.0.0.1"
+)
+
+
+def when_ready(server):
+    """Load the lazily imported dependencies once, before forking the workers."""
+    from main import warm_up
+
+    warm_up()
+
+
+def post_fork(server, worker):
+    """
+    Drop the database connections inherited from the master.
+
+    A pooled connection must never be used by two processes; `close=False`
+    leaves the master's connections open for the master itself.
+    """
+    from database import engine
+
+    engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    """Drop the live gauges of a worker that exited."""
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+"""Module to handle HTTP conditional caching of forecast responses."""
+
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Request, Response
+
+from config import settings
+
+
+CACHE_MAX_AGE = {
+    "realtime": settings.REALTIME_CACHE_MAX_AGE,
+    "5d": settings.FORECAST_CACHE_MAX_AGE,
+}
+
+
+def make_etag(
+    location_id: int, last_modified: datetime, periods: int, variant: str
+) -> str:
+    """
+    Build a strong ETag for a forecast response.
+
+    Args:
+        location_id (int): The location the forecasts belong to.
+        last_modified (datetime): The latest `date_time` of the forecasts.
+        periods (int): The number of forecast periods in the response.
+        variant (str): Distinguishes the different representations of the same
+          forecasts, e.g. the endpoint and requested day.
+
+    Returns:
+        str: The quoted ETag value.
+    """
+    key = f"{location_id}:{last_modified.isoformat()}:{periods}:{variant}"
+    return '"' + hashlib.sha1(key.encode()).hexdigest()[:20] + '"'
+
+
+def forecast_cache_headers(
+    location_id: int,
+    last_modified: datetime | None,
+    periods: int,
+    forecast_type: str,
+    variant: str,
+) -> dict[str, str]:
+    """
+    Build the validator and freshness headers for a forecast response.
+
+    Args:
+        location_id (int): The location the forecasts belong to.
+        last_modified (datetime, optional): The latest `date_time` of the forecasts.
+        periods (int): The number of forecast periods in the response.
+        forecast_type (str): The type of forecast, either "realtime" or "5d".
+        variant (str): Distinguishes representations of the same forecasts.
+
+    Returns:
+        dict[str, str]: The headers, empty if there is nothing to validate against.
+    """
+    if last_modified is None:
+        return {}
+    return {
+        "ETag": make_etag(location_id, last_modified, periods, variant),
+        "Last-Modified": format_datetime(
+            last_modified.astimezone(timezone.utc).replace(microsecond=0), usegmt=True
+        ),
+        "Cache-Control": f"public, max-age={CACHE_MAX_AGE[forecast_type]}",
+    }
+
+
+def is_not_modified(request: Request | None, headers: dict[str, str]) -> bool:
+    """
+    Evaluate the request's conditional headers against the response validators.
+
+    `If-None-Match` takes precedence over `If-Modified-Since` as required by
+    RFC 9110.
+
+    Args:
+        request (Request, optional): The incoming request.
+        headers (dict[str, str]): The headers built by `forecast_cache_headers`.
+
+    Returns:
+        bool: True if the client's copy is still valid.
+    """
+    if request is None or not headers:
+        return False
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        etags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return headers["ETag"] in etags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+            return parsedate_to_datetime(headers["Last-Modified"]) <= since
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def not_modified_response(headers: dict[str, str]) -> Response:
+    """Build an empty 304 response carrying the validators."""
+    return Response(status_code=304, headers=headers)
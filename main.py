@@ -2,40 +2,78 @@
 
 """Main module running our app."""
 
-# from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager
 import logging
-from fastapi import FastAPI  #, BackgroundTasks
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from config import settings
-from database import engine, Base
-# from models.token_blocklist import TokenBlocklist
+from database import SessionLocal, engine
+from metrics import (
+    MetricsMiddleware,
+    metrics_response,
+    monitor_event_loop_lag,
+)
+from profiling import ProfilingMiddleware, download_profile
+from query_tracking import QueryTrackingMiddleware, install_query_tracking
+from tracing import TracingMiddleware, export_pending, export_periodically
+from models.token_blocklist import TokenBlocklist, blocklist_index
 from routes import user_routes, auth_routes, weather_routes
+from services.user_import_service import shutdown_hashing_pool
 
 logger = logging.getLogger(__name__)
 
 
-def create_tables() -> None:
+@asynccontextmanager
+async def app_lifespan(app: FastAPI):
     """
-    Create database tables.
+    Run startup and shutdown tasks of the application.
 
-    This function creates the necessary tables in the database using SQLAlchemy's
-    `create_all` method and the specified database engine.
+    Warms the in-memory token blocklist index so that the first authenticated
+    requests do not have to load it, keeps it up to date and cleans expired
+    blocklist entries in the background. Notifications are evaluated on a schedule as well, and
+    the event loop lag is measured continuously. Request traces are exported
+    in the background when an exporter is configured, and flushed on shutdown.
+    The process pool of the user import is stopped on shutdown.
 
-    Returns:
-        None
+    Tables are created by `python -m migrate`, or here when `AUTO_MIGRATE` is set.
     """
-    Base.metadata.create_all(bind=engine)
-
-"""@asynccontextmanager
-async def app_lifespan(app: FastAPI):
-    # code to execute when app is loading
-    background_tasks = BackgroundTasks()
-    background_tasks.add_task(TokenBlocklist.clean_db_periodically)
-    logger.info("Cleaning up token blocklist on startup")
-    yield background_tasks
-    # code to execute when app is shutting down
-    logger.info("Cleaning up token blocklist on shutdown")"""
+    if settings.AUTO_MIGRATE:
+        from migrate import create_tables
+
+        create_tables()
+    db = SessionLocal()
+    try:
+        blocklist_index.load(db)
+        logger.info(f"Loaded {len(blocklist_index)} blocklisted tokens on startup")
+    except Exception as e:
+        logger.error(f"Could not load the token blocklist on startup: {e}")
+    finally:
+        db.close()
+    cleanup = asyncio.create_task(TokenBlocklist.clean_db_periodically())
+    blocklist_sync = asyncio.create_task(blocklist_index.sync_periodically())
+    from services.notification_service import notify_periodically
+
+    notifications = asyncio.create_task(notify_periodically())
+    tasks = [cleanup, blocklist_sync, notifications]
+    if settings.EVENT_LOOP_LAG_INTERVAL_SECONDS > 0:
+        tasks.append(
+            asyncio.create_task(
+                monitor_event_loop_lag(settings.EVENT_LOOP_LAG_INTERVAL_SECONDS)
+            )
+        )
+    if settings.TRACING_EXPORTER:
+        tasks.append(asyncio.create_task(export_periodically()))
+    yield
+    for task in tasks:
+        task.cancel()
+    shutdown_hashing_pool()
+    if settings.TRACING_EXPORTER:
+        try:
+            await export_pending()
+        except Exception as e:
+            logger.error(f"Could not export traces on shutdown: {e}")
 
 
 def start_application() -> FastAPI:
@@ -44,7 +82,9 @@ def start_application() -> FastAPI:
 
     This function initializes a FastAPI application with the specified title and version.
     It also adds middleware for handling CORS and includes the routers for authentication,
-    user management, and weather data.
+    user management, and weather data. Request and database metrics are exposed
+    on `/metrics`, and the queries of each request are tracked. Requests carrying
+    the profiling token are profiled, and every request is traced.
 
     Returns:
         FastAPI: The initialized FastAPI application.
@@ -52,9 +92,8 @@ def start_application() -> FastAPI:
     app = FastAPI(
         title=settings.PROJECT_NAME,
         version=settings.PROJECT_VERSION,
-        # lifespan=app_lifespan
+        lifespan=app_lifespan,
     )
-    create_tables()
     origins = [
         "*",  # introduces security vulnerability
     ]
@@ -64,6 +103,22 @@ def start_application() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        # Let browser clients read the pagination headers of /users.
+        expose_headers=["X-Next-Cursor", "X-Total-Count-Estimate"],
+    )
+    app.add_middleware(ProfilingMiddleware)
+    app.add_middleware(QueryTrackingMiddleware)
+    app.add_middleware(TracingMiddleware)
+    app.add_middleware(MetricsMiddleware)
+    install_query_tracking(engine)
+    app.add_api_route(
+        "/metrics", metrics_response, methods=["GET"], include_in_schema=False
+    )
+    app.add_api_route(
+        "/profiles/{profile_id}",
+        download_profile,
+        methods=["GET"],
+        include_in_schema=False,
     )
     app.include_router(auth_routes.router, tags=["auth"], prefix="/api/v1/auth")
     app.include_router(user_routes.router, tags=["users"], prefix="/api/v1")
@@ -72,4 +127,19 @@ def start_application() -> FastAPI:
     return app
 
 
+def warm_up() -> None:
+    """
+    Load the dependencies that are otherwise imported on first use.
+
+    Called by gunicorn before forking the workers when the app is preloaded,
+    so that every worker shares them instead of loading its own copy.
+    """
+    import jose.jwt  # noqa: F401
+    import numpy  # noqa: F401
+    import services.notification_service  # noqa: F401
+    from models.user import get_pwd_context
+
+    get_pwd_context()
+
+
 app = start_application()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+
+"""Module to collect Prometheus metrics and expose them on `/metrics`.
+
+Every gunicorn worker is a separate process with its own counters. When
+`PROMETHEUS_MULTIPROC_DIR` is set, which `gunicorn.conf.py` does, workers
+write their samples to memory-mapped files in that directory and a scrape
+of any worker aggregates the files of all of them. The variable must be set
+before `prometheus_client` is imported, so it cannot come from `.env`; with
+`uvicorn --workers`, export it and empty the directory before starting.
+"""
+
+import asyncio
+import os
+import time
+
+import httpx
+from fastapi import Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time to serve an HTTP request, until the last byte of the response.",
+    ["method", "route", "status"],
+)
+UPSTREAM_DURATION = Histogram(
+    "upstream_request_duration_seconds",
+    "Time until an upstream provider answered, or the call failed.",
+    ["provider", "outcome"],
+    buckets=(0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total",
+    "Lookups in the in-process caches.",
+    ["cache", "result"],
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "Time to execute a database statement.",
+    ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+)
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop woke up a sleeping task.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+
+# Upstream providers, by the first segment of the paths of their APIs.
+UPSTREAM_PROVIDERS = {"v4": "tomorrow_io", "geo": "openweathermap"}
+
+
+class MetricsMiddleware:
+    """
+    Time every HTTP request by method, route template and status.
+
+    Requests that match no route are grouped under "unmatched" so that
+    arbitrary paths cannot create new series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = "500"
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router records the matched route in the shared scope.
+            route = scope.get("route")
+            REQUEST_DURATION.labels(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                status,
+            ).observe(time.perf_counter() - started)
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """Time the calls made through another transport, per upstream provider."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        segment = request.url.path.strip("/").split("/", 1)[0]
+        provider = UPSTREAM_PROVIDERS.get(segment, "other")
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            response = await self.transport.handle_async_request(request)
+            outcome = str(response.status_code)
+            return response
+        except httpx.TimeoutException:
+            outcome = "timeout"
+            raise
+        finally:
+            UPSTREAM_DURATION.labels(provider, outcome).observe(
+                time.perf_counter() - started
+            )
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    """Count a lookup in a named cache."""
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def record_query_duration(statement: str, seconds: float) -> None:
+    """Time a database statement, by its SQL verb."""
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement else ""
+    DB_QUERY_DURATION.labels(operation or "OTHER").observe(seconds)
+
+
+async def monitor_event_loop_lag(interval: float) -> None:
+    """
+    Measure how late the event loop resumes a task sleeping for `interval`.
+
+    A lag means that something blocked the loop, e.g. synchronous database
+    calls or CPU-bound work in a coroutine.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - started - interval))
+
+
+def metrics_response() -> Response:
+    """Render the metrics of every worker in the Prometheus text format."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
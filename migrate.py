@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+
+"""Module to create the database schema.
+
+Run it once per deploy, before starting the workers:
+```bash
+python -m migrate
+```
+"""
+
+import sys
+
+import models.location
+import models.notification
+import models.token_blocklist
+import models.user
+import models.weather
+from database import Base, engine
+
+
+def create_tables() -> None:
+    """
+    Create database tables.
+
+    This function creates the tables of every model that do not exist yet,
+    using SQLAlchemy's `create_all` method and the specified database engine,
+    then the indexes added to the models of existing tables.
+
+    Returns:
+        None
+    """
+    Base.metadata.create_all(bind=engine)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+if __name__ == "__main__":
+    create_tables()
+    print(f"Created the missing tables of {len(Base.metadata.tables)} models")
+    sys.exit(0)
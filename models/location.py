@@ -2,7 +2,6 @@
 
 """Module for various modules that contain our app."""
 
-import httpx
 from sqlalchemy import (
     Boolean,
     Column,
@@ -19,7 +18,9 @@ from sqlalchemy.orm import relationship
 from database import Base
 from sqlalchemy.orm import Query, Session
 
+from cassettes import upstream_client
 from config import settings
+from tracing import traced
 
 
 class Location(Base):
@@ -38,6 +39,7 @@ class Location(Base):
     )
 
 
+@traced()
 async def get_or_create_location(location: str, db: Session) -> Location:
     """Fetch or create a location."""
     location = location.strip().lower()
@@ -75,6 +77,7 @@ async def get_or_create_location(location: str, db: Session) -> Location:
     return new_location
 
 
+@traced()
 async def get_city_coordinates(name: str):
     if not name:
         print("City name cannot be empty")
@@ -82,8 +85,8 @@ async def get_city_coordinates(name: str):
 
     API_KEY = settings.OPENWEATHERMAP_API_KEY
 
-    api_url = f"https://api.openweathermap.org/geo/1.0/direct?q={name}&limit=1&appid={API_KEY}"
-    async with httpx.AsyncClient() as client:
+    api_url = f"{settings.OPENWEATHERMAP_BASE_URL}/geo/1.0/direct?q={name}&limit=1&appid={API_KEY}"
+    async with upstream_client() as client:
         response = await client.get(api_url)
     response.raise_for_status()
     data = response.json()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+
+"""Module for the notifications sent to users."""
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    DECIMAL,
+    Enum,
+    ForeignKey,
+    Integer,
+    UniqueConstraint,
+)
+from database import Base
+
+
+class Notification(Base):
+    """
+    Define a weather notification queued for a user.
+
+    A user is notified at most once per location, kind and forecast period,
+    which the unique constraint enforces whatever the number of evaluations.
+    Notifications not yet delivered have no `delivered_at`.
+    """
+
+    __tablename__ = "notifications"
+    __table_args__ = (
+        UniqueConstraint("user_id", "location_id", "kind", "forecast_start"),
+    )
+
+    notification_id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
+    location_id = Column(Integer, ForeignKey("location.location_id"), nullable=False)
+    kind = Column(Enum("rain", "heat", name="notification_kind_enum"), nullable=False)
+    forecast_start = Column(DateTime, nullable=False)
+    value = Column(DECIMAL(5, 2))
+    created_at = Column(DateTime, nullable=False)
+    delivered_at = Column(DateTime, nullable=True, index=True)
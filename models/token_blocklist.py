@@ -4,13 +4,17 @@
 
 from datetime import datetime
 from fastapi import Depends
-from jose import jwt
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, delete, func, or_, select
 from sqlalchemy.orm import Session
 import asyncio
+import logging
+import time
 
 import database
 from config import settings
+from scheduling import run_periodically
+
+logger = logging.getLogger(__name__)
 
 
 class TokenBlocklist(database.Base):
@@ -23,9 +27,9 @@ class TokenBlocklist(database.Base):
     __tablename__ = "token_blocklist"
 
     id = Column(Integer, autoincrement=True, primary_key=True)
-    jti = Column(String(255))
+    jti = Column(String(255), index=True)
     token_type = Column(String)
-    exp = Column(DateTime)
+    exp = Column(DateTime, index=True)
 
     def save(self, db: Session):
         """Save a block list model."""
@@ -35,6 +39,8 @@ class TokenBlocklist(database.Base):
     @classmethod
     def save_from_token(cls, token, db: Session):
         """Save a block list model from a supplied token string."""
+        from jose import jwt
+
         token_dict = jwt.decode(
             token, settings.SECRET_KEY, algorithms=settings.ALGORITHM
         )
@@ -43,10 +49,11 @@ class TokenBlocklist(database.Base):
         exp = datetime.fromtimestamp(token_dict.get("exp", 0))
         blocklist_token = cls(jti=jti, token_type=token_type, exp=exp)
         blocklist_token.save(db)
+        blocklist_index.add(jti, exp)
 
     @classmethod
     def is_jti_blocklisted(cls, jti, db: Session):
-        """Check if a token is blocklisted."""
+        """Check if a token is blocklisted by querying the database."""
         query = db.query(cls).filter_by(jti=jti).first()
         return bool(query)
     
@@ -56,21 +63,182 @@ class TokenBlocklist(database.Base):
         return db.query(TokenBlocklist).all()
 
     @staticmethod
-    async def clean_block_list(db: Session):
-        """Delete all block list entries."""
+    def clean_block_list(
+        db: Session, batch_size: int = settings.BLOCKLIST_CLEANUP_BATCH_SIZE
+    ) -> int:
+        """Delete the expired block list entries in bounded batches.
+
+        Each batch is a single indexed `DELETE ... WHERE exp <= now` committed
+        on its own, so locks are held briefly whatever the backlog.
+
+        Returns:
+            int: The number of entries removed.
+        """
         now = datetime.now()
-        blocklisted_tokens = await TokenBlocklist.get_all_blocklisted_tokens(db)
-        for token in blocklisted_tokens:
-            if token.exp <= now:
-                db.delete(token)
-        db.commit()
+        expired_ids = (
+            select(TokenBlocklist.id)
+            .where(TokenBlocklist.exp <= now)
+            .limit(batch_size)
+            .scalar_subquery()
+        )
+        removed = 0
+        while True:
+            result = db.execute(
+                delete(TokenBlocklist)
+                .where(TokenBlocklist.id.in_(expired_ids))
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            removed += result.rowcount
+            if result.rowcount < batch_size:
+                return removed
 
     @staticmethod
     async def clean_db_periodically():
-        while True:
-            db: Session = next(database.get_db())
-            try:
-                await TokenBlocklist.clean_block_list(db)
-                await asyncio.sleep(3600 * 6) # Every six hours
-            finally:
-                db.close()
+        """Clean the block list every few hours from a single worker."""
+
+        async def clean():
+            started = time.perf_counter()
+            removed = await asyncio.to_thread(_clean_block_list_once)
+            logger.info(
+                f"Removed {removed} expired blocklisted tokens in "
+                f"{time.perf_counter() - started:.3f}s"
+            )
+
+        await run_periodically(
+            "token-blocklist-cleanup",
+            clean,
+            settings.BLOCKLIST_CLEANUP_INTERVAL_SECONDS,
+        )
+
+
+def _clean_block_list_once() -> int:
+    """Clean the block list with a session of its own."""
+    db = database.SessionLocal()
+    try:
+        return TokenBlocklist.clean_block_list(db)
+    finally:
+        db.close()
+
+
+class BlocklistIndex:
+    """Keep the active token blocklist in memory.
+
+    Revocation checks are answered from a set of jtis. A background task of
+    each worker picks up the tokens revoked by the other workers with an
+    incremental query every `refresh_seconds`, and reloads the whole active
+    blocklist every `reload_seconds` to notice deleted rows, so requests never
+    wait on these queries. Entries are evicted once their token has expired,
+    since an expired token is rejected anyway.
+
+    A token revoked through one worker is therefore still accepted by the
+    others for up to `refresh_seconds` (BLOCKLIST_REFRESH_SECONDS, 5s by
+    default). Ids are assigned before commit, so a row can become visible
+    after a row with a higher id; each refresh re-reads the last
+    `overlap` ids to pick such rows up.
+    """
+
+    def __init__(
+        self,
+        refresh_seconds: float = settings.BLOCKLIST_REFRESH_SECONDS,
+        reload_seconds: float = settings.BLOCKLIST_RELOAD_SECONDS,
+        overlap: int = settings.BLOCKLIST_REFRESH_OVERLAP,
+    ):
+        self.refresh_seconds = refresh_seconds
+        self.reload_seconds = reload_seconds
+        self.overlap = overlap
+        self.loaded = False
+        self._entries: dict[str, datetime] = {}
+        self._last_id = 0
+        self._refreshed_at = 0.0
+        self._reloaded_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def load(self, db: Session) -> None:
+        """Load every unexpired blocklist entry."""
+        now = datetime.now()
+        rows = db.query(TokenBlocklist.jti, TokenBlocklist.exp).filter(
+            or_(TokenBlocklist.exp > now, TokenBlocklist.exp.is_(None))
+        )
+        self._entries = dict(rows.all())
+        self._last_id = db.query(func.max(TokenBlocklist.id)).scalar() or 0
+        self._refreshed_at = self._reloaded_at = time.monotonic()
+        self.loaded = True
+
+    def refresh(self, db: Session) -> None:
+        """Pick up the entries added since the last load or refresh."""
+        rows = db.query(
+            TokenBlocklist.id, TokenBlocklist.jti, TokenBlocklist.exp
+        ).filter(TokenBlocklist.id > self._last_id - self.overlap)
+        for row_id, jti, exp in rows:
+            self._last_id = max(self._last_id, row_id)
+            self._entries[jti] = exp
+        self._refreshed_at = time.monotonic()
+        self.evict_expired()
+
+    def add(self, jti: str, exp: datetime | None) -> None:
+        """Record a token revoked by this worker."""
+        self._entries[jti] = exp
+
+    def evict_expired(self) -> None:
+        """Forget the tokens that have expired."""
+        now = datetime.now()
+        expired = [
+            jti for jti, exp in self._entries.items() if exp is not None and exp <= now
+        ]
+        for jti in expired:
+            del self._entries[jti]
+
+    def sync(self, db: Session) -> None:
+        """Reload or refresh the index, whichever is due."""
+        now = time.monotonic()
+        if not self.loaded or now - self._reloaded_at >= self.reload_seconds:
+            self.load(db)
+        elif now - self._refreshed_at >= self.refresh_seconds:
+            self.refresh(db)
+
+    async def sync_periodically(self) -> None:
+        """Keep the index of this worker up to date, off the event loop."""
+
+        async def sync():
+            await asyncio.to_thread(self._sync_once)
+
+        await run_periodically(
+            "token-blocklist-refresh",
+            sync,
+            self.refresh_seconds,
+            single_worker=False,
+        )
+
+    def _sync_once(self) -> None:
+        """Sync the index with a session of its own."""
+        db = database.SessionLocal()
+        try:
+            self.sync(db)
+        finally:
+            db.close()
+
+    def is_blocklisted(self, jti: str | None, db: Session) -> bool:
+        """
+        Check if a token is blocklisted.
+
+        The database is only queried, with the indexed fallback query, while
+        the index is not loaded.
+
+        Args:
+            jti (str, optional): The token identifier.
+            db (Session): The database session.
+
+        Returns:
+            bool: True if the token was revoked.
+        """
+        if jti is None:
+            return False
+        if not self.loaded:
+            return TokenBlocklist.is_jti_blocklisted(jti, db)
+        return jti in self._entries
+
+
+blocklist_index = BlocklistIndex()
@@ -3,7 +3,8 @@
 
 """Module for user functionality."""
 
-from passlib.context import CryptContext
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
 from sqlalchemy import (
     Boolean,
@@ -16,27 +17,81 @@ from sqlalchemy import (
     Integer,
     String,
     Text,
+    UniqueConstraint,
     text,
 )
 from sqlalchemy.orm import relationship
+from config import settings
 from database import Base
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+_pwd_context = None
+
+
+def get_pwd_context():
+    """Return the password hashing context, loading passlib on first use."""
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
+
+
+class HashingPoolSaturated(Exception):
+    """Raised when too many password hashes are already waiting to be computed."""
 
 
 class Hasher:
-    """Create and verify password hashes."""
+    """Create and verify password hashes.
+
+    bcrypt takes tens of milliseconds per call, so the async methods run it on
+    a bounded thread pool (bcrypt releases the GIL) instead of the event loop.
+    At most `PASSWORD_HASH_MAX_PENDING` calls may be queued or running at once
+    per worker; further calls fail fast with `HashingPoolSaturated`.
+    """
+
+    _executor: ThreadPoolExecutor | None = None
+    _pending = 0
 
     @staticmethod
     def verify_password(plain_password, hashed_password) -> bool:
         """Compare a password and a hash."""
-        return pwd_context.verify(plain_password, hashed_password)
+        return get_pwd_context().verify(plain_password, hashed_password)
 
     @staticmethod
     def get_password_hash(password) -> str:
         """Make a hash of a password."""
-        return pwd_context.hash(password)
+        return get_pwd_context().hash(password)
+
+    @classmethod
+    async def averify_password(cls, plain_password, hashed_password) -> bool:
+        """Compare a password and a hash without blocking the event loop."""
+        return await cls._run(
+            get_pwd_context().verify, plain_password, hashed_password
+        )
+
+    @classmethod
+    async def aget_password_hash(cls, password) -> str:
+        """Make a hash of a password without blocking the event loop."""
+        return await cls._run(get_pwd_context().hash, password)
+
+    @classmethod
+    async def _run(cls, function, *args):
+        """Run a hashing function on the pool, shedding load when it is saturated."""
+        if cls._pending >= settings.PASSWORD_HASH_MAX_PENDING:
+            raise HashingPoolSaturated("Password hashing pool is saturated")
+        if cls._executor is None:
+            cls._executor = ThreadPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_WORKERS,
+                thread_name_prefix="password-hash",
+            )
+        cls._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(cls._executor, function, *args)
+        finally:
+            cls._pending -= 1
 
 
 class User(Base):
@@ -72,5 +127,18 @@ class User_Preferences(Base):
     preferred_units = Column(
         Enum("Celcius", "Fahrenheit", name="preferred_units_enum")
     )  # (e.g., Celsius or Fahrenheit)
+    # Deprecated free-text favorites, superseded by `Favorite_Location`.
     favorite_locations = Column(Text)
     notification_settings = Column(Boolean)
+
+
+class Favorite_Location(Base):
+    """Associate a user with one of their favorite locations."""
+
+    __tablename__ = "user_favorite_locations"
+    __table_args__ = (UniqueConstraint("user_id", "location_id"),)
+
+    favorite_id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False, index=True)
+    location_id = Column(Integer, ForeignKey("location.location_id"), nullable=False)
+    position = Column(Integer, nullable=False, default=0)
@@ -3,16 +3,21 @@
 """Module for various modules that contain our app."""
 
 from sqlalchemy import (
+    BigInteger,
     Boolean,
     Column,
+    Date,
     DateTime,
     DECIMAL,
     Enum,
     Float,
     ForeignKey,
+    Index,
     Integer,
+    JSON,
     String,
     Text,
+    UniqueConstraint,
 )
 from sqlalchemy.orm import relationship
 from database import Base
@@ -36,6 +41,9 @@ class Weather_Forecast(Base):
     """
 
     __tablename__ = "weather_forecast"
+    __table_args__ = (
+        Index("ix_weather_forecast_location_start", "location_id", "start_time"),
+    )
 
     forecast_id = Column(Integer, primary_key=True, autoincrement=True)
     location_id = Column(Integer, ForeignKey("location.location_id"))
@@ -57,6 +65,15 @@ class Weather_Report(Base):
     """Define a historical weather report for a particular location."""
 
     __tablename__ = "weather_reports"
+    __table_args__ = (
+        # One report per location and start time, re-fetched history is skipped.
+        Index(
+            "uq_weather_reports_location_start",
+            "location_id",
+            "start_time",
+            unique=True,
+        ),
+    )
 
     report_id = Column(Integer, primary_key=True, autoincrement=True)
     location_id = Column(Integer, ForeignKey("location.location_id"))
@@ -74,6 +91,118 @@ class Weather_Report(Base):
         return {c.name: getattr(self, c.name) for c in self.__table__.columns}
 
 
+class Ingestion_Checkpoint(Base):
+    """
+    Define how far the ingestion of a source of weather reports got.
+
+    Updated in the same transaction as the reports of each batch, so that a
+    resumed ingestion neither skips nor duplicates reports.
+
+    Attributes:
+        source (str): Identifies the source, e.g. the path of an archive.
+        position (int): Where to resume, e.g. a byte offset in the archive.
+        records (int): The number of records read from the source so far.
+        updated_at (datetime): When the last batch was written.
+    """
+
+    __tablename__ = "ingestion_checkpoints"
+
+    source = Column(String(512), primary_key=True)
+    position = Column(BigInteger, nullable=False, default=0)
+    records = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False)
+
+
+class Report_Rollup:
+    """
+    Define the aggregates of one measurement of the reports of a location.
+
+    Counts, sums and histograms add up, so a rollup is updated with each batch
+    of new reports, and the rollups of consecutive periods merge into those of
+    a longer range.
+
+    Attributes:
+        location_id (int): The location of the reports.
+        period_start (date): The first day of the period.
+        measurement (str): e.g. "temperature".
+        count (int): The number of reports with a value.
+        total (float): The sum of the values.
+        minimum (float): The lowest value.
+        maximum (float): The highest value.
+        histogram (dict): The number of values per bin, keyed by bin index.
+    """
+
+    location_id = Column(Integer, ForeignKey("location.location_id"), primary_key=True)
+    period_start = Column(Date, primary_key=True)
+    measurement = Column(String(32), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    total = Column(Float, nullable=False, default=0)
+    minimum = Column(Float)
+    maximum = Column(Float)
+    histogram = Column(JSON, nullable=False, default=dict)
+
+
+class Daily_Report_Rollup(Report_Rollup, Base):
+    """Define the aggregates of the weather reports of a location for a day."""
+
+    __tablename__ = "weather_report_daily_rollups"
+
+
+class Monthly_Report_Rollup(Report_Rollup, Base):
+    """Define the aggregates of the weather reports of a location for a month."""
+
+    __tablename__ = "weather_report_monthly_rollups"
+
+
+class Forecast_Accuracy(Base):
+    """
+    Define how well a provider's forecasts for a location matched the reports.
+
+    Scores are kept per measurement and lead time, the number of days between
+    the day a forecast was issued and the day it was for. Errors are forecast
+    minus observed, so a positive bias means the provider over-forecasts.
+
+    Attributes:
+        accuracy_id (int): The unique identifier of the score.
+        provider (str): The provider of the forecasts, e.g. "tomorrow_io".
+        location_id (int): The location of the forecasts.
+        lead_days (int): Days from issuing the forecasts to the day they cover.
+        measurement (str): e.g. "temperature".
+        period_start (date): The first day of the evaluated period.
+        period_end (date): The day after the evaluated period.
+        samples (int): The number of forecasts matched with reports.
+        mae (float): The mean absolute error.
+        rmse (float): The root mean squared error.
+        bias (float): The mean error.
+        evaluated_at (datetime): When the scores were computed.
+    """
+
+    __tablename__ = "forecast_accuracy"
+    __table_args__ = (
+        UniqueConstraint(
+            "provider",
+            "location_id",
+            "lead_days",
+            "measurement",
+            "period_start",
+            "period_end",
+        ),
+    )
+
+    accuracy_id = Column(Integer, primary_key=True, autoincrement=True)
+    provider = Column(String(32), nullable=False)
+    location_id = Column(Integer, ForeignKey("location.location_id"), nullable=False)
+    lead_days = Column(Integer, nullable=False)
+    measurement = Column(String(32), nullable=False)
+    period_start = Column(Date, nullable=False)
+    period_end = Column(Date, nullable=False)
+    samples = Column(Integer, nullable=False)
+    mae = Column(Float, nullable=False)
+    rmse = Column(Float, nullable=False)
+    bias = Column(Float, nullable=False)
+    evaluated_at = Column(DateTime, nullable=False)
+
+
 class Weather_Provider(Base):
     """Define a provider for weather data."""
 
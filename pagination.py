@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+"""Module for opaque keyset pagination cursors."""
+
+import base64
+import json
+
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+
+def encode_cursor(after_id: int) -> str:
+    """Encode the last key of a page into an opaque cursor."""
+    payload = json.dumps({"after": after_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """
+    Decode a cursor built by `encode_cursor`.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        after_id = json.loads(base64.urlsafe_b64decode(padded))["after"]
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(after_id, int):
+        raise ValueError("Invalid cursor")
+    return after_id
+
+
+def estimate_row_count(db: Session, table) -> int:
+    """
+    Estimate the number of rows of a table without counting them.
+
+    Uses the planner statistics on PostgreSQL and the highest rowid on SQLite,
+    which over-counts deleted rows but never scans the table.
+    """
+    if db.bind.dialect.name == "postgresql":
+        estimate = db.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE relname = :name"),
+            {"name": table.name},
+        ).scalar()
+        if estimate is not None and estimate >= 0:
+            return estimate
+    primary_key = list(table.primary_key.columns)[0]
+    return db.query(func.max(primary_key)).scalar() or 0
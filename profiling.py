@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+"""Module to profile single requests on demand.
+
+A request selected with a `profile` query parameter and carrying the
+`PROFILING_TOKEN` in its `X-Profile-Token` header is profiled with
+pyinstrument's sampling profiler. The token is only read from the header,
+so that it stays out of access logs and Referer headers. Samples follow the
+request's coroutines across awaits, so time spent awaiting the upstream
+providers shows under the awaiting call. Code run in the threadpool, i.e.
+synchronous endpoints and dependencies, is not sampled.
+
+The response carries an `X-Profile-Id` header, and the profile is saved as an
+HTML flame graph downloadable from `/profiles/{profile_id}`, with the same
+token in the `X-Profile-Token` header.
+Profiled requests are rate limited across all workers, with counters of
+their own at `PROFILING_THROTTLE_PATH`, and only the latest `PROFILING_KEEP`
+profiles are kept.
+"""
+
+import asyncio
+import hmac
+import logging
+import os
+import re
+import tempfile
+from pathlib import Path
+from urllib.parse import parse_qs
+from uuid import uuid4
+
+from fastapi import Header, HTTPException, status
+from fastapi.responses import FileResponse, JSONResponse
+
+from config import settings
+from throttle import SlidingWindowLimiter, default_counters_path
+
+logger = logging.getLogger(__name__)
+
+_PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+profile_limiter = SlidingWindowLimiter(
+    settings.PROFILING_THROTTLE_PATH or default_counters_path("profiling"),
+    settings.PROFILING_WINDOW_SECONDS,
+)
+
+
+def profiles_dir() -> Path:
+    """Return the directory holding the saved profiles."""
+    return Path(
+        settings.PROFILING_DIR
+        or os.path.join(tempfile.gettempdir(), "forecast-planner-profiles")
+    )
+
+
+def is_trusted(token: str | None) -> bool:
+    """Tell whether a token is the profiling token, when profiling is enabled."""
+    if not settings.PROFILING_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode(), settings.PROFILING_TOKEN.encode())
+
+
+def _requested_token(scope) -> str | None:
+    """Return the profiling token of a request selected for profiling."""
+    query = parse_qs(
+        scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True
+    )
+    if "profile" not in query:
+        return None
+    for name, value in scope["headers"]:
+        if name == b"x-profile-token":
+            return value.decode("latin-1")
+    return None
+
+
+def save_profile(profile_id: str, html: str) -> Path:
+    """Save a rendered profile and remove the oldest ones beyond `PROFILING_KEEP`."""
+    directory = profiles_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{profile_id}.html"
+    path.write_text(html)
+    saved = sorted(directory.glob("*.html"), key=lambda item: item.stat().st_mtime)
+    for old in saved[: max(0, len(saved) - settings.PROFILING_KEEP)]:
+        old.unlink(missing_ok=True)
+    return path
+
+
+class ProfilingMiddleware:
+    """Profile the requests that carry the profiling token."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not settings.PROFILING_TOKEN
+            or scope["path"].startswith("/profiles/")
+            or not is_trusted(_requested_token(scope))
+        ):
+            await self.app(scope, receive, send)
+            return
+        retry_after = await profile_limiter.ahit(
+            [("profile", "all", settings.PROFILING_MAX_PER_WINDOW)]
+        )
+        if retry_after is not None:
+            response = JSONResponse(
+                {"detail": "Too many profiled requests, please retry later."},
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={"Retry-After": str(retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        from pyinstrument import Profiler
+
+        profile_id = uuid4().hex
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-profile-id", profile_id.encode()),
+                ]
+            await send(message)
+
+        profiler = Profiler(interval=settings.PROFILING_INTERVAL_SECONDS)
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profiler.stop()
+            try:
+                # Rendering takes a while, keep it off the event loop.
+                await asyncio.to_thread(
+                    lambda: save_profile(profile_id, profiler.output_html())
+                )
+            except OSError as e:
+                logger.error(f"Could not save profile {profile_id}: {e}")
+
+
+async def download_profile(
+    profile_id: str,
+    x_profile_token: str | None = Header(None),
+) -> FileResponse:
+    """
+    Endpoint to download a saved profile as an HTML flame graph.
+
+    Args:
+        profile_id (str): The `X-Profile-Id` of the profiled response.
+        x_profile_token (str, optional): The profiling token.
+
+    Returns:
+        FileResponse: The profile.
+
+    Raises:
+        HTTPException: 404 if the token is wrong or the profile does not exist.
+    """
+    if not is_trusted(x_profile_token) or not _PROFILE_ID.match(profile_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    path = profiles_dir() / f"{profile_id}.html"
+    if not path.is_file():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    return FileResponse(path, media_type="text/html")
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+"""Module to count and time the database queries made while serving a request.
+
+Statements are attributed to the request being served through a context
+variable, which follows the request into the threads running synchronous
+endpoints and dependencies. At the end of a request, statements executed
+many times with different parameters are reported as likely N+1 patterns,
+and exceeding the query budget raises a `QueryBudgetWarning`. Turn the
+warning into an error in tests with `-W error::query_tracking.QueryBudgetWarning`,
+or assert a budget locally with `track_queries(budget=...)`.
+"""
+
+import logging
+import time
+import warnings
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Iterator
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import settings
+from metrics import record_query_duration
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetWarning(UserWarning):
+    """Issued when a unit of work executes more queries than its budget."""
+
+
+@dataclass
+class QueryStats:
+    """
+    The queries executed within a unit of work, usually a request.
+
+    Attributes:
+        label (str): What the queries were made for, e.g. "GET /api/v1/...".
+        budget (int | None): The maximum number of queries expected, if any.
+        count (int): The number of statements executed.
+        seconds (float): The total time spent executing them.
+        statements (Counter): The number of executions of each SQL statement.
+    """
+
+    label: str
+    budget: int | None = None
+    count: int = 0
+    seconds: float = 0.0
+    statements: Counter = field(default_factory=Counter)
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """List the statements executed at least `threshold` times."""
+        return [
+            (statement, count)
+            for statement, count in self.statements.most_common()
+            if count >= threshold
+        ]
+
+
+_current: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+
+@contextmanager
+def track_queries(label: str = "", budget: int | None = None) -> Iterator[QueryStats]:
+    """
+    Record the queries executed within the block.
+
+    Args:
+        label (str, optional): What the queries are made for, used in the logs.
+        budget (int, optional): Warn with a `QueryBudgetWarning` when more
+          queries than this are executed. Defaults to no budget.
+
+    Yields:
+        QueryStats: The queries executed so far, complete when the block exits.
+
+    Examples:
+        ```python
+        with track_queries("five-day forecast", budget=5) as stats:
+            await query_weather_forecast(location, db, "5d")
+        print(stats.count, stats.seconds)
+        ```
+    """
+    stats = QueryStats(label=label, budget=budget)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+        _report(stats)
+
+
+def _report(stats: QueryStats) -> None:
+    threshold = settings.N_PLUS_ONE_THRESHOLD
+    if threshold > 0:
+        for statement, count in stats.repeated(threshold):
+            logger.warning(
+                f"Possible N+1 query in {stats.label}, executed {count} times: "
+                f"{_shorten(statement)}"
+            )
+    if stats.budget is not None and stats.count > stats.budget:
+        warnings.warn(
+            f"{stats.label} executed {stats.count} queries, "
+            f"over its budget of {stats.budget}",
+            QueryBudgetWarning,
+            stacklevel=4,
+        )
+
+
+def _shorten(text: str, limit: int = 500) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def install_query_tracking(engine: Engine) -> None:
+    """
+    Count and time the statements executed on an engine, logging slow ones.
+
+    Durations also feed the `db_query_duration_seconds` histogram. The start
+    time is kept on the statement's execution context, which is discarded
+    with it even when the statement fails.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._tracking_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def record(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_tracking_started", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        record_query_duration(statement, elapsed)
+        stats = _current.get()
+        if stats is not None:
+            stats.count += 1
+            stats.seconds += elapsed
+            stats.statements[statement] += 1
+        if elapsed >= settings.SLOW_QUERY_SECONDS > 0:
+            logger.warning(
+                f"Slow query ({elapsed * 1000:.1f} ms"
+                f"{' in ' + stats.label if stats else ''}): "
+                f"{_shorten(statement)} parameters={_shorten(repr(parameters))}"
+            )
+
+
+class QueryTrackingMiddleware:
+    """
+    Track the queries of every HTTP request, against `QUERY_BUDGET_PER_REQUEST`.
+
+    The number and duration of the queries are logged at debug level.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        budget = settings.QUERY_BUDGET_PER_REQUEST or None
+        with track_queries(f"{scope['method']} {scope['path']}", budget) as stats:
+            await self.app(scope, receive, send)
+        if stats.count:
+            logger.debug(
+                f"{stats.label} executed {stats.count} queries "
+                f"in {stats.seconds * 1000:.1f} ms"
+            )
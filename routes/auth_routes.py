@@ -2,17 +2,19 @@
 
 """Module to hold routes related to authentication and authorization"""
 
-from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException, status
-from jose import JWTError, jwt
+import logging
+from typing import Annotated, List, Literal
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.orm import Session
 from datetime import timedelta
 from fastapi.security import OAuth2PasswordRequestForm
 from models.token_blocklist import TokenBlocklist
+from models.user import HashingPoolSaturated
 
 import schemas
 import database
 import crud
+from cache import principal_cache
 from auth import (
     authenticate_user,
     create_access_token,
@@ -23,19 +25,31 @@ from auth import (
 )
 from auth import ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS
 from config import settings
+from services.dashboard_service import build_dashboard
+from services.forecast_recommendation_service import resolve_location
+from throttle import login_limiter
 
 router = APIRouter()
 
+logger = logging.getLogger(__name__)
+
 
 @router.post("/login", response_model=schemas.Token)
 async def login_for_access_token(
+    request: Request,
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
     db: Session = Depends(database.get_db),
 ) -> schemas.Token:
     """
     Endpoint to authenticate a user and generate an access token.
 
+    Attempts are rate limited per phone number and per client IP over a sliding
+    window, and rejected before any database lookup or password hashing. The
+    client IP is taken from X-Forwarded-For when the request comes through a
+    trusted proxy, see `forwarded_allow_ips` in gunicorn.conf.py.
+
     Args:
+        request (Request): The incoming request, used to identify the client.
         form_data (OAuth2PasswordRequestForm): Form data containing the username and password.
         db (Session, optional): Database session. Defaults to Depends(database.get_db).
 
@@ -43,7 +57,9 @@ async def login_for_access_token(
         schemas.Token: Token response containing the access token and refresh token.
 
     Raises:
-        HTTPException: If the username or password is incorrect.
+        HTTPException: If the username or password is incorrect, with a 429 status
+          if too many attempts were made, or with a 503 status if the password
+          hashing pool is saturated.
 
     Examples:
         Example usage to authenticate a user:
@@ -54,13 +70,34 @@ async def login_for_access_token(
         }
         ```
     """
-    user = authenticate_user(db, form_data.username, form_data.password)
+    client_ip = request.client.host if request.client else "unknown"
+    retry_after = await login_limiter.ahit(
+        [
+            ("phone", form_data.username, settings.LOGIN_MAX_ATTEMPTS_PER_PHONE),
+            ("ip", client_ip, settings.LOGIN_MAX_ATTEMPTS_PER_IP),
+        ]
+    )
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts, please retry later.",
+            headers={"Retry-After": str(retry_after)},
+        )
+    try:
+        user = await authenticate_user(db, form_data.username, form_data.password)
+    except HashingPoolSaturated:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many login attempts in progress, please retry shortly.",
+            headers={"Retry-After": "1"},
+        )
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    await login_limiter.areset("phone", form_data.username)
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": user.phone}, expires_delta=access_token_expires
@@ -74,6 +111,33 @@ async def login_for_access_token(
     )
 
 
+@router.get("/login/throttle")
+async def read_login_throttle_stats(
+    current_user: schemas.UserCreate = Depends(get_current_user),
+) -> dict[str, dict[str, int]]:
+    """
+    Endpoint to monitor the login rate limiter.
+
+    User must be authenticated to access this endpoint.
+
+    Args:
+        current_user (schemas.UserCreate, optional): Current authenticated user. Defaults to Depends(get_current_user).
+
+    Returns:
+        dict: The number of allowed and rejected login attempts per scope, across all workers.
+
+    Examples:
+        Example response:
+        ```python
+        {
+            "phone": {"allowed": 120, "rejected": 4},
+            "ip": {"allowed": 120, "rejected": 31}
+        }
+        ```
+    """
+    return login_limiter.stats()
+
+
 @router.post("/token/refresh", response_model=schemas.Token)
 async def refresh_token(
     refresh_token: str, db: Session = Depends(database.get_db)
@@ -99,6 +163,8 @@ async def refresh_token(
         }
         ```
     """
+    from jose import JWTError, jwt
+
     try:
         payload = jwt.decode(
             refresh_token, settings.SECRET_KEY, algorithms=settings.ALGORITHM
@@ -188,4 +254,135 @@ async def logout_user(
         ```
     """
     TokenBlocklist.save_from_token(token, db)
+    principal_cache.invalidate_tag(current_user.user_id)
     return {"detail": "Successfully logged out."}
+
+
+@router.get("/me/favorites", response_model=List[schemas.Location])
+async def read_favorite_locations(
+    current_user: schemas.UserCreate = Depends(get_current_user),
+    db: Session = Depends(database.get_db),
+):
+    """
+    Endpoint to list the favorite locations of the authenticated user.
+
+    Args:
+        current_user (schemas.UserCreate, optional): Current authenticated user. Defaults to Depends(get_current_user).
+        db (Session, optional): Database session. Defaults to Depends(database.get_db).
+
+    Returns:
+        List[schemas.Location]: The favorite locations, in the user's order.
+    """
+    return crud.get_favorite_locations(db, current_user.user_id)
+
+
+@router.post("/me/favorites", response_model=schemas.Location)
+async def add_favorite_location(
+    favorite: schemas.FavoriteLocationCreate,
+    current_user: schemas.UserCreate = Depends(get_current_user),
+    db: Session = Depends(database.get_db),
+):
+    """
+    Endpoint to add a location to the favorites of the authenticated user.
+
+    Args:
+        favorite (schemas.FavoriteLocationCreate): The location name or coordinates.
+        current_user (schemas.UserCreate, optional): Current authenticated user. Defaults to Depends(get_current_user).
+        db (Session, optional): Database session. Defaults to Depends(database.get_db).
+
+    Returns:
+        schemas.Location: The favorite location.
+
+    Raises:
+        HTTPException: If no location is given, it cannot be found, or the user
+          already has `MAX_FAVORITE_LOCATIONS` favorites.
+
+    Examples:
+        Example usage to add a favorite location:
+        ```python
+        {
+            "location_name": "Mombasa"
+        }
+        ```
+    """
+    if not favorite.location_name and (
+        favorite.latitude is None or favorite.longitude is None
+    ):
+        raise HTTPException(
+            status_code=400, detail="A location name or coordinates are required"
+        )
+    favorites = crud.get_favorite_locations(db, current_user.user_id)
+    if len(favorites) >= settings.MAX_FAVORITE_LOCATIONS:
+        raise HTTPException(
+            status_code=409,
+            detail=f"At most {settings.MAX_FAVORITE_LOCATIONS} favorite locations",
+        )
+    try:
+        location = await resolve_location(
+            favorite.location_name, favorite.latitude, favorite.longitude, db
+        )
+    except Exception as e:
+        logger.error(f"Could not resolve favorite location: {e}")
+        raise HTTPException(status_code=404, detail="Location not found")
+    crud.add_favorite_location(db, current_user.user_id, location)
+    return location
+
+
+@router.delete("/me/favorites/{location_id}")
+async def remove_favorite_location(
+    location_id: int,
+    current_user: schemas.UserCreate = Depends(get_current_user),
+    db: Session = Depends(database.get_db),
+):
+    """
+    Endpoint to remove a location from the favorites of the authenticated user.
+
+    Args:
+        location_id (int): The ID of the location.
+        current_user (schemas.UserCreate, optional): Current authenticated user. Defaults to Depends(get_current_user).
+        db (Session, optional): Database session. Defaults to Depends(database.get_db).
+
+    Returns:
+        dict: Success message.
+
+    Raises:
+        HTTPException: If the location is not a favorite of the user.
+    """
+    if not crud.remove_favorite_location(db, current_user.user_id, location_id):
+        raise HTTPException(status_code=404, detail="Favorite location not found")
+    return {"detail": "Favorite location removed."}
+
+
+@router.get("/me/dashboard", response_model=schemas.Dashboard)
+async def read_dashboard(
+    forecast_type: Literal["current_weather", "five-day_weather"] = "current_weather",
+    current_user: schemas.UserCreate = Depends(get_current_user),
+    db: Session = Depends(database.get_db),
+):
+    """
+    Endpoint to get the forecasts and recommendations of every favorite location.
+
+    Favorites are loaded with a single query. Forecasts come from a shared
+    cache, and those missing from it are fetched concurrently, so the whole
+    dashboard is served in one round trip.
+
+    Args:
+        forecast_type (str, optional): "current_weather" or "five-day_weather".
+          Defaults to "current_weather".
+        current_user (schemas.UserCreate, optional): Current authenticated user. Defaults to Depends(get_current_user).
+        db (Session, optional): Database session. Defaults to Depends(database.get_db).
+
+    Returns:
+        schemas.Dashboard: The forecasts and recommendations per favorite location.
+
+    Examples:
+        Example usage to get the five day dashboard:
+        ```python
+        GET /api/v1/auth/me/dashboard?forecast_type=five-day_weather
+        ```
+    """
+    locations = crud.get_favorite_locations(db, current_user.user_id)
+    dashboard = await build_dashboard(locations, forecast_type)
+    return Response(
+        content=dashboard.model_dump_json(), media_type="application/json"
+    )
@@ -3,24 +3,31 @@
 
 """Module to hold routes related to users"""
 
-from typing import Generator, List
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Generator, List, Literal
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 import crud
 import schemas
 import auth
 from database import get_db
+from models.user import Hasher, HashingPoolSaturated, User
+from pagination import decode_cursor, encode_cursor, estimate_row_count
+from services.user_import_service import RowParser, UserImporter, get_hashing_pool
+from streaming import aiter_lines
 
 router = APIRouter()
 
 
 # create a user
 @router.post("/register", response_model=schemas.UserShow)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     """
     Create a new user.
 
+    The password is hashed on the bounded password hashing pool.
+
     Args:
         user (schemas.UserCreate): The user data.
         db (Session, optional): The database session. Defaults to Depends(get_db).
@@ -39,7 +46,8 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
         ```
 
     Raises:
-        HTTPException: If the user's credentials (email or phone) are already registered.
+        HTTPException: If the user's credentials (email or phone) are already registered,
+          or with a 503 status if the password hashing pool is saturated.
 
     """
     db_user = crud.get_user_by_phone(db, phone=user.phone)
@@ -48,33 +56,116 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
         raise HTTPException(
             status_code=400, detail="Credentials already registered (email or phone)"
         )
-    return crud.create_user(db=db, user=user)
+    try:
+        password_hash = await Hasher.aget_password_hash(user.password)
+    except HashingPoolSaturated:
+        raise auth.hashing_pool_saturated_exception
+    return crud.create_user(db=db, user=user, password_hash=password_hash)
 
 
 # get all users (default = 100)
 @router.get("/users", response_model=List[schemas.UserShow])
 def read_users(
+    response: Response,
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1),
+    cursor: str | None = None,
+    include_total: bool = False,
     db: Session = Depends(get_db),
     current_user: schemas.UserShow = Depends(auth.get_current_user),
 ):
     """
     Get all users.
 
+    Users are paged by user_id. Pass the `X-Next-Cursor` header of a response
+    as `cursor` to get the next page; it is absent on the last page. Cursor
+    pages cost the same however deep they are, unlike `skip`.
+
     Args:
-        skip (int, optional): Number of users to skip. Defaults to 0.
+        response (Response): The outgoing response, used to set pagination headers.
+        skip (int, optional): Number of users to skip when no cursor is given. Defaults to 0.
         limit (int, optional): Maximum number of users to retrieve. Defaults to 100.
+        cursor (str, optional): The opaque cursor of the page to retrieve. Defaults to None.
+        include_total (bool, optional): Send an estimate of the total number of users
+          in the `X-Total-Count-Estimate` header. Defaults to False.
         db (Session, optional): The database session. Defaults to Depends(get_db).
         current_user (schemas.UserShow, optional): The current user. Defaults to Depends(auth.get_current_user).
 
     Returns:
         List[schemas.UserShow]: List of users.
+
+    Raises:
+        HTTPException: If the cursor is invalid.
     """
-    users = crud.get_users(db, skip=skip, limit=limit)
+    after_id = None
+    if cursor is not None:
+        try:
+            after_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    # fetch one extra user to know whether there is a next page
+    users = crud.get_users(db, skip=skip, limit=limit + 1, after_id=after_id)
+    if len(users) > limit:
+        users = users[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(users[-1].user_id)
+    if include_total:
+        response.headers["X-Total-Count-Estimate"] = str(
+            estimate_row_count(db, User.__table__)
+        )
     return users
 
 
+# bulk import users
+@router.post("/users/import")
+async def import_users(
+    request: Request,
+    format: Literal["csv", "ndjson"] | None = None,
+    db: Session = Depends(get_db),
+    current_user: schemas.UserShow = Depends(auth.get_current_user),
+):
+    """
+    Bulk import users from a streamed CSV or NDJSON body.
+
+    The body is read and imported in batches as it arrives: each batch is
+    checked against existing phones and emails with set-based queries, its
+    passwords are hashed on a process pool and it is inserted at once.
+
+    Args:
+        request (Request): The incoming request, whose body holds one user per line.
+        format (str, optional): "csv" (with a header line) or "ndjson". Defaults to
+          "csv" for a text/csv content type, "ndjson" otherwise.
+        db (Session, optional): The database session. Defaults to Depends(get_db).
+        current_user (schemas.UserShow, optional): The current user. Defaults to Depends(auth.get_current_user).
+
+    Returns:
+        dict: The number of users created and failed, the errors of the first
+          rejected rows and the throughput.
+
+    Examples:
+        Example NDJSON body to import two users:
+        ```python
+        {"phone": "0712345678", "password": "secret", "email": "a@example.com"}
+        {"phone": "0723456789", "password": "secret", "gender": "female"}
+        ```
+    """
+    if format is None:
+        is_csv = "csv" in request.headers.get("content-type", "")
+        format = "csv" if is_csv else "ndjson"
+    parser = RowParser(format)
+    importer = UserImporter(db, get_hashing_pool())
+    batch = []
+    async for line in aiter_lines(request.stream()):
+        row = parser.parse(line)
+        if row is not None:
+            batch.append(row)
+        if len(batch) >= importer.batch_size:
+            await run_in_threadpool(importer.import_batch, batch)
+            batch = []
+    if batch:
+        await run_in_threadpool(importer.import_batch, batch)
+    return importer.report()
+
+
 # get a user by their id
 @router.get("/users/{user_id}", response_model=schemas.UserShow)
 def read_user(
@@ -112,7 +203,7 @@ def read_user(
 
 # update a user
 @router.put("/users/{user_id}", response_model=schemas.UserShow)
-def update_user(
+async def update_user(
     user_id: int,
     user: schemas.UserUpdate,  # Fix: Change UserCreate to UserUpdate
     db: Session = Depends(get_db),
@@ -121,6 +212,8 @@ def update_user(
     """
     Update a user.
 
+    A new password is hashed on the bounded password hashing pool.
+
     Args:
         user_id (int): The ID of the user to update.
         user (schemas.UserUpdate): The updated user data.
@@ -131,7 +224,8 @@ def update_user(
         schemas.UserShow: The updated user.
 
     Raises:
-        HTTPException: If the user is not found in the database.
+        HTTPException: If the user is not found in the database, or with a 503
+          status if the password hashing pool is saturated.
 
     Examples:
         Example usage to update a user:
@@ -146,7 +240,15 @@ def update_user(
     db_user = crud.get_user(db, user_id=user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
-    return crud.update_user(db=db, user=user, user_id=user_id)
+    password_hash = None
+    if user.password:
+        try:
+            password_hash = await Hasher.aget_password_hash(user.password)
+        except HashingPoolSaturated:
+            raise auth.hashing_pool_saturated_exception
+    return crud.update_user(
+        db=db, user=user, user_id=user_id, password_hash=password_hash
+    )
 
 
 # delete a user
@@ -181,8 +283,7 @@ def delete_user(
     db_user = crud.get_user(db, user_id=user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
-    db.delete(db_user)
-    db.commit()
+    crud.delete_user(db, user_id=user_id)
     return db_user
 
 
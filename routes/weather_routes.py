@@ -2,17 +2,43 @@
 
 """Weather related endpoints."""
 from datetime import datetime, timedelta, date
-from typing import Dict, List, Optional, Union
-from fastapi import APIRouter, Depends, HTTPException, Path
+from typing import Dict, List, Literal, Optional, Union
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Path,
+    Query,
+    Request,
+    Response,
+)
+from fastapi.responses import StreamingResponse
 import logging
 from sqlalchemy.orm import Session
 
 import database
 import schemas
 from config import settings
-from models.location import get_or_create_location
+from http_cache import forecast_cache_headers, is_not_modified, not_modified_response
+from models.location import Location, get_or_create_location
+from services.forecast_recommendation_service import (
+    FORECAST_TYPES,
+    build_forecast_recommendations,
+    fetch_forecasts,
+    resolve_location,
+    serialize_forecast_recommendations,
+)
+from services.realtime_service import hub as realtime_hub
 from services.recommendation_service import WeatherAnalyzer, WeatherRecommender
-from services.weather_service import query_weather_forecast
+from services.report_statistics_service import DEFAULT_PERCENTILES, query_statistics
+from services.weather_service import (
+    is_forecast_cached,
+    query_forecast_validator,
+    query_weather_forecast,
+    stream_forecast_rows,
+)
+from streaming import stream_rows
+from tracing import span
 
 
 logger = logging.getLogger(__name__)
@@ -21,6 +47,36 @@ units = settings.DEFAULT_UNITS
 default_location = settings.DEFAULT_LOCATION
 api_key = settings.TOMORROW_IO_API_KEY
 fields = []
+# Seconds between keep-alive comments on idle realtime subscriptions.
+SSE_HEARTBEAT_SECONDS = 15
+
+
+def _cache_headers(
+    location: Location,
+    db: Session,
+    forecast_type: str,
+    variant: str,
+    cached_only: bool = False,
+) -> dict[str, str]:
+    """Build the conditional caching headers for the stored forecasts of a location.
+
+    Args:
+        location (Location): The location of the forecasts.
+        db (Session): The database session.
+        forecast_type (str): The type of forecast, either "realtime" or "5d".
+        variant (str): Distinguishes the representations of the same forecasts.
+        cached_only (bool, optional): Return no headers if the forecast would be
+            fetched from the upstream provider. Defaults to False.
+
+    Returns:
+        dict[str, str]: The ETag, Last-Modified and Cache-Control headers.
+    """
+    last_modified, periods = query_forecast_validator(location, db, forecast_type)
+    if cached_only and not is_forecast_cached(periods, forecast_type):
+        return {}
+    return forecast_cache_headers(
+        location.location_id, last_modified, periods, forecast_type, variant
+    )
 
 
 @router.get("/current_weather", response_model=schemas.WeatherForecast)
@@ -29,6 +85,8 @@ async def get_current_weather(
     latitude: float | None = None,
     longitude: float | None = None,
     db: Session = Depends(database.get_db),
+    request: Request = None,
+    response: Response = None,
 ):
     """Get the current weather forecast for a location.
 
@@ -37,6 +95,8 @@ async def get_current_weather(
         latitude (float, optional): The latitude of the location. Defaults to None.
         longitude (float, optional): The longitude of the location. Defaults to None.
         db (Session, optional): The database session. Defaults to Depends(database.get_db).
+        request (Request, optional): The incoming request, used for conditional requests.
+        response (Response, optional): The outgoing response, used to set caching headers.
 
     Returns:
         schemas.WeatherForecast: The current weather forecast for the specified location or default_location(Nairobi).
@@ -72,10 +132,18 @@ async def get_current_weather(
             location = await get_or_create_location(f"{latitude},{longitude}", db)
         else:
             location = await get_or_create_location(default_location, db)
+        cache_headers = _cache_headers(location, db, "realtime", "current_weather", True)
+        if is_not_modified(request, cache_headers):
+            return not_modified_response(cache_headers)
         forecast = await query_weather_forecast(location, db, "realtime")
-        forecast_dict = forecast.__dict__
-        forecast_dict["location_name"] = location.city_name
-        forecast_object = schemas.WeatherForecast(**forecast_dict)
+        with span("build_response"):
+            forecast_dict = forecast.__dict__
+            forecast_dict["location_name"] = location.city_name
+            forecast_object = schemas.WeatherForecast(**forecast_dict)
+            if response is not None:
+                response.headers.update(
+                    _cache_headers(location, db, "realtime", "current_weather")
+                )
         return forecast_object
     except Exception as e:
         logger.error(f"get_current_weather function encountered an error: {str(e)}")
@@ -88,6 +156,8 @@ async def get_five_day_forecast(
     latitude: float | None = None,
     longitude: float | None = None,
     db: Session = Depends(database.get_db),
+    request: Request = None,
+    response: Response = None,
 ):
     """Get a five day weather forecast for a location.
 
@@ -96,6 +166,8 @@ async def get_five_day_forecast(
         latitude (float, optional): The latitude of the location. Defaults to None.
         longitude (float, optional): The longitude of the location. Defaults to None.
         db (Session, optional): The database session. Defaults to Depends(database.get_db).
+        request (Request, optional): The incoming request, used for conditional requests.
+        response (Response, optional): The outgoing response, used to set caching headers.
 
     Returns:
         list[schemas.WeatherForecast]: The five day weather forecast for the location.
@@ -131,17 +203,27 @@ async def get_five_day_forecast(
             location = await get_or_create_location(f"{latitude},{longitude}", db)
         else:
             location = await get_or_create_location(default_location, db)
+        cache_headers = _cache_headers(location, db, "5d", "five-day_weather", True)
+        if is_not_modified(request, cache_headers):
+            return not_modified_response(cache_headers)
         forecast = await query_weather_forecast(location, db, "5d")
         #forecast_dict = forecast.__dict__
         #forecast_dict["location_name"] = location.city_name
         #forecast_object = schemas.WeatherForecast(**forecast_dict)
         # create a location_name key in every forecast item in forecast
-        forecast_dicts: List[dict] = []
-        for day in forecast:
-            day_dict = day.__dict__
-            day_dict["location_name"] = location.city_name
-            forecast_dicts.append(day_dict)
-        forecast_objects = [schemas.WeatherForecast(**day) for day in forecast_dicts]
+        with span("build_response"):
+            forecast_dicts: List[dict] = []
+            for day in forecast:
+                day_dict = day.__dict__
+                day_dict["location_name"] = location.city_name
+                forecast_dicts.append(day_dict)
+            forecast_objects = [
+                schemas.WeatherForecast(**day) for day in forecast_dicts
+            ]
+            if response is not None:
+                response.headers.update(
+                    _cache_headers(location, db, "5d", "five-day_weather")
+                )
         return forecast_objects
     except Exception as e:
         logger.error(f"get_five_day_forecast function encountered an error: {str(e)}")
@@ -155,6 +237,8 @@ async def get_a_days_weather(
     latitude: float | None = None,
     longitude: float | None = None,
     db: Session = Depends(database.get_db),
+    request: Request = None,
+    response: Response = None,
 ):
     """Get the weather forecast for a particular day.
 
@@ -164,6 +248,8 @@ async def get_a_days_weather(
         latitude (float, optional): The latitude of the location. Defaults to None.
         longitude (float, optional): The longitude of the location. Defaults to None.
         db (Session, optional): The database session. Defaults to Depends(database.get_db).
+        request (Request, optional): The incoming request, used for conditional requests.
+        response (Response, optional): The outgoing response, used to set caching headers.
 
     Returns:
         schemas.WeatherForecast: The weather forecast for the particular day.
@@ -209,12 +295,21 @@ async def get_a_days_weather(
             location = await get_or_create_location(f"{latitude},{longitude}", db)
         else:
             location = await get_or_create_location(default_location, db)
+        variant = f"a_days_weather:{day.isoformat()}"
+        cache_headers = _cache_headers(location, db, "5d", variant, True)
+        if is_not_modified(request, cache_headers):
+            return not_modified_response(cache_headers)
         forecast = await query_weather_forecast(location, db, "5d")
         for forecast_day in forecast:
             if forecast_day.start_time.date() == day:
-                forecast_day_dict  = forecast_day.__dict__
-                forecast_day_dict["location_name"] = location.city_name
-                return schemas.WeatherForecast(**forecast_day_dict)
+                with span("build_response"):
+                    forecast_day_dict  = forecast_day.__dict__
+                    forecast_day_dict["location_name"] = location.city_name
+                    if response is not None:
+                        response.headers.update(
+                            _cache_headers(location, db, "5d", variant)
+                        )
+                    return schemas.WeatherForecast(**forecast_day_dict)
         raise HTTPException(
             status_code=404, detail="Weather forecast not available for the day."
         )
@@ -267,6 +362,182 @@ async def get_recommendations(weather_data: schemas.WeatherRecommenderData):
         )
 
 
+@router.get("/forecasts/export")
+def export_forecasts(
+    request: Request,
+    location_name: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    format: Literal["ndjson", "json"] = "ndjson",
+    db: Session = Depends(database.get_db),
+):
+    """Stream stored weather forecasts.
+
+    Rows are read through a server-side cursor and sent as they are encoded,
+    so memory use is constant whatever the size of the export. The body is
+    compressed with brotli or gzip when the client accepts it.
+
+    Args:
+        request (Request): The incoming request, used to negotiate the content encoding.
+        location_name (str, optional): Only export forecasts for this location. Defaults to None.
+        start (datetime, optional): Only export forecasts starting at or after this time. Defaults to None.
+        end (datetime, optional): Only export forecasts starting before this time. Defaults to None.
+        format (str, optional): "ndjson" for one forecast per line or "json" for an array. Defaults to "ndjson".
+        db (Session, optional): The database session. Defaults to Depends(database.get_db).
+
+    Returns:
+        StreamingResponse: The forecasts.
+
+    Raises:
+        HTTPException: If the location is unknown.
+
+    Examples:
+        Example usage to export the forecasts of a location as a JSON array:
+        ```python
+        {
+            "location_name": "Nairobi",
+            "format": "json"
+        }
+        ```
+    """
+    location_id = None
+    if location_name:
+        location = (
+            db.query(Location)
+            .filter(Location.name == location_name.strip().lower())
+            .first()
+        )
+        if location is None:
+            raise HTTPException(status_code=404, detail="Location not found.")
+        location_id = location.location_id
+
+    def rows():
+        # The request scoped session is closed before the body is streamed.
+        export_db = database.SessionLocal()
+        try:
+            yield from stream_forecast_rows(export_db, location_id, start, end)
+        finally:
+            export_db.close()
+
+    return stream_rows(rows(), format, request.headers.get("accept-encoding"))
+
+
+@router.get("/history/statistics", response_model=schemas.WeatherStatistics)
+def get_historical_statistics(
+    start_date: date,
+    end_date: date,
+    location_name: str | None = None,
+    percentiles: list[float] = Query(list(DEFAULT_PERCENTILES)),
+    db: Session = Depends(database.get_db),
+):
+    """Get statistics of the historical weather reports of a location.
+
+    The statistics are computed from the daily and monthly rollups of the
+    reports, so the time taken grows with the number of days in the range,
+    not with the number of reports. Percentiles are estimated from histograms
+    and are accurate to a degree or half a degree for temperatures.
+
+    Args:
+        start_date (date): The first day of the range, inclusive.
+        end_date (date): The last day of the range, inclusive.
+        location_name (str, optional): The name of the location. Defaults to the default location.
+        percentiles (list[float], optional): The percentiles to estimate, between 0 and 100. Defaults to 5, 50 and 95.
+        db (Session, optional): The database session. Defaults to Depends(database.get_db).
+
+    Returns:
+        schemas.WeatherStatistics: The count, min, max, mean and percentiles of the temperature, humidity and precipitation probability.
+
+    Raises:
+        HTTPException: If the range or percentiles are invalid, or the location is unknown.
+
+    Examples:
+        Example usage to get the statistics of a year with the deciles:
+        ```python
+        {
+            "location_name": "Nairobi",
+            "start_date": "2023-01-01",
+            "end_date": "2023-12-31",
+            "percentiles": [10, 50, 90]
+        }
+        ```
+    """
+    if end_date < start_date:
+        raise HTTPException(
+            status_code=400, detail="end_date must not be before start_date."
+        )
+    if any(not 0 <= percent <= 100 for percent in percentiles):
+        raise HTTPException(
+            status_code=400, detail="Percentiles must be between 0 and 100."
+        )
+    location = (
+        db.query(Location)
+        .filter(Location.name == (location_name or default_location).strip().lower())
+        .first()
+    )
+    if location is None:
+        raise HTTPException(status_code=404, detail="Location not found.")
+    with span("query_statistics", days=(end_date - start_date).days + 1):
+        statistics = query_statistics(
+            db, location.location_id, start_date, end_date, percentiles
+        )
+    return schemas.WeatherStatistics(
+        location_id=location.location_id,
+        location_name=location.city_name,
+        start_date=start_date,
+        end_date=end_date,
+        **statistics,
+    )
+
+
+@router.get("/realtime/subscribe")
+async def subscribe_to_realtime_weather(
+    request: Request,
+    location_name: str | None = None,
+):
+    """Subscribe to realtime weather updates for a location with Server-Sent Events.
+
+    A single poller per location in this worker fetches the realtime weather and
+    fans every change out to all subscribers, instead of each client polling.
+    Slow clients only receive the latest updates.
+
+    Args:
+        request (Request): The incoming request, used to detect disconnects.
+        location_name (str, optional): The name of the location. Defaults to default_location(Nairobi).
+
+    Returns:
+        StreamingResponse: A text/event-stream of `forecast` events holding a schemas.WeatherForecast.
+
+    Examples:
+        Example usage to subscribe to the realtime weather of a location:
+        ```python
+        {
+            "location_name": "New York",
+        }
+        ```
+    """
+
+    async def events():
+        subscription = realtime_hub.subscribe(location_name or default_location)
+        try:
+            yield b"retry: 5000\n\n"
+            while not await request.is_disconnected():
+                payload = await subscription.get(timeout=SSE_HEARTBEAT_SECONDS)
+                if payload is not None:
+                    yield b"event: forecast\ndata: " + payload + b"\n\n"
+                elif subscription.closed:
+                    break
+                else:
+                    yield b": keep-alive\n\n"
+        finally:
+            realtime_hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/{forecast_type}", response_model=list[schemas.WeatherForecast])
 async def get_weather_forecast(
     forecast_type: str = Path(
@@ -278,6 +549,8 @@ async def get_weather_forecast(
     longitude: float | None = None,
     day: date | None = None,
     db: Session = Depends(database.get_db),
+    request: Request = None,
+    response: Response = None,
 ):
     """Get the weather forecast based on the forecast type.
 
@@ -298,6 +571,8 @@ async def get_weather_forecast(
         longitude (float, optional): The longitude of the location. Defaults to None.
         day (date, optional): The date for which to retrieve the weather forecast. Defaults to None.
         db (Session, optional): The database session. Defaults to Depends(database.get_db).
+        request (Request, optional): The incoming request, used for conditional requests.
+        response (Response, optional): The outgoing response, used to set caching headers.
 
     Returns:
         list[schemas.WeatherForecast]: The weather forecast based on the forecast type.
@@ -332,9 +607,9 @@ async def get_weather_forecast(
     """
     try:
         if forecast_type == "current_weather":
-            return await get_current_weather(location_name, latitude, longitude, db)
+            return await get_current_weather(location_name, latitude, longitude, db, request, response)
         elif forecast_type == "five-day_weather":
-            return await get_five_day_forecast(location_name, latitude, longitude, db)
+            return await get_five_day_forecast(location_name, latitude, longitude, db, request, response)
         elif forecast_type == "a_days_weather":
             if day is None:
                 raise HTTPException(
@@ -348,7 +623,7 @@ async def get_weather_forecast(
                     status_code=404,
                     detail="Weather forecast not available for the day: date need to be today(+5 days)."
                 )
-            return await get_a_days_weather(day, location_name, latitude, longitude, db)
+            return await get_a_days_weather(day, location_name, latitude, longitude, db, request, response)
         else:
             raise HTTPException(
                 status_code=400,
@@ -359,7 +634,7 @@ async def get_weather_forecast(
         raise HTTPException(status_code=500, detail=f"Could not retrieve the weather forecast.")
 
 
-@router.get("/weather_and_recommendations/{forecast_type}", response_model=List[Dict[str, Union[dict, schemas.WeatherForecast, schemas.Recommendation]]])
+@router.get("/weather_and_recommendations/{forecast_type}", response_model=List[schemas.ForecastRecommendation])
 async def get_weather_and_recommendations(
     forecast_type: str = Path(
         ...,
@@ -370,10 +645,14 @@ async def get_weather_and_recommendations(
     longitude: Optional[float] = None,
     day: Optional[date] = None,
     db: Session = Depends(database.get_db),
-) -> List[Dict[str, Union[dict, schemas.WeatherForecast, schemas.Recommendation]]]:
+    request: Request = None,
+) -> Response:
     """
     Retrieves the weather forecast and recommendations based on the provided parameters.
 
+    The forecast is fetched once, analyzed in a single batch and the response body
+    is serialized in one pass.
+
     Args:
         forecast_type (str): The type of forecast to return.
             Possible values are 'current_weather', 'five-day_weather', 'a_days_weather'.
@@ -382,29 +661,63 @@ async def get_weather_and_recommendations(
         longitude (float, optional): The longitude of the location. Defaults to None.
         day (date, optional): The specific day for the forecast. Defaults to None.
         db (Session, optional): The database session. Defaults to Depends(database.get_db).
+        request (Request, optional): The incoming request, used for conditional requests.
 
     Returns:
-        List[Dict[str, Union[dict, schemas.WeatherForecast, schemas.Recommendation]]]: 
-        A list of dictionaries containing the forecast and recommendations.
+        Response: A JSON list of objects containing the forecast and recommendations.
 
     Raises:
-        HTTPException: If an error occurs while retrieving the weather and recommendations.
+        HTTPException: 400 for an invalid forecast type, day or location, 404 if the day has no forecast, 500 if the forecast cannot be retrieved or analyzed.
     """
     try:
-        weather_forecast = await get_weather_forecast(forecast_type, location_name, latitude, longitude, day, db)
-        if isinstance(weather_forecast, List):
-            forecasts_and_recommendations = []
-            for forecast in weather_forecast:
-                recommendations = await get_recommendations(schemas.WeatherRecommenderData(**forecast.__dict__))
-                days_forecast_and_recommendation = {"forecast": forecast.__dict__, "recommendations": recommendations}
-                forecasts_and_recommendations.append(days_forecast_and_recommendation)
-            return forecasts_and_recommendations
+        if forecast_type not in FORECAST_TYPES:
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid forecast type provided. Valid values are 'current_weather', 'five-day_weather', 'a_days_weather'."
+            )
+        if forecast_type == "a_days_weather":
+            if day is None:
+                raise HTTPException(
+                    status_code=400,
+                    detail="Day parameter is required for a_days_weather forecast type."
+                )
+            if day < datetime.date(datetime.now()) or day > datetime.date(
+                datetime.now() + timedelta(days=5)
+            ):
+                raise HTTPException(
+                    status_code=404,
+                    detail="Weather forecast not available for the day: date need to be today(+5 days)."
+                )
         else:
-            recommendations = await get_recommendations(schemas.WeatherRecommenderData(**weather_forecast.__dict__))
-        return [{"forecast": weather_forecast.__dict__, "recommendations": recommendations}]
-    except ValueError as e:
-        logger.error(f"get_weather_and_recommendations function encountered an error: {str(e)}")
-        raise HTTPException(status_code=400, detail=str(e))
+            day = None
+        try:
+            location = await resolve_location(location_name, latitude, longitude, db)
+        except ValueError as e:
+            # Only a malformed location is the client's fault, e.g. "1,2,3".
+            raise HTTPException(status_code=400, detail=f"Invalid location: {e}")
+        variant = f"weather_and_recommendations:{forecast_type}:{day}"
+        cache_headers = _cache_headers(
+            location, db, FORECAST_TYPES[forecast_type], variant, True
+        )
+        if is_not_modified(request, cache_headers):
+            return not_modified_response(cache_headers)
+        forecasts = await fetch_forecasts(location, db, forecast_type, day)
+        if not forecasts and forecast_type == "a_days_weather":
+            raise HTTPException(
+                status_code=404, detail="Weather forecast not available for the day."
+            )
+        if not forecasts and forecast_type == "current_weather":
+            raise HTTPException(
+                status_code=500, detail="Could not retrieve the current weather forecast."
+            )
+        forecasts_and_recommendations = build_forecast_recommendations(
+            forecasts, location.city_name
+        )
+        return Response(
+            content=serialize_forecast_recommendations(forecasts_and_recommendations),
+            media_type="application/json",
+            headers=_cache_headers(location, db, FORECAST_TYPES[forecast_type], variant),
+        )
     except HTTPException as e:
         if e.status_code != 500:
             raise
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+"""Module to run background jobs from the app lifespan."""
+
+import asyncio
+import contextvars
+import fcntl
+import logging
+import os
+import tempfile
+from typing import Awaitable, Callable, Coroutine
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderLock:
+    """
+    Elect a single process on the host to run a job.
+
+    The holder keeps an exclusive lock on a file, which the operating system
+    releases if the process dies so that another worker can take over.
+    """
+
+    def __init__(self, name: str):
+        directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+        self.path = os.path.join(directory, f"forecast-planner-{name}.lock")
+        self._file = None
+
+    @property
+    def held(self) -> bool:
+        return self._file is not None
+
+    def acquire(self) -> bool:
+        """Try to become the leader without blocking."""
+        if self._file is not None:
+            return True
+        lock_file = open(self.path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._file = lock_file
+        return True
+
+    def release(self) -> None:
+        """Give up leadership."""
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+def start_background_task(coroutine: Coroutine) -> asyncio.Task:
+    """
+    Run a coroutine as a task detached from the context of its caller.
+
+    A task copies the context variables of the code creating it, so a task
+    started while serving a request would keep adding to that request's trace
+    and query statistics long after the response was sent.
+    """
+    return asyncio.create_task(coroutine, context=contextvars.Context())
+
+
+async def run_periodically(
+    name: str,
+    job: Callable[[], Awaitable[None]],
+    interval_seconds: float,
+    single_worker: bool = True,
+) -> None:
+    """
+    Run a job every `interval_seconds` until cancelled.
+
+    Args:
+        name (str): The name of the job, used in logs and for the leader lock.
+        job (Callable[[], Awaitable[None]]): The job to run.
+        interval_seconds (float): Seconds between two runs.
+        single_worker (bool, optional): Only run the job in the worker holding
+          the job's leader lock. Defaults to True.
+    """
+    lock = LeaderLock(name) if single_worker else None
+    try:
+        while True:
+            if lock is None or lock.acquire():
+                try:
+                    await job()
+                except Exception as e:
+                    logger.error(f"Background job {name} failed: {e}")
+            await asyncio.sleep(interval_seconds)
+    finally:
+        if lock is not None:
+            lock.release()
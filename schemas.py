@@ -3,7 +3,7 @@
 """Pydantic models (schemas) module."""
 
 
-from datetime import datetime
+from datetime import date, datetime
 from decimal import Decimal
 from enum import Enum
 from pydantic import BaseModel, EmailStr, Field
@@ -107,6 +107,26 @@ class WeatherReport(WeatherForecast):
         from_attributes = True
 
 
+class MeasurementStatistics(BaseModel):
+    count: int
+    min: Optional[float] = None
+    max: Optional[float] = None
+    mean: Optional[float] = None
+    percentiles: Dict[str, Optional[float]] = {}
+
+
+class WeatherStatistics(BaseModel):
+    location_id: int
+    location_name: Optional[str] = None
+    start_date: date
+    end_date: date
+    months: int
+    days: int
+    temperature: MeasurementStatistics
+    humidity: MeasurementStatistics
+    precipitation_probability: MeasurementStatistics
+
+
 class WeatherProvider(BaseModel):
     provider_id: int
     api_key: str
@@ -123,6 +143,11 @@ class Recommendation(BaseModel):
     weather_descriptions: Dict[str, str]
 
 
+class ForecastRecommendation(BaseModel):
+    forecast: WeatherForecast
+    recommendations: Recommendation
+
+
 class Location(BaseModel):
     location_id: Optional[int] = None
     name: Optional[str] = None
@@ -136,6 +161,23 @@ class Location(BaseModel):
         from_attributes = True
 
 
+class FavoriteLocationCreate(BaseModel):
+    location_name: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+
+class DashboardLocation(BaseModel):
+    location: Location
+    forecasts: List[ForecastRecommendation] = []
+    error: Optional[str] = None
+
+
+class Dashboard(BaseModel):
+    forecast_type: str
+    locations: List[DashboardLocation]
+
+
 class Events(BaseModel):
     event_id: int
     type: EventTypeEnum
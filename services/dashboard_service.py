@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+
+"""Forecasts and recommendations for all the favorite locations of a user.
+
+The free-text favorites of older accounts can be moved to the association
+table from the command line:
+```bash
+python -m services.dashboard_service migrate-favorites
+```
+"""
+
+import argparse
+import asyncio
+import logging
+import re
+import sys
+
+from sqlalchemy.orm import Session
+
+import crud
+import database
+import models.location
+import models.user
+import schemas
+from cache import TTLCache
+from config import settings
+from services.forecast_recommendation_service import (
+    build_forecast_recommendations,
+    fetch_forecasts,
+)
+
+logger = logging.getLogger(__name__)
+
+# Forecasts and recommendations keyed by (location_id, forecast_type) and
+# tagged with the location_id, shared by every user favoring the location.
+dashboard_cache = TTLCache(
+    settings.DASHBOARD_CACHE_SIZE,
+    settings.DASHBOARD_CACHE_TTL_SECONDS,
+    name="dashboard",
+)
+
+_COORDINATES = re.compile(r"^\s*-?\d+(\.\d+)?\s*,\s*-?\d+(\.\d+)?\s*$")
+
+
+async def build_dashboard(
+    locations: list[models.location.Location], forecast_type: str
+) -> schemas.Dashboard:
+    """Gather the forecasts and recommendations of several locations at once.
+
+    Cached locations are answered from `dashboard_cache`; the others are
+    fetched concurrently, at most `DASHBOARD_MAX_CONCURRENT_FETCHES` at a time,
+    each on its own database session. A location that cannot be fetched is
+    reported with an error instead of failing the whole dashboard.
+
+    Args:
+        locations (list[models.location.Location]): The locations, in display order.
+        forecast_type (str): One of the keys of `FORECAST_TYPES`.
+
+    Returns:
+        schemas.Dashboard: One entry per location, in the order given.
+    """
+    forecasts = {}
+    misses = []
+    for location in locations:
+        cached = dashboard_cache.get((location.location_id, forecast_type))
+        if cached is None:
+            misses.append(location)
+        else:
+            forecasts[location.location_id] = cached
+
+    semaphore = asyncio.Semaphore(settings.DASHBOARD_MAX_CONCURRENT_FETCHES)
+
+    async def fetch(location: models.location.Location) -> None:
+        async with semaphore:
+            db = database.SessionLocal()
+            try:
+                rows = await fetch_forecasts(location, db, forecast_type)
+                items = build_forecast_recommendations(rows, location.city_name)
+            except Exception as e:
+                logger.error(f"Could not fetch forecasts for {location.name}: {e}")
+                return
+            finally:
+                db.close()
+        if items:
+            dashboard_cache.set(
+                (location.location_id, forecast_type), items, tag=location.location_id
+            )
+            forecasts[location.location_id] = items
+
+    await asyncio.gather(*(fetch(location) for location in misses))
+
+    entries = []
+    for location in locations:
+        items = forecasts.get(location.location_id)
+        entries.append(
+            schemas.DashboardLocation.model_construct(
+                location=schemas.Location.model_validate(location),
+                forecasts=items or [],
+                error=None if items else "No forecast available",
+            )
+        )
+    return schemas.Dashboard.model_construct(
+        forecast_type=forecast_type, locations=entries
+    )
+
+
+def parse_favorite_locations(favorite_locations: str | None) -> list[str]:
+    """
+    Split the legacy free-text favorites into location names.
+
+    Favorites were separated by commas, semicolons or new lines. A value made
+    of a single "latitude,longitude" pair is kept whole.
+
+    Args:
+        favorite_locations (str, optional): The legacy `favorite_locations` value.
+
+    Returns:
+        list[str]: The location names, without duplicates, in their original order.
+
+    Examples:
+        >>> parse_favorite_locations("Nairobi, Mombasa;nairobi")
+        ['nairobi', 'mombasa']
+    """
+    if not favorite_locations:
+        return []
+    if _COORDINATES.match(favorite_locations):
+        parts = [favorite_locations]
+    else:
+        parts = re.split(r"[,;\n]", favorite_locations)
+    names = []
+    for part in parts:
+        name = part.strip().lower()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+async def migrate_favorite_locations(db: Session) -> int:
+    """
+    Copy the legacy free-text favorites of every user to the association table.
+
+    Running it again only adds the favorites that are still missing.
+
+    Args:
+        db (Session): The database session.
+
+    Returns:
+        int: The number of favorites processed.
+    """
+    count = 0
+    preferences = (
+        db.query(models.user.User_Preferences)
+        .filter(models.user.User_Preferences.favorite_locations.isnot(None))
+        .all()
+    )
+    for preference in preferences:
+        for name in parse_favorite_locations(preference.favorite_locations):
+            try:
+                location = await models.location.get_or_create_location(name, db)
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Could not resolve favorite location {name}: {e}")
+                continue
+            crud.add_favorite_location(db, preference.user_id, location)
+            count += 1
+    return count
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run the dashboard maintenance commands."""
+    parser = argparse.ArgumentParser(description="Dashboard maintenance.")
+    parser.add_argument("command", choices=["migrate-favorites"])
+    parser.parse_args(argv)
+
+    db = database.SessionLocal()
+    try:
+        count = asyncio.run(migrate_favorite_locations(db))
+    finally:
+        db.close()
+    print(f"Migrated {count} favorite locations")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+
+"""Batch evaluation of the accuracy of the stored forecasts.
+
+Forecasts are scored against the weather reports of the same location and
+time bucket (a day by default). Reports in a bucket are averaged into the
+observed value, and every forecast covering the bucket is compared with it.
+The mean absolute error, root mean squared error and bias of each measurement
+are computed per provider, location and lead time, then stored in the
+`forecast_accuracy` table, replacing the scores of a previous run over the
+same period.
+
+Locations are evaluated a chunk at a time: the forecasts and reports of a
+chunk are bulk-loaded into NumPy arrays, matched with a sorted search and
+aggregated with `np.bincount`, with no Python loop over rows.
+
+Example usage from the command line, to score the last 365 days:
+```bash
+python -m services.forecast_accuracy_service --days 365
+```
+"""
+
+import argparse
+import json
+import logging
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from sqlalchemy import Float, String, cast, delete, insert, select
+from sqlalchemy.orm import Session
+
+import database
+import models.location  # noqa: F401, resolves the relationships of forecasts
+import models.weather
+
+logger = logging.getLogger(__name__)
+
+# Forecasts have no provider column; every stored forecast is Tomorrow.io's.
+FORECAST_PROVIDER = "tomorrow_io"
+ACCURACY_MEASUREMENTS = (
+    "temperature",
+    "humidity",
+    "wind_speed",
+    "precipitation_probability",
+)
+
+
+def bucket_means(
+    keys: np.ndarray, values: dict[str, np.ndarray]
+) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+    """
+    Average the values sharing a key, ignoring NaN.
+
+    Args:
+        keys (np.ndarray): The key of each row.
+        values (dict[str, np.ndarray]): Columns of values, NaN where unknown.
+
+    Returns:
+        tuple[np.ndarray, dict[str, np.ndarray]]: The sorted distinct keys,
+          and per column the mean of each key, NaN where none is known.
+
+    Examples:
+        >>> keys, means = bucket_means(
+        ...     np.array([2, 1, 2]), {"humidity": np.array([3.0, np.nan, 5.0])}
+        ... )
+        >>> keys.tolist(), means["humidity"].tolist()
+        ([1, 2], [nan, 4.0])
+    """
+    distinct, inverse = np.unique(keys, return_inverse=True)
+    means = {}
+    for name, column in values.items():
+        known = ~np.isnan(column)
+        sums = np.bincount(inverse[known], column[known], len(distinct))
+        counts = np.bincount(inverse[known], minlength=len(distinct))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means[name] = sums / counts
+    return distinct, means
+
+
+def score_errors(
+    groups: np.ndarray, errors: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Compute the MAE, RMSE and bias of errors per group, ignoring NaN.
+
+    Args:
+        groups (np.ndarray): The group of each error.
+        errors (np.ndarray): Forecast minus observed values.
+
+    Returns:
+        tuple: The sorted groups with errors, and per group the number of
+          errors, the MAE, the RMSE and the bias.
+
+    Examples:
+        >>> groups, samples, mae, rmse, bias = score_errors(
+        ...     np.array([7, 7, 8]), np.array([1.0, -3.0, np.nan])
+        ... )
+        >>> groups.tolist(), samples.tolist(), mae.tolist(), bias.tolist()
+        ([7], [2], [2.0], [-1.0])
+    """
+    known = ~np.isnan(errors)
+    distinct, inverse = np.unique(groups[known], return_inverse=True)
+    errors = errors[known]
+    samples = np.bincount(inverse, minlength=len(distinct))
+    mae = np.bincount(inverse, np.abs(errors), len(distinct)) / samples
+    rmse = np.sqrt(np.bincount(inverse, errors * errors, len(distinct)) / samples)
+    bias = np.bincount(inverse, errors, len(distinct)) / samples
+    return distinct, samples, mae, rmse, bias
+
+
+def _timestamps(values: tuple[str, ...]) -> np.ndarray:
+    """Parse ISO 8601 timestamps, as stored by the database, to the second."""
+    return np.array(values, dtype="datetime64[us]").astype("datetime64[s]")
+
+
+class AccuracyEvaluator:
+    """
+    Score the forecasts of a period against the reports, location chunk by chunk.
+
+    Args:
+        db (Session): The database session.
+        period_start (date): The first day of the period, inclusive.
+        period_end (date): The last day of the period, exclusive.
+        bucket_hours (int, optional): The width of the time buckets.
+        chunk_size (int, optional): The number of locations loaded at once.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        period_start: date,
+        period_end: date,
+        bucket_hours: int = 24,
+        chunk_size: int = 500,
+    ):
+        self.db = db
+        self.period_start = period_start
+        self.period_end = period_end
+        self.origin = np.datetime64(period_start, "s")
+        self.bucket = np.timedelta64(bucket_hours * 3600, "s")
+        self.buckets = int(
+            np.ceil((np.datetime64(period_end, "s") - self.origin) / self.bucket)
+        )
+        self.chunk_size = chunk_size
+
+    def evaluate(self) -> dict:
+        """Score every location with forecasts in the period and store the scores."""
+        started = time.perf_counter()
+        Forecast = models.weather.Weather_Forecast
+        location_ids = self.db.scalars(
+            select(Forecast.location_id)
+            .where(Forecast.start_time >= self.period_start)
+            .where(Forecast.start_time < self.period_end)
+            .distinct()
+            .order_by(Forecast.location_id)
+        ).all()
+        evaluated_at = datetime.now()
+        forecasts = matched = scores = 0
+        for start in range(0, len(location_ids), self.chunk_size):
+            chunk = location_ids[start : start + self.chunk_size]
+            chunk_forecasts, chunk_matched, rows = self.score_chunk(
+                chunk[0], chunk[-1], evaluated_at
+            )
+            self.store(chunk[0], chunk[-1], rows)
+            forecasts += chunk_forecasts
+            matched += chunk_matched
+            scores += len(rows)
+        return {
+            "provider": FORECAST_PROVIDER,
+            "period_start": self.period_start.isoformat(),
+            "period_end": self.period_end.isoformat(),
+            "locations": len(location_ids),
+            "forecasts": forecasts,
+            "matched": matched,
+            "scores": scores,
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+
+    def _load(
+        self, model, first_location: int, last_location: int, issued: bool
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray | None, dict[str, np.ndarray]]:
+        """Bulk-load the rows of a table for a range of locations into arrays."""
+        # Timestamps are read as text, which NumPy parses many times faster than
+        # datetime objects, and measurements as floats rather than Decimals.
+        columns = [model.location_id, cast(model.start_time, String)]
+        if issued:
+            columns.append(cast(model.date_time, String))
+        columns += [cast(getattr(model, name), Float) for name in ACCURACY_MEASUREMENTS]
+        rows = (
+            self.db.connection()
+            .execute(
+                select(*columns)
+                .where(model.location_id.between(first_location, last_location))
+                .where(model.start_time >= self.period_start)
+                .where(model.start_time < self.period_end)
+            )
+            .all()
+        )
+        if not rows:
+            empty = np.array([], dtype=np.int64)
+            return empty, empty, empty, {}
+        values = list(zip(*rows))
+        location_ids = np.array(values[0], dtype=np.int64)
+        starts = _timestamps(values[1])
+        issued_at = _timestamps(values[2]) if issued else None
+        measurements = {
+            name: np.array(column, dtype=float)
+            for name, column in zip(ACCURACY_MEASUREMENTS, values[2 + issued :])
+        }
+        return location_ids, starts, issued_at, measurements
+
+    def _keys(self, location_ids: np.ndarray, starts: np.ndarray) -> np.ndarray:
+        """Combine locations and time buckets into one sortable key."""
+        buckets = (starts - self.origin) // self.bucket
+        return location_ids * self.buckets + buckets.astype(np.int64)
+
+    def score_chunk(
+        self, first_location: int, last_location: int, evaluated_at: datetime
+    ) -> tuple[int, int, list[dict]]:
+        """
+        Score the forecasts of a range of locations.
+
+        Returns:
+            tuple[int, int, list[dict]]: The number of forecasts, of forecasts
+              matched with reports, and the score rows to store.
+        """
+        report_locations, report_starts, _, observed = self._load(
+            models.weather.Weather_Report, first_location, last_location, False
+        )
+        forecast_locations, forecast_starts, issued, forecast = self._load(
+            models.weather.Weather_Forecast, first_location, last_location, True
+        )
+        if not len(report_locations) or not len(forecast_locations):
+            return len(forecast_locations), 0, []
+
+        report_keys = self._keys(report_locations, report_starts)
+        forecast_keys = self._keys(forecast_locations, forecast_starts)
+        lead_days = (
+            forecast_starts.astype("datetime64[D]") - issued.astype("datetime64[D]")
+        ).astype(np.int64)
+        # Match every forecast with the reports of its bucket; forecasts
+        # issued after the period they cover are not forecasts.
+        distinct, means = bucket_means(report_keys, observed)
+        positions = np.minimum(
+            np.searchsorted(distinct, forecast_keys), len(distinct) - 1
+        )
+        matched = np.flatnonzero(
+            (distinct[positions] == forecast_keys) & (lead_days >= 0)
+        )
+        positions = positions[matched]
+        max_lead = int(lead_days[matched].max(initial=0)) + 1
+        groups = forecast_locations[matched] * max_lead + lead_days[matched]
+
+        rows = []
+        for name in ACCURACY_MEASUREMENTS:
+            errors = forecast[name][matched] - means[name][positions]
+            scored, samples, mae, rmse, bias = score_errors(groups, errors)
+            for group, count, group_mae, group_rmse, group_bias in zip(
+                scored.tolist(),
+                samples.tolist(),
+                mae.tolist(),
+                rmse.tolist(),
+                bias.tolist(),
+            ):
+                rows.append(
+                    {
+                        "provider": FORECAST_PROVIDER,
+                        "location_id": group // max_lead,
+                        "lead_days": group % max_lead,
+                        "measurement": name,
+                        "period_start": self.period_start,
+                        "period_end": self.period_end,
+                        "samples": count,
+                        "mae": round(group_mae, 4),
+                        "rmse": round(group_rmse, 4),
+                        "bias": round(group_bias, 4),
+                        "evaluated_at": evaluated_at,
+                    }
+                )
+        return len(forecast_locations), len(matched), rows
+
+    def store(self, first_location: int, last_location: int, rows: list[dict]) -> None:
+        """Replace the scores of a range of locations for the period."""
+        Forecast_Accuracy = models.weather.Forecast_Accuracy
+        try:
+            self.db.execute(
+                delete(Forecast_Accuracy)
+                .where(Forecast_Accuracy.provider == FORECAST_PROVIDER)
+                .where(
+                    Forecast_Accuracy.location_id.between(first_location, last_location)
+                )
+                .where(Forecast_Accuracy.period_start == self.period_start)
+                .where(Forecast_Accuracy.period_end == self.period_end)
+            )
+            if rows:
+                self.db.execute(insert(Forecast_Accuracy), rows)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+
+def summarize(db: Session, period_start: date, period_end: date) -> list[dict]:
+    """
+    Combine the stored scores of a period over every location.
+
+    Returns:
+        list[dict]: The samples, MAE, RMSE and bias per provider, measurement
+          and lead time, weighted by the samples of each location.
+    """
+    Forecast_Accuracy = models.weather.Forecast_Accuracy
+    rows = db.execute(
+        select(
+            Forecast_Accuracy.provider,
+            Forecast_Accuracy.measurement,
+            Forecast_Accuracy.lead_days,
+            Forecast_Accuracy.samples,
+            Forecast_Accuracy.mae,
+            Forecast_Accuracy.rmse,
+            Forecast_Accuracy.bias,
+        )
+        .where(Forecast_Accuracy.period_start == period_start)
+        .where(Forecast_Accuracy.period_end == period_end)
+        .order_by(
+            Forecast_Accuracy.provider,
+            Forecast_Accuracy.measurement,
+            Forecast_Accuracy.lead_days,
+        )
+    ).all()
+    totals: dict[tuple, list[float]] = {}
+    for provider, measurement, lead_days, samples, mae, rmse, bias in rows:
+        total = totals.setdefault((provider, measurement, lead_days), [0, 0, 0, 0])
+        total[0] += samples
+        total[1] += mae * samples
+        total[2] += rmse * rmse * samples
+        total[3] += bias * samples
+    summary = []
+    for (provider, measurement, lead_days), total in totals.items():
+        samples, absolute, squared, error = total
+        summary.append(
+            {
+                "provider": provider,
+                "measurement": measurement,
+                "lead_days": lead_days,
+                "samples": samples,
+                "mae": round(absolute / samples, 3),
+                "rmse": round((squared / samples) ** 0.5, 3),
+                "bias": round(error / samples, 3),
+            }
+        )
+    return summary
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Score the forecasts of a period and print the summary."""
+    parser = argparse.ArgumentParser(description="Score the stored forecasts.")
+    parser.add_argument(
+        "--days", type=int, default=365, help="Score the days before --end."
+    )
+    parser.add_argument(
+        "--end",
+        type=date.fromisoformat,
+        default=date.today(),
+        help="The day after the period, today by default.",
+    )
+    parser.add_argument("--bucket-hours", type=int, default=24)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    period_start = args.end - timedelta(days=args.days)
+    db = database.SessionLocal()
+    try:
+        evaluator = AccuracyEvaluator(
+            db, period_start, args.end, args.bucket_hours, args.chunk_size
+        )
+        report = evaluator.evaluate()
+        report["summary"] = summarize(db, period_start, args.end)
+    finally:
+        db.close()
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+"""Single-pass pipeline that pairs weather forecasts with recommendations."""
+
+from datetime import date
+from decimal import Decimal
+from typing import List
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session
+
+import models.location
+import models.weather
+import schemas
+from config import settings
+from services.recommendation_service import analyze_forecasts
+from services.weather_service import query_weather_forecast
+
+default_location = settings.DEFAULT_LOCATION
+
+# Maps the public forecast types to the ones understood by the weather service.
+FORECAST_TYPES = {
+    "current_weather": "realtime",
+    "five-day_weather": "5d",
+    "a_days_weather": "5d",
+}
+
+forecast_recommendations_adapter = TypeAdapter(List[schemas.ForecastRecommendation])
+
+
+async def resolve_location(
+    location_name: str | None,
+    latitude: float | None,
+    longitude: float | None,
+    db: Session,
+) -> models.location.Location:
+    """Resolve the requested location, falling back to the default location.
+
+    Args:
+        location_name (str, optional): The name of the location.
+        latitude (float, optional): The latitude of the location.
+        longitude (float, optional): The longitude of the location.
+        db (Session): The database session.
+
+    Returns:
+        models.location.Location: The matching or newly created location.
+    """
+    if location_name is not None and location_name != "":
+        return await models.location.get_or_create_location(location_name, db)
+    if latitude is not None and longitude is not None:
+        return await models.location.get_or_create_location(
+            f"{latitude},{longitude}", db
+        )
+    return await models.location.get_or_create_location(default_location, db)
+
+
+async def fetch_forecasts(
+    location: models.location.Location,
+    db: Session,
+    forecast_type: str,
+    day: date | None = None,
+) -> list[models.weather.Weather_Forecast]:
+    """Fetch the forecast rows for a location once.
+
+    Args:
+        location (models.location.Location): The location to fetch forecasts for.
+        db (Session): The database session.
+        forecast_type (str): One of the keys of `FORECAST_TYPES`.
+        day (date, optional): Only keep the forecast for this day.
+
+    Returns:
+        list[models.weather.Weather_Forecast]: The forecasts, empty if none were found.
+    """
+    forecast = await query_weather_forecast(
+        location, db, FORECAST_TYPES[forecast_type]
+    )
+    if isinstance(forecast, models.weather.Weather_Forecast):
+        forecasts = [forecast]
+    else:
+        forecasts = list(forecast)
+    if day is not None:
+        forecasts = [row for row in forecasts if row.start_time.date() == day][:1]
+    return forecasts
+
+
+def build_forecast_recommendations(
+    forecasts: list[models.weather.Weather_Forecast], location_name: str | None
+) -> list[schemas.ForecastRecommendation]:
+    """Analyze a list of forecasts in one batch and pair them with their recommendations.
+
+    Args:
+        forecasts (list[models.weather.Weather_Forecast]): The forecasts to analyze.
+        location_name (str, optional): The name reported for the forecasts' location.
+
+    Returns:
+        list[schemas.ForecastRecommendation]: A forecast and its recommendations per item.
+
+    Raises:
+        ValueError: If a forecast is missing one of the analyzed values.
+    """
+    validated = [
+        schemas.WeatherForecast.model_validate(
+            {**forecast.to_dict(), "location_name": location_name}
+        )
+        for forecast in forecasts
+    ]
+    readings = [
+        (
+            _as_number(forecast.temperature),
+            _as_number(forecast.humidity),
+            _as_number(forecast.precipitation_probability),
+        )
+        for forecast in validated
+    ]
+    return [
+        schemas.ForecastRecommendation.model_construct(
+            forecast=forecast,
+            recommendations=schemas.Recommendation.model_construct(**recommendations),
+        )
+        for forecast, recommendations in zip(validated, analyze_forecasts(readings))
+    ]
+
+
+def serialize_forecast_recommendations(
+    items: list[schemas.ForecastRecommendation],
+) -> bytes:
+    """Serialize the whole response body in a single pass."""
+    return forecast_recommendations_adapter.dump_json(items)
+
+
+def _as_number(value: Decimal | None) -> float | None:
+    """Convert database decimals to floats, leaving missing values untouched."""
+    return None if value is None else float(value)
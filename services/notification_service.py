@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+
+"""Batch evaluation of weather notifications for users who enabled them.
+
+Each cycle evaluates the stored forecasts once per favorite location, in a
+single vectorized pass, and fans the resulting alerts out to every user
+favoring the location. Notifications are queued in the `notifications`
+table and handed to a delivery channel in batches.
+
+Example usage from the command line, to run a single cycle:
+```bash
+python -m services.notification_service
+```
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+import database
+import models.location
+import models.notification
+import models.user
+import models.weather
+from config import settings
+from scheduling import run_periodically
+
+logger = logging.getLogger(__name__)
+
+# The kinds the `notifications` table accepts.
+NOTIFICATION_KINDS = tuple(models.notification.Notification.kind.type.enums)
+
+
+def evaluate_thresholds(
+    location_ids: np.ndarray,
+    values: dict[str, np.ndarray],
+    thresholds: dict[str, float],
+) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+    """
+    Find the first forecast period crossing each threshold, per location.
+
+    Args:
+        location_ids (np.ndarray): The location of each forecast period, sorted
+          by location then start time.
+        values (dict[str, np.ndarray]): The forecast values compared with the
+          threshold of the same kind, NaN where unknown.
+        thresholds (dict[str, float]): The threshold per notification kind.
+
+    Returns:
+        dict[str, tuple[np.ndarray, np.ndarray]]: Per kind, the locations to
+          notify and the index of their first forecast period over the threshold.
+
+    Raises:
+        ValueError: If a threshold is given for a kind not in `NOTIFICATION_KINDS`.
+
+    Examples:
+        >>> alerts = evaluate_thresholds(
+        ...     np.array([1, 1, 2]),
+        ...     {"rain": np.array([10.0, 80.0, 90.0])},
+        ...     {"rain": 60},
+        ... )
+        >>> alerts["rain"][0].tolist(), alerts["rain"][1].tolist()
+        ([1, 2], [1, 2])
+    """
+    unknown = sorted(set(thresholds) - set(NOTIFICATION_KINDS))
+    if unknown:
+        raise ValueError(f"Unknown notification kinds: {', '.join(unknown)}")
+    alerts = {}
+    for kind, threshold in thresholds.items():
+        with np.errstate(invalid="ignore"):
+            rows = np.flatnonzero(values[kind] >= threshold)
+        locations, first = np.unique(location_ids[rows], return_index=True)
+        alerts[kind] = (locations, rows[first])
+    return alerts
+
+
+class OutboxChannel:
+    """
+    Stand-in for a delivery channel that appends notifications to a NDJSON file.
+    """
+
+    def __init__(self, path: str | None = None):
+        self.path = path or os.path.join(
+            tempfile.gettempdir(), "forecast-planner-notifications.ndjson"
+        )
+
+    def send(self, notifications: list[dict]) -> None:
+        """Deliver a batch of notifications."""
+        with open(self.path, "a") as outbox:
+            for notification in notifications:
+                outbox.write(json.dumps(notification, default=str) + "\n")
+
+
+class NotificationEngine:
+    """Evaluate, queue and deliver notifications in batches."""
+
+    def __init__(
+        self,
+        db: Session,
+        channel: OutboxChannel,
+        batch_size: int = settings.NOTIFICATION_BATCH_SIZE,
+    ):
+        self.db = db
+        self.channel = channel
+        self.batch_size = batch_size
+
+    def evaluate(self, now: datetime | None = None) -> int:
+        """
+        Queue the notifications due for the forecasts of the coming hours.
+
+        Args:
+            now (datetime, optional): The time of the evaluation. Defaults to now.
+
+        Returns:
+            int: The number of (user, alert) pairs evaluated; duplicates of
+              notifications already queued are skipped by the database.
+        """
+        now = now or datetime.now()
+        location_ids, starts, values = self._load_forecasts(now)
+        if not len(location_ids):
+            return 0
+        thresholds = {
+            "rain": settings.NOTIFICATION_RAIN_THRESHOLD,
+            "heat": settings.NOTIFICATION_HEAT_THRESHOLD,
+        }
+        alerts_by_location: dict[int, list[dict]] = {}
+        for kind, (locations, rows) in evaluate_thresholds(
+            location_ids, values, thresholds
+        ).items():
+            for location_id, row in zip(locations.tolist(), rows.tolist()):
+                alerts_by_location.setdefault(location_id, []).append(
+                    {
+                        "location_id": location_id,
+                        "kind": kind,
+                        "forecast_start": starts[row],
+                        "value": round(float(values[kind][row]), 2),
+                        "created_at": now,
+                    }
+                )
+        if not alerts_by_location:
+            return 0
+
+        Favorite_Location = models.user.Favorite_Location
+        User_Preferences = models.user.User_Preferences
+        subscribers = self.db.execute(
+            select(Favorite_Location.user_id, Favorite_Location.location_id)
+            .join(
+                User_Preferences,
+                User_Preferences.user_id == Favorite_Location.user_id,
+            )
+            .where(User_Preferences.notification_settings.is_(True))
+            .where(Favorite_Location.location_id.in_(list(alerts_by_location)))
+            .distinct()
+            .execution_options(yield_per=self.batch_size)
+        )
+        evaluated = 0
+        for pairs in subscribers.partitions():
+            rows = [
+                {**alert, "user_id": user_id}
+                for user_id, location_id in pairs
+                for alert in alerts_by_location[location_id]
+            ]
+            self._enqueue(rows)
+            evaluated += len(rows)
+        return evaluated
+
+    def deliver(self) -> int:
+        """
+        Hand the queued notifications to the delivery channel, batch by batch.
+
+        Returns:
+            int: The number of notifications delivered.
+        """
+        Notification = models.notification.Notification
+        Location = models.location.Location
+        delivered = 0
+        while True:
+            pending = self.db.execute(
+                select(
+                    Notification.notification_id,
+                    Notification.user_id,
+                    Notification.kind,
+                    Notification.forecast_start,
+                    Notification.value,
+                    Location.name,
+                )
+                .join(Location, Location.location_id == Notification.location_id)
+                .where(Notification.delivered_at.is_(None))
+                .order_by(Notification.notification_id)
+                .limit(self.batch_size)
+            ).all()
+            if not pending:
+                return delivered
+            self.channel.send(
+                [
+                    {
+                        "notification_id": notification_id,
+                        "user_id": user_id,
+                        "message": _message(kind, location_name, start, value),
+                    }
+                    for notification_id, user_id, kind, start, value, location_name in (
+                        pending
+                    )
+                ]
+            )
+            self.db.execute(
+                update(Notification)
+                .where(
+                    Notification.notification_id.in_([row[0] for row in pending])
+                )
+                .values(delivered_at=datetime.now())
+                .execution_options(synchronize_session=False)
+            )
+            self.db.commit()
+            delivered += len(pending)
+
+    def _load_forecasts(
+        self, now: datetime
+    ) -> tuple[np.ndarray, list[datetime], dict[str, np.ndarray]]:
+        """Load the latest forecast of each upcoming period of the watched locations."""
+        Weather_Forecast = models.weather.Weather_Forecast
+        Favorite_Location = models.user.Favorite_Location
+        User_Preferences = models.user.User_Preferences
+        watched = (
+            select(Favorite_Location.location_id)
+            .join(
+                User_Preferences,
+                User_Preferences.user_id == Favorite_Location.user_id,
+            )
+            .where(User_Preferences.notification_settings.is_(True))
+        )
+        rows = self.db.execute(
+            select(
+                Weather_Forecast.location_id,
+                Weather_Forecast.start_time,
+                Weather_Forecast.temperature,
+                Weather_Forecast.precipitation_probability,
+            )
+            .where(Weather_Forecast.location_id.in_(watched))
+            .where(Weather_Forecast.end_time >= now)
+            .where(
+                Weather_Forecast.start_time
+                <= now + timedelta(hours=settings.NOTIFICATION_HORIZON_HOURS)
+            )
+            .order_by(
+                Weather_Forecast.location_id,
+                Weather_Forecast.start_time,
+                Weather_Forecast.date_time.desc(),
+            )
+        ).all()
+        if not rows:
+            return np.array([], dtype=np.int64), [], {}
+        location_ids = np.fromiter((row[0] for row in rows), np.int64, len(rows))
+        starts = [row[1] for row in rows]
+        temperature = np.array(
+            [np.nan if row[2] is None else float(row[2]) for row in rows]
+        )
+        precipitation = np.array(
+            [np.nan if row[3] is None else float(row[3]) for row in rows]
+        )
+        # Keep the most recent forecast of each (location, period).
+        start_keys = np.array(starts, dtype="datetime64[s]")
+        latest = np.ones(len(rows), dtype=bool)
+        latest[1:] = (location_ids[1:] != location_ids[:-1]) | (
+            start_keys[1:] != start_keys[:-1]
+        )
+        kept = np.flatnonzero(latest)
+        return (
+            location_ids[kept],
+            [starts[row] for row in kept.tolist()],
+            {"rain": precipitation[kept], "heat": temperature[kept]},
+        )
+
+    def _enqueue(self, rows: list[dict]) -> None:
+        """Insert notifications, skipping those already queued."""
+        if not rows:
+            return
+        if self.db.bind.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        self.db.execute(
+            insert(models.notification.Notification).on_conflict_do_nothing(
+                index_elements=["user_id", "location_id", "kind", "forecast_start"]
+            ),
+            rows,
+        )
+        self.db.commit()
+
+
+def _message(kind: str, location_name: str, start: datetime, value) -> str:
+    """Word a notification."""
+    when = start.strftime("%a %H:%M")
+    value = f"{float(value):g}"
+    if kind == "rain":
+        return f"Rain expected in {location_name} from {when} ({value}% chance)."
+    return f"High temperatures expected in {location_name} from {when} ({value}°)."
+
+
+def run_notification_cycle() -> tuple[int, int]:
+    """Evaluate and deliver notifications with a session of its own."""
+    db = database.SessionLocal()
+    try:
+        engine = NotificationEngine(
+            db, OutboxChannel(settings.NOTIFICATION_OUTBOX_PATH)
+        )
+        return engine.evaluate(), engine.deliver()
+    finally:
+        db.close()
+
+
+async def notify_periodically():
+    """Run the notification cycle every scheduling interval from a single worker."""
+
+    async def notify():
+        started = time.perf_counter()
+        evaluated, delivered = await asyncio.to_thread(run_notification_cycle)
+        logger.info(
+            f"Evaluated {evaluated} notifications and delivered {delivered} in "
+            f"{time.perf_counter() - started:.3f}s"
+        )
+
+    await run_periodically(
+        "notifications", notify, settings.NOTIFICATION_INTERVAL_SECONDS
+    )
+
+
+if __name__ == "__main__":
+    evaluated, delivered = run_notification_cycle()
+    print(f"Evaluated {evaluated} notifications and delivered {delivered}")
+    sys.exit(0)
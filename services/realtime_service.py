@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+"""Realtime weather subscriptions fanned out from one poller per location."""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable
+
+import database
+import schemas
+from config import settings
+from models.location import get_or_create_location
+from scheduling import start_background_task
+from services.weather_service import query_weather_forecast
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    A subscriber's bounded queue of pending updates.
+
+    Only the latest weather matters to a subscriber, so when a slow client
+    falls behind the oldest pending updates are dropped instead of letting
+    the queue grow. A subscription whose pending updates would still exceed
+    `max_pending_bytes` is closed.
+    """
+
+    def __init__(self, location_name: str, max_size: int, max_pending_bytes: int):
+        self.location_name = location_name
+        self.max_size = max_size
+        self.max_pending_bytes = max_pending_bytes
+        self.pending_bytes = 0
+        self.dropped = 0
+        self.closed = False
+        self._pending: deque[bytes] = deque()
+        self._ready = asyncio.Event()
+
+    def offer(self, payload: bytes) -> None:
+        """Queue an update, dropping the oldest ones if the subscriber is behind."""
+        if self.closed:
+            return
+        if len(payload) > self.max_pending_bytes:
+            logger.warning(
+                f"Closing {self.location_name} subscription: update exceeds memory cap"
+            )
+            self.close()
+            return
+        while self._pending and (
+            len(self._pending) >= self.max_size
+            or self.pending_bytes + len(payload) > self.max_pending_bytes
+        ):
+            self.pending_bytes -= len(self._pending.popleft())
+            self.dropped += 1
+        self._pending.append(payload)
+        self.pending_bytes += len(payload)
+        self._ready.set()
+
+    async def get(self, timeout: float | None = None) -> bytes | None:
+        """
+        Wait for the next update.
+
+        Args:
+            timeout (float, optional): Seconds to wait before giving up.
+
+        Returns:
+            bytes | None: The update, or None on timeout or once closed.
+        """
+        if not self._pending and not self.closed:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        if not self._pending:
+            return None
+        payload = self._pending.popleft()
+        self.pending_bytes -= len(payload)
+        return payload
+
+    def close(self) -> None:
+        """Stop accepting updates and release the pending ones."""
+        self.closed = True
+        self._pending.clear()
+        self.pending_bytes = 0
+        self._ready.set()
+
+
+async def fetch_realtime_payload(location_name: str) -> bytes | None:
+    """
+    Fetch the realtime weather of a location as a JSON payload.
+
+    Args:
+        location_name (str): The name of the location.
+
+    Returns:
+        bytes | None: The serialized `schemas.WeatherForecast`, None if unavailable.
+    """
+    db = database.SessionLocal()
+    try:
+        location = await get_or_create_location(location_name, db)
+        forecast = await query_weather_forecast(location, db, "realtime")
+        if not forecast:
+            return None
+        forecast_dict = forecast.to_dict()
+        forecast_dict["location_name"] = location.city_name
+        return schemas.WeatherForecast(**forecast_dict).model_dump_json().encode()
+    finally:
+        db.close()
+
+
+class RealtimeHub:
+    """
+    Fan realtime weather out to subscribers.
+
+    A single poller runs per subscribed location in this worker, however many
+    clients subscribe to it, and stops once its last subscriber leaves.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str], Awaitable[bytes | None]] = fetch_realtime_payload,
+        poll_interval: float = settings.REALTIME_POLL_INTERVAL,
+        queue_size: int = settings.REALTIME_QUEUE_SIZE,
+        max_pending_bytes: int = settings.REALTIME_MAX_PENDING_BYTES,
+    ):
+        self.fetch = fetch
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.max_pending_bytes = max_pending_bytes
+        self.subscribers: dict[str, set[Subscription]] = {}
+        self.latest: dict[str, bytes] = {}
+        self._pollers: dict[str, asyncio.Task] = {}
+
+    def subscribe(self, location_name: str) -> Subscription:
+        """Subscribe to a location, starting its poller if needed."""
+        location_name = location_name.strip().lower()
+        subscription = Subscription(
+            location_name, self.queue_size, self.max_pending_bytes
+        )
+        self.subscribers.setdefault(location_name, set()).add(subscription)
+        if location_name in self.latest:
+            subscription.offer(self.latest[location_name])
+        if location_name not in self._pollers:
+            # The poller outlives the request subscribing first.
+            self._pollers[location_name] = start_background_task(
+                self._poll(location_name)
+            )
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Remove a subscription, stopping the poller of an abandoned location."""
+        subscription.close()
+        location_name = subscription.location_name
+        subscribers = self.subscribers.get(location_name, set())
+        subscribers.discard(subscription)
+        if not subscribers:
+            self.subscribers.pop(location_name, None)
+            self.latest.pop(location_name, None)
+            poller = self._pollers.pop(location_name, None)
+            if poller is not None:
+                poller.cancel()
+
+    def publish(self, location_name: str, payload: bytes) -> None:
+        """Send an update to every subscriber of a location if it changed."""
+        if self.latest.get(location_name) == payload:
+            return
+        self.latest[location_name] = payload
+        for subscription in list(self.subscribers.get(location_name, ())):
+            subscription.offer(payload)
+            if subscription.closed:
+                self.unsubscribe(subscription)
+
+    async def _poll(self, location_name: str) -> None:
+        """Fetch the realtime weather of a location until it has no subscribers."""
+        while location_name in self.subscribers:
+            try:
+                payload = await self.fetch(location_name)
+                if payload is not None:
+                    self.publish(location_name, payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Realtime poller for {location_name} failed: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+
+hub = RealtimeHub()
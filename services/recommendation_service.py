@@ -1,4 +1,5 @@
-from typing import Dict, List, Tuple, Union
+from functools import lru_cache
+from typing import Dict, Iterable, List, Tuple, Union
 
 #!/usr/bin/env python3
 
@@ -21,6 +22,27 @@ class WeatherAnalyzer:
     ```
     """
 
+    # Define thresholds for temperature, humidity, and precipitation probability
+    TEMPERATURE_CATEGORIES: Dict[str, Tuple[float, float]] = {
+        "Cold": (-float("inf"), 10),
+        "Cool": (10, 20),
+        "Mild": (20, 25),
+        "Warm": (25, 30),
+        "Hot": (30, float("inf")),
+    }
+
+    HUMIDITY_CATEGORIES: Dict[str, Tuple[float, float]] = {
+        "Low": (-float("inf"), 30),
+        "Moderate": (30, 60),
+        "High": (60, float("inf")),
+    }
+
+    PRECIPITATION_CATEGORIES: Dict[str, Tuple[float, float]] = {
+        "Low": (-float("inf"), 30),
+        "Moderate": (30, 60),
+        "High": (60, float("inf")),
+    }
+
     def analyze_weather(
         self,
         temperature: Union[int, float],
@@ -53,38 +75,19 @@ class WeatherAnalyzer:
         if not isinstance(precipitation_probability, (int, float)):
             raise ValueError("Precipitation probability must be a number")
 
-        # Define thresholds for temperature, humidity, and precipitation probability
-        temperature_categories: Dict[str, Tuple[float, float]] = {
-            "Cold": (-float("inf"), 10),
-            "Cool": (10, 20),
-            "Mild": (20, 25),
-            "Warm": (25, 30),
-            "Hot": (30, float("inf")),
-        }
-
-        humidity_categories: Dict[str, Tuple[float, float]] = {
-            "Low": (-float("inf"), 30),
-            "Moderate": (30, 60),
-            "High": (60, float("inf")),
-        }
-
-        precipitation_categories: Dict[str, Tuple[float, float]] = {
-            "Low": (-float("inf"), 30),
-            "Moderate": (30, 60),
-            "High": (60, float("inf")),
-        }
-
         # Determine temperature category
         temperature_description = self._categorize_value(
-            temperature, temperature_categories
+            temperature, self.TEMPERATURE_CATEGORIES
         )
 
         # Determine humidity category
-        humidity_description = self._categorize_value(humidity, humidity_categories)
+        humidity_description = self._categorize_value(
+            humidity, self.HUMIDITY_CATEGORIES
+        )
 
         # Determine precipitation category
         precipitation_description = self._categorize_value(
-            precipitation_probability, precipitation_categories
+            precipitation_probability, self.PRECIPITATION_CATEGORIES
         )
 
         return {
@@ -229,3 +232,58 @@ class WeatherRecommender:
             suggestions.append("Stay hydrated")
 
         return suggestions
+
+
+_analyzer = WeatherAnalyzer()
+_recommender = WeatherRecommender()
+
+
+@lru_cache(maxsize=None)
+def _recommendations_for(
+    temperature_description: str,
+    humidity_description: str,
+    precipitation_description: str,
+) -> Dict[str, Union[str, Dict[str, str], List[str]]]:
+    """
+    Returns the recommendations for a combination of weather categories.
+
+    There are only a handful of category combinations, so the result for each
+    one is computed once and shared between callers, who must not mutate it.
+    """
+    return _recommender.generate_recommendations(
+        temperature_description, humidity_description, precipitation_description
+    )
+
+
+def analyze_forecasts(
+    readings: Iterable[Tuple[Union[int, float], Union[int, float], Union[int, float]]],
+) -> List[Dict[str, Union[str, Dict[str, str], List[str]]]]:
+    """
+    Analyzes a batch of weather readings and generates their recommendations.
+
+    Example usage:
+    ```python
+    readings = [(28.70, 84.40, 0.00), (18.20, 55.00, 70.00)]
+    recommendations = analyze_forecasts(readings)
+    ```
+
+    Args:
+        readings: (temperature, humidity, precipitation_probability) tuples.
+
+    Returns:
+        A list with the recommendations for each reading, in the same order and
+        with the same structure as `WeatherRecommender.generate_recommendations`.
+    """
+    results = []
+    for temperature, humidity, precipitation_probability in readings:
+        analysis = _analyzer.analyze_weather(
+            temperature, humidity, precipitation_probability
+        )
+        results.append(
+            _recommendations_for(
+                analysis["temperature_description"],
+                analysis["humidity_description"],
+                analysis["precipitation_description"],
+            )
+        )
+    return results
@@ -0,0 +1,495 @@
+#!/usr/bin/env python3
+
+"""Streaming ingestion of historical weather reports.
+
+Archives are CSV (with a header) or NDJSON files, optionally gzipped, with
+one report per line:
+- `location`: a location name, or "latitude,longitude", or a `location_id`;
+- `start_time`, and optionally `end_time` and `date_time`, as ISO 8601;
+- `temperature`, `humidity`, `wind_speed` and `precipitation_probability`;
+- optionally `units`, "metric", "imperial" or "standard" (Kelvin).
+
+Archives are read line by line and never loaded in memory. Measurements are
+converted to the units the forecasts are stored in (`DEFAULT_UNITS`), and
+timestamps to naive UTC. Locations are resolved from an in-memory map loaded
+once. Reports are written in batches, each in the same transaction as the
+byte offset reached in the archive, so that an interrupted ingestion resumes
+where it stopped without duplicating reports. Reports already stored for the
+same location and start time are skipped, and only the new ones are rolled up.
+
+Example usage from the command line:
+```bash
+python -m services.report_ingestion_service archive reports-2023.csv.gz
+python -m services.report_ingestion_service provider --limit 500
+```
+"""
+
+import argparse
+import asyncio
+import csv
+import gzip
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import IO, Iterable, Iterator
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import database
+import models.location
+import models.weather
+from cassettes import upstream_client
+from config import settings
+from services.report_statistics_service import update_rollups
+
+logger = logging.getLogger(__name__)
+
+INGEST_FORMATS = ("csv", "ndjson")
+UNITS = ("metric", "imperial", "standard")
+MEASUREMENTS = ("temperature", "humidity", "wind_speed", "precipitation_probability")
+# Keep this many invalid records in the report, the rest are only counted.
+MAX_REPORTED_ERRORS = 100
+
+
+def to_metric(record: dict, units: str) -> None:
+    """Convert the temperature and wind speed of a record to metric, in place."""
+    temperature, wind_speed = record.get("temperature"), record.get("wind_speed")
+    if units == "imperial":
+        if temperature is not None:
+            record["temperature"] = (temperature - 32) * 5 / 9
+        if wind_speed is not None:
+            record["wind_speed"] = wind_speed * 0.44704
+    elif units == "standard" and temperature is not None:
+        record["temperature"] = temperature - 273.15
+
+
+def from_metric(record: dict, units: str) -> None:
+    """Convert the temperature and wind speed of a metric record, in place."""
+    if units != "imperial":
+        return
+    if record.get("temperature") is not None:
+        record["temperature"] = record["temperature"] * 9 / 5 + 32
+    if record.get("wind_speed") is not None:
+        record["wind_speed"] = record["wind_speed"] / 0.44704
+
+
+def parse_time(value) -> datetime:
+    """Parse an ISO 8601 timestamp into a naive UTC datetime."""
+    parsed = datetime.fromisoformat(str(value).strip())
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def open_archive(path: str) -> IO[bytes]:
+    """Open an archive in binary mode, decompressing it if gzipped."""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def read_archive(
+    archive: IO[bytes], ingest_format: str, offset: int = 0
+) -> Iterator[tuple[int, dict]]:
+    """
+    Read the records of an archive lazily, from a byte offset.
+
+    Args:
+        archive (IO[bytes]): The archive, opened in binary mode at its start.
+        ingest_format (str): "csv" or "ndjson".
+        offset (int, optional): Where to resume, as returned with a record.
+
+    Yields:
+        tuple[int, dict]: The offset after the record's line, and the record,
+          which holds an "error" key if the line could not be parsed.
+    """
+    header = None
+    if ingest_format == "csv":
+        line = archive.readline()
+        header = [name.strip() for name in next(csv.reader([line.decode()]))]
+        offset = max(offset, len(line))
+    archive.seek(offset)
+    for line in archive:
+        offset += len(line)
+        text = line.decode()
+        if not text.strip():
+            continue
+        if header is not None:
+            yield offset, dict(zip(header, next(csv.reader([text]))))
+            continue
+        try:
+            record = json.loads(text)
+        except ValueError as e:
+            yield offset, {"error": f"Invalid JSON: {e}"}
+            continue
+        if not isinstance(record, dict):
+            record = {"error": "Expected a JSON object"}
+        yield offset, record
+
+
+class LocationMap:
+    """
+    Resolve the locations of reports in memory.
+
+    Every location is loaded with one query. Unknown names are created, with
+    no coordinates, when `create_missing` is set, and rejected otherwise.
+    """
+
+    def __init__(self, db: Session, create_missing: bool = False):
+        self.db = db
+        self.create_missing = create_missing
+        Location = models.location.Location
+        self.by_name: dict[str, int] = {}
+        self.by_coordinates: dict[tuple[float, float], int] = {}
+        self.ids: set[int] = set()
+        rows = db.execute(
+            select(
+                Location.location_id,
+                Location.name,
+                Location.latitude,
+                Location.longitude,
+            )
+        )
+        for location_id, name, latitude, longitude in rows:
+            self.ids.add(location_id)
+            if name:
+                self.by_name.setdefault(name, location_id)
+            if latitude is not None and longitude is not None:
+                key = (round(float(latitude), 4), round(float(longitude), 4))
+                self.by_coordinates.setdefault(key, location_id)
+
+    def resolve(self, value) -> int | None:
+        """Find the id of a location given as an id, a name or coordinates."""
+        if isinstance(value, int):
+            return value if value in self.ids else None
+        value = str(value).strip().lower()
+        if value.isdigit() and int(value) in self.ids:
+            return int(value)
+        if "," in value:
+            try:
+                latitude, longitude = (float(part) for part in value.split(","))
+            except ValueError:
+                return None
+            return self.by_coordinates.get((round(latitude, 4), round(longitude, 4)))
+        location_id = self.by_name.get(value)
+        if location_id is None and self.create_missing and value:
+            location = models.location.Location(name=value, city_name=value.title())
+            self.db.add(location)
+            # Flushed with the batch being written, committed with its reports.
+            self.db.flush()
+            location_id = self.by_name[value] = location.location_id
+            self.ids.add(location_id)
+        return location_id
+
+
+class ReportIngester:
+    """
+    Write historical weather reports in batches, with resumable checkpoints.
+
+    Each batch is inserted with a single multi-row INSERT, in the same
+    transaction as the checkpoint of its source and the rollups it updates.
+    Reports whose location and start time are already stored are skipped and
+    counted as duplicates.
+    Records sharing a position, such as the reports of one location, always
+    go in the same batch, so that a checkpoint never falls between them.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        source: str,
+        units: str = "metric",
+        period: timedelta = timedelta(days=1),
+        batch_size: int = settings.REPORT_INGEST_BATCH_SIZE,
+        create_locations: bool = False,
+    ):
+        self.db = db
+        self.source = source
+        self.units = units
+        self.period = period
+        self.batch_size = batch_size
+        self.locations = LocationMap(db, create_locations)
+        checkpoint = db.get(models.weather.Ingestion_Checkpoint, source)
+        self.position = checkpoint.position if checkpoint else 0
+        self.records = checkpoint.records if checkpoint else 0
+        self.written = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.errors: list[dict] = []
+        self._started = time.perf_counter()
+
+    def ingest(self, records: Iterable[tuple[int, dict]]) -> dict:
+        """Ingest records given with the position following each of them."""
+        batch = []
+        last = self.position
+        for position, record in records:
+            # A full batch is written once the records of its last position end.
+            if len(batch) >= self.batch_size and position != last:
+                self.write(batch, last)
+                batch = []
+            self.records += 1
+            values = self.normalize(record)
+            if values is not None:
+                batch.append(values)
+            last = position
+        if batch or last != self.position:
+            self.write(batch, last)
+        return self.report()
+
+    def normalize(self, record: dict) -> dict | None:
+        """Validate a record and build the values of its report, or record why not."""
+        if "error" in record:
+            return self.fail(record["error"])
+        location_id = self.locations.resolve(
+            record.get("location_id") or record.get("location") or ""
+        )
+        if location_id is None:
+            return self.fail(f"Unknown location {record.get('location')!r}")
+        try:
+            start_time = parse_time(record["start_time"])
+            end_time = (
+                parse_time(record["end_time"])
+                if record.get("end_time")
+                else start_time + self.period
+            )
+            date_time = (
+                parse_time(record["date_time"]) if record.get("date_time") else end_time
+            )
+            values = {
+                name: float(record[name])
+                for name in MEASUREMENTS
+                if record.get(name) not in (None, "")
+            }
+        except (KeyError, TypeError, ValueError) as e:
+            return self.fail(f"Invalid record: {e!r}")
+        units = record.get("units") or self.units
+        if units not in UNITS:
+            return self.fail(f"Unknown units {units!r}")
+        to_metric(values, units)
+        from_metric(values, settings.DEFAULT_UNITS)
+        for name in MEASUREMENTS:
+            values[name] = round(values[name], 2) if name in values else None
+        return {
+            "location_id": location_id,
+            "date_time": date_time,
+            "start_time": start_time,
+            "end_time": end_time,
+            **values,
+        }
+
+    def write(self, batch: list[dict], position: int) -> None:
+        """Insert a batch, roll it up and move the checkpoint past it, atomically."""
+        try:
+            inserted = self.insert_new(batch) if batch else []
+            if inserted:
+                update_rollups(self.db, inserted)
+            checkpoint = self.db.get(
+                models.weather.Ingestion_Checkpoint, self.source
+            ) or models.weather.Ingestion_Checkpoint(source=self.source)
+            checkpoint.position = position
+            checkpoint.records = self.records
+            checkpoint.updated_at = datetime.now()
+            self.db.add(checkpoint)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        self.position = position
+        self.written += len(inserted)
+        self.duplicates += len(batch) - len(inserted)
+
+    def insert_new(self, batch: list[dict]) -> list[dict]:
+        """Insert the reports that are not stored yet, and return them."""
+        unique = {}
+        for values in batch:
+            unique.setdefault((values["location_id"], values["start_time"]), values)
+        if self.db.bind.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        Weather_Report = models.weather.Weather_Report
+        inserted = self.db.execute(
+            insert(Weather_Report)
+            .on_conflict_do_nothing(index_elements=["location_id", "start_time"])
+            .returning(Weather_Report.location_id, Weather_Report.start_time),
+            list(unique.values()),
+        )
+        return [unique[tuple(key)] for key in inserted]
+
+    def report(self) -> dict:
+        """Summarize the ingestion so far."""
+        seconds = time.perf_counter() - self._started
+        return {
+            "source": self.source,
+            "position": self.position,
+            "records": self.records,
+            "written": self.written,
+            "duplicates": self.duplicates,
+            "failed": self.failed,
+            "errors": self.errors,
+            "seconds": round(seconds, 3),
+            "reports_per_second": round(self.written / seconds, 1) if seconds else 0.0,
+        }
+
+    def fail(self, error: str) -> None:
+        """Count an invalid record, keeping the first errors for the report."""
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"record": self.records, "error": error})
+
+
+async def fetch_recent_history(location: models.location.Location) -> list[dict]:
+    """
+    Fetch the daily history of the last days from Tomorrow.io.
+
+    Args:
+        location (models.location.Location): The location, with coordinates.
+
+    Returns:
+        list[dict]: Records in the archive format, in `DEFAULT_UNITS`.
+    """
+    parameters = {
+        "apikey": settings.TOMORROW_IO_API_KEY,
+        "location": f"{location.latitude},{location.longitude}",
+        "timesteps": "1d",
+        "units": settings.DEFAULT_UNITS,
+    }
+    async with upstream_client() as client:
+        response = await client.get(
+            f"{settings.TOMORROW_IO_BASE_URL}/v4/weather/history/recent",
+            params=parameters,
+        )
+    response.raise_for_status()
+    records = []
+    for day in response.json()["timelines"]["daily"]:
+        values = day["values"]
+        records.append(
+            {
+                "location_id": location.location_id,
+                "start_time": day["time"],
+                "temperature": values.get("temperatureAvg"),
+                "humidity": values.get("humidityAvg"),
+                "wind_speed": values.get("windSpeedAvg"),
+                "precipitation_probability": values.get("precipitationProbabilityAvg"),
+                "units": settings.DEFAULT_UNITS,
+            }
+        )
+    return records
+
+
+async def ingest_provider_history(
+    db: Session, limit: int | None = None, concurrency: int = 8
+) -> dict:
+    """
+    Ingest the recent history of every location with coordinates.
+
+    Locations are fetched `concurrency` at a time in `location_id` order. The
+    checkpoint, one per day, records the last location written, so that a
+    rerun on the same day resumes after it; failed fetches are not retried.
+    The days fetched again by the next day's run are skipped as duplicates.
+
+    Returns:
+        dict: The ingestion report.
+    """
+    source = f"tomorrow_io:history:{datetime.now(timezone.utc).date().isoformat()}"
+    ingester = ReportIngester(db, source)
+    Location = models.location.Location
+    query = (
+        db.query(Location)
+        .filter(Location.location_id > ingester.position)
+        .filter(Location.latitude.isnot(None), Location.longitude.isnot(None))
+        .order_by(Location.location_id)
+    )
+    if limit is not None:
+        query = query.limit(limit)
+    locations = query.all()
+    for start in range(0, len(locations), concurrency):
+        chunk = locations[start : start + concurrency]
+        results = await asyncio.gather(
+            *(fetch_recent_history(location) for location in chunk),
+            return_exceptions=True,
+        )
+        records = []
+        for location, result in zip(chunk, results):
+            if isinstance(result, Exception):
+                logger.error(
+                    f"Could not fetch the history of location "
+                    f"{location.location_id}: {result}"
+                )
+                ingester.fail(f"Could not fetch location {location.location_id}")
+                continue
+            records += [(location.location_id, record) for record in result]
+        ingester.ingest(records)
+        if ingester.position != chunk[-1].location_id:
+            ingester.write([], chunk[-1].location_id)
+    return ingester.report()
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Ingest an archive, or the providers' recent history."""
+    parser = argparse.ArgumentParser(description="Ingest historical weather reports.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    archive = commands.add_parser("archive", help="Ingest a CSV or NDJSON archive.")
+    archive.add_argument("path", help="The archive, optionally gzipped.")
+    archive.add_argument("--format", choices=INGEST_FORMATS)
+    archive.add_argument("--units", choices=UNITS, default="metric")
+    archive.add_argument(
+        "--source", help="Checkpoint name, defaults to the absolute path."
+    )
+    archive.add_argument(
+        "--period-hours",
+        type=float,
+        default=24,
+        help="The period of the reports without an end_time.",
+    )
+    archive.add_argument(
+        "--batch-size", type=int, default=settings.REPORT_INGEST_BATCH_SIZE
+    )
+    archive.add_argument(
+        "--create-locations",
+        action="store_true",
+        help="Create the locations that do not exist yet, by name.",
+    )
+    provider = commands.add_parser(
+        "provider", help="Ingest the recent history of the stored locations."
+    )
+    provider.add_argument("--limit", type=int)
+    provider.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    db = database.SessionLocal()
+    try:
+        if args.command == "provider":
+            report = asyncio.run(
+                ingest_provider_history(db, args.limit, args.concurrency)
+            )
+        else:
+            name = os.path.basename(args.path).removesuffix(".gz")
+            ingest_format = args.format or (
+                "csv" if name.endswith(".csv") else "ndjson"
+            )
+            ingester = ReportIngester(
+                db,
+                args.source or os.path.abspath(args.path),
+                units=args.units,
+                period=timedelta(hours=args.period_hours),
+                batch_size=args.batch_size,
+                create_locations=args.create_locations,
+            )
+            with open_archive(args.path) as source:
+                report = ingester.ingest(
+                    read_archive(source, ingest_format, ingester.position)
+                )
+    finally:
+        db.close()
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
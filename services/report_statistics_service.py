@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+
+"""Daily and monthly rollups of the historical weather reports.
+
+Every report is added, as it is written, to the rollup of its day and to the
+rollup of its month. A rollup holds the count, sum, minimum, maximum and a
+fixed-width histogram of each measurement, all of which add up, so the
+statistics of a date range are computed from the monthly rollups of the
+months it fully covers and the daily rollups of the days around them: a year
+takes at most 12 monthly and 60 daily rows per measurement, however many
+reports it holds. Percentiles are estimated from the merged histograms, and
+are accurate to the width of a bin.
+
+The rollups of reports written before they existed, or by other means, are
+rebuilt from the reports with:
+```bash
+python -m services.report_statistics_service rebuild
+```
+"""
+
+import argparse
+import json
+import logging
+import sys
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Iterable
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+
+import database
+import models.location  # noqa: F401, resolves the relationships of reports
+import models.weather
+
+logger = logging.getLogger(__name__)
+
+# The width of the histogram bins, in the units the reports are stored in.
+HISTOGRAM_BIN_WIDTHS = {
+    "temperature": 0.5,
+    "humidity": 1.0,
+    "precipitation_probability": 1.0,
+}
+ROLLUP_MEASUREMENTS = tuple(HISTOGRAM_BIN_WIDTHS)
+DEFAULT_PERCENTILES = (5, 50, 95)
+
+
+@dataclass
+class Aggregate:
+    """
+    The mergeable aggregates of the values of one measurement.
+
+    Attributes:
+        width (float): The width of the histogram bins.
+        count (int): The number of values.
+        total (float): The sum of the values.
+        minimum (float | None): The lowest value.
+        maximum (float | None): The highest value.
+        histogram (Counter): The number of values per bin index.
+    """
+
+    width: float
+    count: int = 0
+    total: float = 0.0
+    minimum: float | None = None
+    maximum: float | None = None
+    histogram: Counter = field(default_factory=Counter)
+
+    def add(self, value: float) -> None:
+        """Add a value."""
+        self.count += 1
+        self.total += value
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+        # Rounded first, so that values on a bin edge are not floored below it.
+        self.histogram[int(round(value / self.width, 6) // 1)] += 1
+
+    def merge(self, other: "Aggregate") -> None:
+        """Add the values of another aggregate."""
+        if not other.count:
+            return
+        self.count += other.count
+        self.total += other.total
+        for name, pick in (("minimum", min), ("maximum", max)):
+            mine, theirs = getattr(self, name), getattr(other, name)
+            setattr(self, name, theirs if mine is None else pick(mine, theirs))
+        self.histogram.update(other.histogram)
+
+    def percentile(self, percent: float) -> float | None:
+        """
+        Estimate a percentile by interpolating within its histogram bin.
+
+        Args:
+            percent (float): Between 0 and 100.
+
+        Returns:
+            float | None: The estimate, within the observed range, or None
+              without values.
+        """
+        if not self.count:
+            return None
+        rank = percent / 100 * self.count
+        seen = 0
+        for index in sorted(self.histogram):
+            in_bin = self.histogram[index]
+            if seen + in_bin >= rank:
+                estimate = (index + (rank - seen) / in_bin) * self.width
+                return min(max(estimate, self.minimum), self.maximum)
+            seen += in_bin
+        return self.maximum
+
+    @classmethod
+    def from_rollup(cls, rollup) -> "Aggregate":
+        """Load the aggregate stored in a rollup, given as a model or a row."""
+        return cls(
+            width=HISTOGRAM_BIN_WIDTHS[rollup.measurement],
+            count=rollup.count,
+            total=rollup.total,
+            minimum=rollup.minimum,
+            maximum=rollup.maximum,
+            histogram=Counter(
+                {int(index): count for index, count in rollup.histogram.items()}
+            ),
+        )
+
+    def columns(self) -> dict:
+        """Build the values of the aggregate's rollup columns."""
+        return {
+            "count": self.count,
+            "total": self.total,
+            "minimum": self.minimum,
+            "maximum": self.maximum,
+            # JSON object keys are strings.
+            "histogram": {str(index): n for index, n in self.histogram.items()},
+        }
+
+
+def month_start(day: date) -> date:
+    """Return the first day of the month of a day."""
+    return day.replace(day=1)
+
+
+def aggregate_reports(
+    reports: Iterable[dict],
+) -> tuple[dict[tuple[int, date, str], Aggregate], int]:
+    """
+    Aggregate reports per location, day and measurement.
+
+    Args:
+        reports (Iterable[dict]): Reports with a `location_id`, a `start_time`
+          and their measurements, as written by the ingestion.
+
+    Returns:
+        tuple[dict, int]: The aggregates, keyed by (location_id, day,
+          measurement), and the number of reports.
+    """
+    aggregates: dict[tuple[int, date, str], Aggregate] = {}
+    count = 0
+    for count, report in enumerate(reports, 1):
+        day = report["start_time"].date()
+        for measurement in ROLLUP_MEASUREMENTS:
+            value = report.get(measurement)
+            if value is None:
+                continue
+            key = (report["location_id"], day, measurement)
+            aggregate = aggregates.get(key)
+            if aggregate is None:
+                aggregate = aggregates[key] = Aggregate(
+                    HISTOGRAM_BIN_WIDTHS[measurement]
+                )
+            aggregate.add(float(value))
+    return aggregates, count
+
+
+def _merge_into(
+    db: Session,
+    model: type[models.weather.Report_Rollup],
+    aggregates: dict[tuple[int, date, str], Aggregate],
+) -> None:
+    location_ids = sorted({location_id for location_id, _, _ in aggregates})
+    period_starts = [period_start for _, period_start, _ in aggregates]
+    existing = {}
+    # The batch's rollups are read by primary key range, in bounded IN lists,
+    # and locked so that concurrent writers add up rather than overwrite.
+    for start in range(0, len(location_ids), 500):
+        rows = db.execute(
+            select(
+                model.location_id,
+                model.period_start,
+                model.measurement,
+                model.count,
+                model.total,
+                model.minimum,
+                model.maximum,
+                model.histogram,
+            )
+            .where(
+                model.location_id.in_(location_ids[start : start + 500]),
+                model.period_start.between(min(period_starts), max(period_starts)),
+            )
+            .with_for_update()
+        )
+        for row in rows:
+            key = (row.location_id, row.period_start, row.measurement)
+            if key in aggregates:
+                existing[key] = row
+    inserts, updates = [], []
+    for key, aggregate in aggregates.items():
+        row = existing.get(key)
+        if row is not None:
+            stored = Aggregate.from_rollup(row)
+            stored.merge(aggregate)
+            aggregate = stored
+        location_id, period_start, measurement = key
+        values = {
+            "location_id": location_id,
+            "period_start": period_start,
+            "measurement": measurement,
+            **aggregate.columns(),
+        }
+        (inserts if row is None else updates).append(values)
+    if inserts:
+        db.execute(insert(model), inserts)
+    if updates:
+        db.execute(update(model), updates)
+
+
+def update_rollups(db: Session, reports: Iterable[dict]) -> int:
+    """
+    Add new reports to their daily and monthly rollups.
+
+    The rollups are written but not committed, so that they are committed in
+    the same transaction as the reports.
+
+    Args:
+        db (Session): The database session.
+        reports (Iterable[dict]): The reports being written.
+
+    Returns:
+        int: The number of reports rolled up.
+    """
+    daily, count = aggregate_reports(reports)
+    if not daily:
+        return count
+    monthly: dict[tuple[int, date, str], Aggregate] = {}
+    for (location_id, day, measurement), aggregate in daily.items():
+        key = (location_id, month_start(day), measurement)
+        if key not in monthly:
+            monthly[key] = Aggregate(aggregate.width)
+        monthly[key].merge(aggregate)
+    _merge_into(db, models.weather.Daily_Report_Rollup, daily)
+    _merge_into(db, models.weather.Monthly_Report_Rollup, monthly)
+    return count
+
+
+def rebuild_rollups(db: Session, location_ids: list[int] | None = None) -> int:
+    """
+    Rebuild the rollups of locations from their reports.
+
+    Each location is rebuilt and committed on its own, reading its reports in
+    order from the (location_id, start_time) index.
+
+    Args:
+        db (Session): The database session.
+        location_ids (list[int], optional): The locations to rebuild, all the
+          locations with reports by default.
+
+    Returns:
+        int: The number of reports rolled up.
+    """
+    Report = models.weather.Weather_Report
+    if location_ids is None:
+        location_ids = list(
+            db.scalars(
+                select(Report.location_id).distinct().order_by(Report.location_id)
+            )
+        )
+    columns = [getattr(Report, name) for name in ROLLUP_MEASUREMENTS]
+    total = 0
+    for location_id in location_ids:
+        for model in (
+            models.weather.Daily_Report_Rollup,
+            models.weather.Monthly_Report_Rollup,
+        ):
+            db.query(model).filter(model.location_id == location_id).delete()
+        rows = db.execute(
+            select(Report.start_time, *columns)
+            .where(Report.location_id == location_id)
+            .order_by(Report.start_time)
+            .execution_options(yield_per=5000)
+        )
+        reports = (
+            {
+                "location_id": location_id,
+                "start_time": row[0],
+                **dict(zip(ROLLUP_MEASUREMENTS, row[1:])),
+            }
+            for row in rows
+        )
+        total += update_rollups(db, reports)
+        db.commit()
+    return total
+
+
+def _load(
+    db: Session,
+    model: type[models.weather.Report_Rollup],
+    location_id: int,
+    first: date,
+    last: date,
+    totals: dict[str, Aggregate],
+) -> set[date]:
+    """Merge the rollups of periods starting from first to last into totals."""
+    if first > last:
+        return set()
+    periods = set()
+    rows = db.scalars(
+        select(model).where(
+            model.location_id == location_id,
+            model.period_start >= first,
+            model.period_start <= last,
+        )
+    )
+    for row in rows:
+        periods.add(row.period_start)
+        totals[row.measurement].merge(Aggregate.from_rollup(row))
+    return periods
+
+
+def query_statistics(
+    db: Session,
+    location_id: int,
+    start_date: date,
+    end_date: date,
+    percentiles: Iterable[float] = DEFAULT_PERCENTILES,
+) -> dict:
+    """
+    Compute the statistics of the reports of a location over a date range.
+
+    The months fully within the range are read from the monthly rollups, the
+    remaining days from the daily rollups.
+
+    Args:
+        db (Session): The database session.
+        location_id (int): The location of the reports.
+        start_date (date): The first day, inclusive.
+        end_date (date): The last day, inclusive.
+        percentiles (Iterable[float], optional): The percentiles to estimate.
+
+    Returns:
+        dict: The number of months and days with reports, and the count, min,
+          max, mean and percentiles of each measurement.
+
+    Examples:
+        ```python
+        query_statistics(db, 1, date(2023, 1, 1), date(2023, 12, 31), [50, 90])
+        ```
+    """
+    totals = {
+        measurement: Aggregate(width)
+        for measurement, width in HISTOGRAM_BIN_WIDTHS.items()
+    }
+    # The first whole month in the range, and the day after the last one.
+    whole_from = month_start(start_date)
+    if whole_from < start_date:
+        whole_from = month_start(whole_from + timedelta(days=31))
+    whole_until = month_start(end_date + timedelta(days=1))
+    months, days = set(), set()
+    if whole_from < whole_until:
+        months = _load(
+            db,
+            models.weather.Monthly_Report_Rollup,
+            location_id,
+            whole_from,
+            whole_until - timedelta(days=1),
+            totals,
+        )
+        days |= _load(
+            db,
+            models.weather.Daily_Report_Rollup,
+            location_id,
+            start_date,
+            whole_from - timedelta(days=1),
+            totals,
+        )
+        days |= _load(
+            db,
+            models.weather.Daily_Report_Rollup,
+            location_id,
+            whole_until,
+            end_date,
+            totals,
+        )
+    else:
+        days = _load(
+            db,
+            models.weather.Daily_Report_Rollup,
+            location_id,
+            start_date,
+            end_date,
+            totals,
+        )
+    percentiles = list(percentiles)
+    statistics = {}
+    for measurement, aggregate in totals.items():
+        statistics[measurement] = {
+            "count": aggregate.count,
+            "min": aggregate.minimum,
+            "max": aggregate.maximum,
+            "mean": round(aggregate.total / aggregate.count, 2)
+            if aggregate.count
+            else None,
+            "percentiles": {
+                f"p{percent:g}": _round(aggregate.percentile(percent))
+                for percent in percentiles
+            },
+        }
+    return {"months": len(months), "days": len(days), **statistics}
+
+
+def _round(value: float | None) -> float | None:
+    return None if value is None else round(value, 2)
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Rebuild the rollups, or print the statistics of a location."""
+    parser = argparse.ArgumentParser(description="Weather report rollups.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    rebuild = commands.add_parser("rebuild", help="Rebuild rollups from reports.")
+    rebuild.add_argument("--location-id", type=int, action="append")
+    statistics = commands.add_parser("statistics", help="Print range statistics.")
+    statistics.add_argument("location_id", type=int)
+    statistics.add_argument("start_date", type=date.fromisoformat)
+    statistics.add_argument("end_date", type=date.fromisoformat)
+    args = parser.parse_args(argv)
+
+    db = database.SessionLocal()
+    try:
+        if args.command == "rebuild":
+            started = datetime.now()
+            reports = rebuild_rollups(db, args.location_id)
+            seconds = (datetime.now() - started).total_seconds()
+            print(f"Rolled up {reports} reports in {seconds:.1f}s")
+        else:
+            print(
+                json.dumps(
+                    query_statistics(
+                        db, args.location_id, args.start_date, args.end_date
+                    ),
+                    indent=2,
+                )
+            )
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+
+"""Bulk import of users from CSV or NDJSON.
+
+Example usage from the command line:
+```bash
+python -m services.user_import_service partner-users.csv --batch-size 1000
+```
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import sys
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Iterable, Iterator
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import database
+import models.user
+import schemas
+from config import settings
+from models.user import Hasher
+
+IMPORT_FORMATS = ("csv", "ndjson")
+# Keep this many rejected rows in the report, the rest are only counted.
+MAX_REPORTED_ERRORS = 100
+
+
+class RowParser:
+    """
+    Parse users one line at a time from CSV (with a header) or NDJSON.
+
+    CSV fields may not span several lines.
+    """
+
+    def __init__(self, import_format: str):
+        self.import_format = import_format
+        self.header: list[str] | None = None
+        self.number = 0
+
+    def parse(self, line: str) -> tuple[int, dict] | None:
+        """
+        Parse a line.
+
+        Args:
+            line (str): A line of the input.
+
+        Returns:
+            tuple[int, dict] | None: The 1-based record number and the raw record,
+              which holds an "error" key if the line could not be parsed. None for
+              the CSV header and blank lines.
+        """
+        if not line.strip():
+            return None
+        if self.import_format == "csv":
+            values = next(csv.reader([line]))
+            if self.header is None:
+                self.header = [name.strip() for name in values]
+                return None
+            self.number += 1
+            return self.number, dict(zip(self.header, values))
+        self.number += 1
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            return self.number, {"error": f"Invalid JSON: {e}"}
+        if not isinstance(record, dict):
+            return self.number, {"error": "Expected a JSON object"}
+        return self.number, record
+
+
+def parse_rows(lines: Iterable[str], import_format: str) -> Iterator[tuple[int, dict]]:
+    """Parse users lazily from the lines of a CSV or NDJSON input."""
+    parser = RowParser(import_format)
+    for line in lines:
+        row = parser.parse(line)
+        if row is not None:
+            yield row
+
+
+_hashing_pool: ProcessPoolExecutor | None = None
+
+
+def create_hashing_pool() -> ProcessPoolExecutor:
+    """
+    Create a process pool to hash the passwords of imported users.
+
+    The processes are spawned rather than forked, since forking a worker would
+    copy its event loop, threads and database connections into the children.
+    """
+    return ProcessPoolExecutor(
+        settings.PASSWORD_HASH_WORKERS, mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+def get_hashing_pool() -> ProcessPoolExecutor:
+    """Return the worker's process pool, started on the first import."""
+    global _hashing_pool
+    if _hashing_pool is None:
+        _hashing_pool = create_hashing_pool()
+    return _hashing_pool
+
+
+def shutdown_hashing_pool() -> None:
+    """Stop the worker's process pool, if it was started, from the app lifespan."""
+    global _hashing_pool
+    if _hashing_pool is not None:
+        _hashing_pool.shutdown(wait=False, cancel_futures=True)
+        _hashing_pool = None
+
+
+class UserImporter:
+    """
+    Create users in batches.
+
+    Each batch is validated, checked against existing phones and emails with
+    one query per column, hashed in parallel on `executor` and inserted with a
+    single multi-row INSERT.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        executor: Executor,
+        batch_size: int = settings.USER_IMPORT_BATCH_SIZE,
+    ):
+        self.db = db
+        self.executor = executor
+        self.batch_size = batch_size
+        self.created = 0
+        self.failed = 0
+        self.errors: list[dict] = []
+        self._started = time.perf_counter()
+
+    def import_rows(self, rows: Iterable[tuple[int, dict]]) -> dict:
+        """Import every row, batch by batch, and return the report."""
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+        return self.report()
+
+    def import_batch(self, rows: list[tuple[int, dict]]) -> None:
+        """Validate, deduplicate, hash and insert a batch of rows."""
+        users = []
+        for number, record in rows:
+            if "error" in record:
+                self._fail(number, record["error"])
+                continue
+            try:
+                user = schemas.UserCreate(
+                    **{
+                        key: value
+                        for key, value in record.items()
+                        if value not in ("", None)
+                    }
+                )
+            except ValidationError as e:
+                self._fail(number, "; ".join(error["msg"] for error in e.errors()))
+                continue
+            users.append((number, user))
+        if users:
+            users = self._without_duplicates(users)
+        if not users:
+            return
+        hashes = self.executor.map(
+            Hasher.get_password_hash,
+            [user.password for _, user in users],
+            chunksize=max(1, len(users) // 16),
+        )
+        values = [
+            {
+                "phone": user.phone,
+                "email": user.email,
+                "gender": user.gender.value if user.gender else None,
+                "password": password_hash,
+            }
+            for (_, user), password_hash in zip(users, hashes)
+        ]
+        try:
+            self.db.execute(insert(models.user.User), values)
+            self.db.commit()
+            self.created += len(values)
+        except IntegrityError:
+            # A concurrent registration won the race, find out which rows clash.
+            self.db.rollback()
+            for (number, _), value in zip(users, values):
+                try:
+                    self.db.execute(insert(models.user.User), [value])
+                    self.db.commit()
+                    self.created += 1
+                except IntegrityError:
+                    self.db.rollback()
+                    self._fail(number, "Phone or email already registered")
+
+    def report(self) -> dict:
+        """Summarize the import so far."""
+        seconds = time.perf_counter() - self._started
+        return {
+            "created": self.created,
+            "failed": self.failed,
+            "errors": self.errors,
+            "seconds": round(seconds, 3),
+            "users_per_second": round(self.created / seconds, 1) if seconds else 0.0,
+        }
+
+    def _without_duplicates(
+        self, users: list[tuple[int, schemas.UserCreate]]
+    ) -> list[tuple[int, schemas.UserCreate]]:
+        """Drop users whose phone or email is taken, in the database or the batch."""
+        User = models.user.User
+        phones = {user.phone for _, user in users}
+        emails = {user.email for _, user in users if user.email}
+        taken_phones = {
+            phone
+            for (phone,) in self.db.query(User.phone).filter(User.phone.in_(phones))
+        }
+        taken_emails = set()
+        if emails:
+            taken_emails = {
+                email
+                for (email,) in self.db.query(User.email).filter(User.email.in_(emails))
+            }
+        unique = []
+        for number, user in users:
+            email_taken = user.email is not None and user.email in taken_emails
+            if user.phone in taken_phones or email_taken:
+                self._fail(number, "Phone or email already registered")
+                continue
+            taken_phones.add(user.phone)
+            if user.email:
+                taken_emails.add(user.email)
+            unique.append((number, user))
+        return unique
+
+    def _fail(self, number: int, error: str) -> None:
+        """Count a rejected row, keeping the first errors for the report."""
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": number, "error": error})
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Import users from a file given on the command line."""
+    parser = argparse.ArgumentParser(description="Bulk import users.")
+    parser.add_argument("path", help="CSV or NDJSON file, or - for standard input")
+    parser.add_argument("--format", choices=IMPORT_FORMATS)
+    parser.add_argument(
+        "--batch-size", type=int, default=settings.USER_IMPORT_BATCH_SIZE
+    )
+    args = parser.parse_args(argv)
+
+    import_format = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+    source = sys.stdin if args.path == "-" else open(args.path, newline="")
+    db = database.SessionLocal()
+    try:
+        with create_hashing_pool() as executor:
+            importer = UserImporter(db, executor, args.batch_size)
+            report = importer.import_rows(parse_rows(source, import_format))
+    finally:
+        db.close()
+        source.close()
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,22 +1,29 @@
 #!/usr/bin/env python3
 
 from datetime import datetime, timedelta
+from typing import Iterator
 import logging
 import httpx
+from sqlalchemy import func, insert, select
 from sqlalchemy.orm import Session
 
 import models.location
 import models.weather
+from cassettes import upstream_client
 from config import settings
+from tracing import traced
 
 units = settings.DEFAULT_UNITS
 default_location = settings.DEFAULT_LOCATION
 api_key = settings.TOMORROW_IO_API_KEY
 fields = []
+# Number of daily forecasts Tomorrow.io returns for a five day forecast.
+FIVE_DAY_FORECAST_PERIODS = 6
 
 logger = logging.getLogger(__name__)
 
 
+@traced()
 async def query_weather_forecast(
     location: models.location.Location, db: Session, forecast_type: str
 ) -> models.weather.Weather_Forecast | list[models.weather.Weather_Forecast]:
@@ -37,12 +44,8 @@ async def query_weather_forecast(
             existing_forecast = (
                 db.query(models.weather.Weather_Forecast)
                 .join(models.location.Location)
-                .filter(
-                    models.location.Location.name == location.name,
-                    models.weather.Weather_Forecast.start_time >= datetime.now(),
-                    models.weather.Weather_Forecast.end_time
-                    <= datetime.now() + timedelta(days=1),
-                )
+                .filter(*_forecast_window(location, forecast_type))
+                .order_by(models.weather.Weather_Forecast.date_time.desc())
                 .first()
             )
             if existing_forecast:
@@ -53,13 +56,7 @@ async def query_weather_forecast(
             existing_forecast = (
                 db.query(models.weather.Weather_Forecast)
                 .join(models.location.Location)
-                .filter(
-                    models.location.Location.name == location.name,
-                    models.weather.Weather_Forecast.start_time
-                    >= datetime.date(datetime.now()),
-                    models.weather.Weather_Forecast.start_time
-                    <= datetime.now() + timedelta(days=5),
-                )
+                .filter(*_forecast_window(location, forecast_type))
                 .order_by(
                     models.weather.Weather_Forecast.start_time,
                     models.weather.Weather_Forecast.date_time.desc()
@@ -67,7 +64,7 @@ async def query_weather_forecast(
                 .distinct(models.weather.Weather_Forecast.start_time)
                 .all()
             )
-            if existing_forecast and len(existing_forecast) >= 6:
+            if existing_forecast and len(existing_forecast) >= FIVE_DAY_FORECAST_PERIODS:
                 unique_forecasts = []
                 forecast_dates = set()
                 for forecast in existing_forecast:
@@ -96,6 +93,124 @@ async def query_weather_forecast(
         return []
 
 
+def _forecast_window(location: models.location.Location, forecast_type: str) -> list:
+    """Build the filters selecting the stored forecasts served for a forecast type.
+
+    Args:
+        location (models.location.Location): The location of the forecasts.
+        forecast_type (str): The type of forecast, either "realtime" or "5d".
+
+    Returns:
+        list: SQLAlchemy filter clauses.
+    """
+    now = datetime.now()
+    filters = [models.location.Location.name == location.name]
+    if forecast_type == "realtime":
+        # The latest reading covering now, reused for as long as clients may
+        # cache it, so that it can be validated without an upstream call.
+        fetched_after = now - timedelta(seconds=settings.REALTIME_CACHE_MAX_AGE)
+        filters += [
+            models.weather.Weather_Forecast.start_time <= now,
+            models.weather.Weather_Forecast.end_time > now,
+            models.weather.Weather_Forecast.date_time >= fetched_after,
+        ]
+    else:
+        filters += [
+            models.weather.Weather_Forecast.start_time >= datetime.date(now),
+            models.weather.Weather_Forecast.start_time <= now + timedelta(days=5),
+        ]
+    return filters
+
+
+def query_forecast_validator(
+    location: models.location.Location, db: Session, forecast_type: str
+) -> tuple[datetime | None, int]:
+    """Summarize the stored forecasts for a location without loading the rows.
+
+    Args:
+        location (models.location.Location): The location of the forecasts.
+        db (Session): The database session.
+        forecast_type (str): The type of forecast, either "realtime" or "5d".
+
+    Returns:
+        tuple[datetime | None, int]: The latest `date_time` of the stored forecasts
+            and the number of distinct forecast periods, as served by
+            `query_weather_forecast`. A realtime forecast is the single latest
+            row, so it counts as one period.
+    """
+    last_modified, periods = (
+        db.query(
+            func.max(models.weather.Weather_Forecast.date_time),
+            func.count(func.distinct(models.weather.Weather_Forecast.start_time)),
+        )
+        .join(models.location.Location)
+        .filter(*_forecast_window(location, forecast_type))
+        .one()
+    )
+    if forecast_type == "realtime":
+        periods = min(periods, 1)
+    return last_modified, periods
+
+
+def is_forecast_cached(periods: int, forecast_type: str) -> bool:
+    """Tell whether `query_weather_forecast` serves a forecast from the database.
+
+    Args:
+        periods (int): The number of distinct stored forecast periods.
+        forecast_type (str): The type of forecast, either "realtime" or "5d".
+
+    Returns:
+        bool: True if no upstream call is needed.
+    """
+    if forecast_type == "realtime":
+        return periods >= 1
+    return periods >= FIVE_DAY_FORECAST_PERIODS
+
+
+def stream_forecast_rows(
+    db: Session,
+    location_id: int | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    batch_size: int = 1000,
+) -> Iterator[dict]:
+    """Stream stored forecasts through a server-side cursor.
+
+    Rows are fetched `batch_size` at a time and never materialized as ORM objects.
+
+    Args:
+        db (Session): The database session, kept open while the rows are consumed.
+        location_id (int, optional): Only stream forecasts for this location.
+        start (datetime, optional): Only stream forecasts starting at or after this time.
+        end (datetime, optional): Only stream forecasts starting before this time.
+        batch_size (int, optional): Number of rows fetched per round trip. Defaults to 1000.
+
+    Yields:
+        dict: The forecast columns plus the location name.
+    """
+    forecast = models.weather.Weather_Forecast
+    query = (
+        select(
+            *forecast.__table__.columns,
+            models.location.Location.city_name.label("location_name"),
+        )
+        .outerjoin(models.location.Location)
+        .order_by(forecast.forecast_id)
+    )
+    if location_id is not None:
+        query = query.where(forecast.location_id == location_id)
+    if start is not None:
+        query = query.where(forecast.start_time >= start)
+    if end is not None:
+        query = query.where(forecast.start_time < end)
+    result = db.execute(
+        query.execution_options(stream_results=True, yield_per=batch_size)
+    )
+    for row in result.mappings():
+        yield dict(row)
+
+
+@traced()
 async def query_tomorrow_io(
     location: models.location.Location, db: Session, forecast_type: str
 ) -> dict:
@@ -130,10 +245,10 @@ async def query_tomorrow_io(
             parameters["endTime"] = "tomorrow + 5d"
 
         if forecast_type == "realtime":
-            url = "https://api.tomorrow.io/v4/weather/realtime"
+            url = f"{settings.TOMORROW_IO_BASE_URL}/v4/weather/realtime"
         else:
-            url = "https://api.tomorrow.io/v4/weather/forecast"
-        async with httpx.AsyncClient() as client:
+            url = f"{settings.TOMORROW_IO_BASE_URL}/v4/weather/forecast"
+        async with upstream_client() as client:
             response = await client.get(url, params=parameters)
         response.raise_for_status()
         forecast_data = response.json()
@@ -145,6 +260,7 @@ async def query_tomorrow_io(
     return {}
 
 
+@traced()
 async def parse_weather_data(
     weather_data: dict,
     location: models.location.Location,
@@ -183,27 +299,36 @@ async def parse_weather_data(
             db.refresh(received_forecast_data)
             return received_forecast_data
         else:
-            six_day_forecast = []
-            for day in weather_data["timelines"]["daily"]:
-                received_forecast_data = models.weather.Weather_Forecast(
-                    location=location,
-                    start_time=datetime.fromisoformat(day["time"]),
-                    end_time=datetime.fromisoformat(day["time"]) + timedelta(days=1),
-                    date_time=datetime.now(),
-                    humidity=day["values"]["humidityAvg"],
-                    temperature=day["values"]["temperatureAvg"],
-                    wind_speed=day["values"]["windSpeedAvg"],
-                    precipitation_probability=day["values"][
+            Weather_Forecast = models.weather.Weather_Forecast
+            rows = [
+                {
+                    "location_id": location.location_id,
+                    "start_time": datetime.fromisoformat(day["time"]),
+                    "end_time": datetime.fromisoformat(day["time"]) + timedelta(days=1),
+                    "date_time": datetime.now(),
+                    "humidity": day["values"]["humidityAvg"],
+                    "temperature": day["values"]["temperatureAvg"],
+                    "wind_speed": day["values"]["windSpeedAvg"],
+                    "precipitation_probability": day["values"][
                         "precipitationProbabilityAvg"
                     ],
-                )
-                six_day_forecast.append(received_forecast_data)
-            db.add_all(six_day_forecast)
+                }
+                for day in weather_data["timelines"]["daily"]
+            ]
+            if not rows:
+                return []
+            # Insert the days with one statement and load them back with one
+            # query, instead of a statement and a refresh per day.
+            forecast_ids = db.scalars(
+                insert(Weather_Forecast).returning(Weather_Forecast.forecast_id), rows
+            ).all()
             db.commit()
-            for forecast in six_day_forecast:
-                db.refresh(forecast)
-
-            return six_day_forecast
+            return (
+                db.query(Weather_Forecast)
+                .filter(Weather_Forecast.forecast_id.in_(forecast_ids))
+                .order_by(Weather_Forecast.start_time)
+                .all()
+            )
     except Exception as e:
         logger.error(f"An error occurred while parsing weather data: {e}")
         return []
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+
+"""Module to stream large result sets as NDJSON or JSON arrays."""
+
+import codecs
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, AsyncIterable, AsyncIterator, Iterable, Iterator
+
+import brotli
+from fastapi.responses import StreamingResponse
+
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+}
+
+# Rows are buffered into chunks of roughly this size before being sent. The
+# first row is sent on its own, so that small exports start without waiting.
+CHUNK_SIZE = 64 * 1024
+
+
+def _default(value: Any) -> Any:
+    """Encode the column types json does not know about."""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_row(row: dict) -> bytes:
+    """Encode a single row as compact JSON."""
+    return json.dumps(row, default=_default, separators=(",", ":")).encode()
+
+
+def ndjson_chunks(rows: Iterable[dict]) -> Iterator[bytes]:
+    """
+    Encode rows as newline delimited JSON.
+
+    Args:
+        rows (Iterable[dict]): The rows to encode.
+
+    Yields:
+        bytes: The first line, then chunks of about `CHUNK_SIZE` bytes holding
+          whole lines.
+    """
+    buffer = bytearray()
+    threshold = 1
+    for row in rows:
+        buffer += encode_row(row)
+        buffer += b"\n"
+        if len(buffer) >= threshold:
+            yield bytes(buffer)
+            buffer.clear()
+            threshold = CHUNK_SIZE
+    if buffer:
+        yield bytes(buffer)
+
+
+def json_array_chunks(rows: Iterable[dict]) -> Iterator[bytes]:
+    """
+    Encode rows as a single JSON array, sent in chunks.
+
+    Args:
+        rows (Iterable[dict]): The rows to encode.
+
+    Yields:
+        bytes: The opening of the array with the first row, then chunks of
+          about `CHUNK_SIZE` bytes of the array.
+    """
+    buffer = bytearray(b"[")
+    first = True
+    threshold = 1
+    for row in rows:
+        if not first:
+            buffer += b","
+        first = False
+        buffer += encode_row(row)
+        if len(buffer) >= threshold:
+            yield bytes(buffer)
+            buffer.clear()
+            threshold = CHUNK_SIZE
+    buffer += b"]"
+    yield bytes(buffer)
+
+
+async def aiter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    """
+    Split a streamed UTF-8 body into lines without buffering all of it.
+
+    Args:
+        chunks (AsyncIterable[bytes]): The body, e.g. `Request.stream()`.
+
+    Yields:
+        str: Each line, without its line ending.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+def negotiate_encoding(accept_encoding: str | None) -> str | None:
+    """
+    Pick the content encoding to use from an Accept-Encoding header.
+
+    Brotli is preferred, then gzip.
+
+    Args:
+        accept_encoding (str, optional): The Accept-Encoding header value.
+
+    Returns:
+        str | None: "br", "gzip" or None for an uncompressed response.
+    """
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    wildcard = accepted.get("*", 0.0)
+    for coding in ("br", "gzip"):
+        if accepted.get(coding, wildcard) > 0:
+            return coding
+    return None
+
+
+def compress_chunks(chunks: Iterable[bytes], encoding: str | None) -> Iterator[bytes]:
+    """
+    Compress a stream of chunks incrementally.
+
+    The first chunk is flushed out of the compressor at once, so that the
+    client receives it without waiting for the compressor's window to fill.
+
+    Args:
+        chunks (Iterable[bytes]): The uncompressed chunks.
+        encoding (str, optional): "br", "gzip" or None to pass chunks through.
+
+    Yields:
+        bytes: The compressed chunks.
+    """
+    if encoding is None:
+        yield from chunks
+        return
+    if encoding == "br":
+        compressor = brotli.Compressor()
+        for index, chunk in enumerate(chunks):
+            compressed = compressor.process(chunk)
+            if index == 0:
+                compressed += compressor.flush()
+            if compressed:
+                yield compressed
+        yield compressor.finish()
+        return
+    compressor = zlib.compressobj(wbits=31)  # 31 selects the gzip container
+    for index, chunk in enumerate(chunks):
+        compressed = compressor.compress(chunk)
+        if index == 0:
+            compressed += compressor.flush(zlib.Z_SYNC_FLUSH)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream_rows(
+    rows: Iterable[dict], output_format: str, accept_encoding: str | None = None
+) -> StreamingResponse:
+    """
+    Build a streaming response for a lazily produced set of rows.
+
+    Memory use stays bounded by the chunk size whatever the number of rows.
+
+    Args:
+        rows (Iterable[dict]): The rows to send, ideally backed by a server-side cursor.
+        output_format (str): "ndjson" or "json".
+        accept_encoding (str, optional): The request's Accept-Encoding header.
+
+    Returns:
+        StreamingResponse: The response streaming the encoded rows.
+    """
+    if output_format == "ndjson":
+        chunks = ndjson_chunks(rows)
+    else:
+        chunks = json_array_chunks(rows)
+    encoding = negotiate_encoding(accept_encoding)
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return StreamingResponse(
+        compress_chunks(chunks, encoding),
+        media_type=MEDIA_TYPES[output_format],
+        headers=headers,
+    )
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+
+"""A test case with a fresh in-memory database for every test."""
+
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import migrate  # noqa: F401, registers every model
+from database import Base
+
+
+class DatabaseTestCase(unittest.TestCase):
+    """
+    Create every table in an in-memory SQLite database before each test.
+
+    The database lives on a single connection, so every session sees it.
+
+    Attributes:
+        engine (Engine): The engine of the database.
+        Session (sessionmaker): A session factory bound to the engine.
+        db (Session): A session, closed after the test.
+    """
+
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        Base.metadata.create_all(bind=self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.db = self.Session()
+        self.addCleanup(self.db.close)
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+import os
+import unittest
+from unittest import mock
+
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+from cache import TTLCache
+
+
+class TestTTLCache(unittest.TestCase):
+    def test_expires_entries(self):
+        cache = TTLCache(max_size=10, ttl_seconds=30)
+        with mock.patch("cache.time.monotonic", return_value=100.0):
+            cache.set("key", "value")
+            self.assertEqual(cache.get("key"), "value")
+        with mock.patch("cache.time.monotonic", return_value=131.0):
+            self.assertIsNone(cache.get("key"))
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_evicts_least_recently_used(self):
+        cache = TTLCache(max_size=2, ttl_seconds=30)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_invalidates_by_tag(self):
+        cache = TTLCache(max_size=10, ttl_seconds=30)
+        cache.set(("123", "jti-1"), "user", tag=1)
+        cache.set(("123", "jti-2"), "user", tag=1)
+        cache.set(("456", "jti-3"), "other", tag=2)
+        cache.invalidate_tag(1)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.get(("456", "jti-3")), "other")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+import asyncio
+import gzip
+import os
+import tempfile
+import time
+import unittest
+
+import httpx
+
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+from cassettes import CassetteMiss, RecordingTransport, ReplayTransport
+
+
+def upstream(request: httpx.Request) -> httpx.Response:
+    location = request.url.params["location"]
+    return httpx.Response(200, json={"data": {"location": location}})
+
+
+class TestCassettes(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.path = os.path.join(directory, "upstream.ndjson.gz")
+
+    def get(self, transport, location, apikey="secret"):
+        async def call():
+            async with httpx.AsyncClient(transport=transport) as client:
+                return await client.get(
+                    "https://api.tomorrow.io/v4/weather/realtime",
+                    params={"location": location, "apikey": apikey},
+                )
+
+        return asyncio.run(call())
+
+    def test_replays_recorded_exchanges_without_credentials(self):
+        recorder = RecordingTransport(self.path, httpx.MockTransport(upstream))
+        recorded = self.get(recorder, "nairobi")
+        with gzip.open(self.path, "rt") as cassette:
+            self.assertNotIn("secret", cassette.read())
+
+        replayer = ReplayTransport(self.path, speed=0)
+        replayed = self.get(replayer, "nairobi", apikey="another-key")
+        self.assertEqual(replayed.status_code, 200)
+        self.assertEqual(replayed.json(), recorded.json())
+        with self.assertRaises(CassetteMiss):
+            self.get(replayer, "mombasa")
+
+    def test_replay_reproduces_recorded_latency(self):
+        def slow(request):
+            time.sleep(0.05)
+            return upstream(request)
+
+        self.get(RecordingTransport(self.path, httpx.MockTransport(slow)), "nairobi")
+        started = time.perf_counter()
+        self.get(ReplayTransport(self.path, speed=1), "nairobi")
+        self.assertGreaterEqual(time.perf_counter() - started, 0.05)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+import asyncio
+import os
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from sqlalchemy import text
+
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+import crud
+import models.location
+import models.user
+import models.weather
+from database_case import DatabaseTestCase
+from services import dashboard_service
+from services.dashboard_service import (
+    build_dashboard,
+    dashboard_cache,
+    migrate_favorite_locations,
+    parse_favorite_locations,
+)
+
+
+class DashboardTestCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.nairobi = models.location.Location(
+            location_id=1, name="nairobi", city_name="Nairobi"
+        )
+        self.mombasa = models.location.Location(
+            location_id=2, name="mombasa", city_name="Mombasa"
+        )
+        self.db.add_all([self.nairobi, self.mombasa])
+        self.db.commit()
+        dashboard_cache.clear()
+        self.addCleanup(dashboard_cache.clear)
+
+
+class TestBuildDashboard(DashboardTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(
+            dashboard_service.database, "SessionLocal", self.Session
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def fetch_forecasts(self, location, db, forecast_type):
+        if location.name == "mombasa":
+            raise RuntimeError("upstream unavailable")
+        now = datetime.now()
+        return [
+            models.weather.Weather_Forecast(
+                forecast_id=1,
+                location_id=location.location_id,
+                date_time=now,
+                start_time=now,
+                end_time=now + timedelta(hours=1),
+                temperature=24,
+                humidity=60,
+                wind_speed=3,
+                precipitation_probability=10,
+            )
+        ]
+
+    def build(self):
+        return asyncio.run(
+            build_dashboard([self.mombasa, self.nairobi], "current_weather")
+        )
+
+    def test_reports_errors_per_location_and_caches_the_rest(self):
+        with mock.patch.object(
+            dashboard_service, "fetch_forecasts", side_effect=self.fetch_forecasts
+        ) as fetch:
+            dashboard = self.build()
+            self.assertEqual(fetch.call_count, 2)
+            mombasa, nairobi = dashboard.locations
+            self.assertEqual(mombasa.location.name, "mombasa")
+            self.assertEqual(mombasa.error, "No forecast available")
+            self.assertEqual(mombasa.forecasts, [])
+            self.assertIsNone(nairobi.error)
+            self.assertEqual(nairobi.forecasts[0].forecast.location_name, "Nairobi")
+
+            # Nairobi is served from the cache, the failed location is retried.
+            again = self.build()
+            self.assertEqual(fetch.call_count, 3)
+            self.assertEqual(fetch.call_args.args[0].name, "mombasa")
+            self.assertEqual(again.locations[1].forecasts, nairobi.forecasts)
+
+
+class TestParseFavoriteLocations(unittest.TestCase):
+    def test_splits_and_deduplicates(self):
+        self.assertEqual(
+            parse_favorite_locations("Nairobi, Mombasa;nairobi\n Kisumu "),
+            ["nairobi", "mombasa", "kisumu"],
+        )
+
+    def test_keeps_a_coordinate_pair_whole(self):
+        self.assertEqual(
+            parse_favorite_locations("-1.2833, 36.8167"), ["-1.2833, 36.8167"]
+        )
+
+    def test_empty_values(self):
+        self.assertEqual(parse_favorite_locations(None), [])
+        self.assertEqual(parse_favorite_locations(" ;, "), [])
+
+
+class TestMigrateFavoriteLocations(DashboardTestCase):
+    def test_migrates_once_and_skips_unknown_locations(self):
+        self.db.add(
+            models.user.User_Preferences(
+                user_id=7, favorite_locations="Mombasa; Atlantis, nairobi"
+            )
+        )
+        self.db.commit()
+        with mock.patch.object(
+            models.location, "get_city_coordinates", return_value=None
+        ):
+            for _ in range(2):
+                self.assertEqual(asyncio.run(migrate_favorite_locations(self.db)), 2)
+        self.assertEqual(
+            [location.name for location in crud.get_favorite_locations(self.db, 7)],
+            ["mombasa", "nairobi"],
+        )
+
+
+class TestDeleteUser(DashboardTestCase):
+    def test_deletes_the_favorites_of_the_user(self):
+        self.db.execute(text("PRAGMA foreign_keys=ON"))
+        user = models.user.User(phone="0700000001", password="x")
+        self.db.add(user)
+        self.db.commit()
+        crud.add_favorite_location(self.db, user.user_id, self.nairobi)
+        crud.delete_user(self.db, user.user_id)
+        self.assertEqual(self.db.query(models.user.Favorite_Location).count(), 0)
+        self.assertIsNone(crud.get_user(self.db, user.user_id))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+import os
+import unittest
+from datetime import date, datetime, timedelta
+
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+import models.location
+import models.weather
+from database_case import DatabaseTestCase
+from services.forecast_accuracy_service import AccuracyEvaluator
+
+
+class TestAccuracyEvaluator(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.db.add(models.location.Location(location_id=1, name="nairobi"))
+        day = datetime(2024, 3, 1)
+        # Two reports averaging 20 degrees, then forecasts one and two days out.
+        for hour, temperature in ((6, 18), (18, 22)):
+            start = day + timedelta(hours=hour)
+            self.add(models.weather.Weather_Report, day, start, temperature)
+        for issued_days_before, temperature in ((1, 21), (1, 23), (2, 16)):
+            issued = day - timedelta(days=issued_days_before, hours=-9)
+            self.add(models.weather.Weather_Forecast, issued, day, temperature)
+        # A forecast of a day without reports is not scored.
+        self.add(models.weather.Weather_Forecast, day, day + timedelta(days=1), 30)
+        self.db.commit()
+
+    def add(self, model, issued, start, temperature):
+        self.db.add(
+            model(
+                location_id=1,
+                date_time=issued,
+                start_time=start,
+                end_time=start + timedelta(days=1),
+                temperature=temperature,
+            )
+        )
+
+    def scores(self) -> dict:
+        return {
+            score.lead_days: score
+            for score in self.db.query(models.weather.Forecast_Accuracy).filter_by(
+                measurement="temperature"
+            )
+        }
+
+    def test_scores_per_lead_time(self):
+        evaluator = AccuracyEvaluator(self.db, date(2024, 3, 1), date(2024, 3, 8))
+        report = evaluator.evaluate()
+        self.assertEqual((report["forecasts"], report["matched"]), (4, 3))
+        scores = self.scores()
+        self.assertEqual(sorted(scores), [1, 2])
+        self.assertEqual(scores[1].samples, 2)
+        self.assertAlmostEqual(scores[1].mae, 2.0)
+        self.assertAlmostEqual(scores[1].rmse, 2.2361, places=4)
+        self.assertAlmostEqual(scores[1].bias, 2.0)
+        self.assertAlmostEqual(scores[2].bias, -4.0)
+        # Humidity is unknown, so it is not scored.
+        self.assertEqual(
+            self.db.query(models.weather.Forecast_Accuracy)
+            .filter_by(measurement="humidity")
+            .count(),
+            0,
+        )
+
+    def test_reevaluating_replaces_the_scores(self):
+        for _ in range(2):
+            AccuracyEvaluator(self.db, date(2024, 3, 1), date(2024, 3, 8)).evaluate()
+        self.assertEqual(self.db.query(models.weather.Forecast_Accuracy).count(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+import os
+import unittest
+from datetime import datetime
+
+from starlette.requests import Request
+
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+from http_cache import (
+    forecast_cache_headers,
+    is_not_modified,
+    make_etag,
+    not_modified_response,
+)
+
+MODIFIED = datetime(2024, 3, 20, 9, 30, 15, 123456)
+
+
+def request(**headers) -> Request:
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/",
+            "headers": [
+                (name.replace("_", "-").encode(), value.encode())
+                for name, value in headers.items()
+            ],
+        }
+    )
+
+
+class TestHttpCache(unittest.TestCase):
+    def setUp(self):
+        self.headers = forecast_cache_headers(1, MODIFIED, 6, "5d", "five-day_weather")
+
+    def test_etag_changes_with_every_input(self):
+        etag = make_etag(1, MODIFIED, 6, "five-day_weather")
+        self.assertEqual(etag, self.headers["ETag"])
+        self.assertTrue(etag.startswith('"') and etag.endswith('"'))
+        for other in (
+            make_etag(2, MODIFIED, 6, "five-day_weather"),
+            make_etag(1, datetime(2024, 3, 21), 6, "five-day_weather"),
+            make_etag(1, MODIFIED, 5, "five-day_weather"),
+            make_etag(1, MODIFIED, 6, "a_days_weather:2024-03-20"),
+        ):
+            self.assertNotEqual(other, etag)
+
+    def test_headers(self):
+        self.assertEqual(self.headers["Cache-Control"], "public, max-age=3600")
+        self.assertIn("GMT", self.headers["Last-Modified"])
+        self.assertEqual(
+            forecast_cache_headers(1, None, 0, "realtime", "current_weather"), {}
+        )
+
+    def test_if_none_match(self):
+        etag = self.headers["ETag"]
+        self.assertTrue(is_not_modified(request(if_none_match=etag), self.headers))
+        self.assertTrue(
+            is_not_modified(request(if_none_match=f'"other", W/{etag}'), self.headers)
+        )
+        self.assertTrue(is_not_modified(request(if_none_match="*"), self.headers))
+        self.assertFalse(is_not_modified(request(if_none_match='"x"'), self.headers))
+
+    def test_if_none_match_takes_precedence_over_if_modified_since(self):
+        self.assertFalse(
+            is_not_modified(
+                request(
+                    if_none_match='"stale"',
+                    if_modified_since=self.headers["Last-Modified"],
+                ),
+                self.headers,
+            )
+        )
+
+    def test_if_modified_since(self):
+        last_modified = self.headers["Last-Modified"]
+        self.assertTrue(
+            is_not_modified(request(if_modified_since=last_modified), self.headers)
+        )
+        self.assertFalse(
+            is_not_modified(
+                request(if_modified_since="Tue, 19 Mar 2024 00:00:00 GMT"),
+                self.headers,
+            )
+        )
+        self.assertFalse(
+            is_not_modified(request(if_modified_since="yesterday"), self.headers)
+        )
+
+    def test_nothing_to_validate(self):
+        self.assertFalse(is_not_modified(request(), self.headers))
+        self.assertFalse(is_not_modified(None, self.headers))
+        self.assertFalse(is_not_modified(request(if_none_match="*"), {}))
+
+    def test_not_modified_response_keeps_the_validators(self):
+        response = not_modified_response(self.headers)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["etag"], self.headers["ETag"])
+        self.assertEqual(response.body, b"")
+
+
+if __name__ == "__main__":
+    unittest.main()
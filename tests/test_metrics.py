@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+import asyncio
+import os
+import unittest
+
+import httpx
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+from cache import TTLCache
+from metrics import InstrumentedTransport, MetricsMiddleware
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class TestMetrics(unittest.TestCase):
+    def test_requests_are_labelled_by_route_template(self):
+        app = FastAPI()
+        app.add_middleware(MetricsMiddleware)
+
+        @app.get("/items/{item_id}")
+        async def item(item_id: int):
+            return {"item_id": item_id}
+
+        labels = {"method": "GET", "route": "/items/{item_id}", "status": "200"}
+        unmatched = {"method": "GET", "route": "unmatched", "status": "404"}
+        before = sample("http_request_duration_seconds_count", **labels)
+        before_unmatched = sample("http_request_duration_seconds_count", **unmatched)
+        client = TestClient(app)
+        client.get("/items/1")
+        client.get("/items/2")
+        client.get("/missing/3")
+        self.assertEqual(
+            sample("http_request_duration_seconds_count", **labels), before + 2
+        )
+        self.assertEqual(
+            sample("http_request_duration_seconds_count", **unmatched),
+            before_unmatched + 1,
+        )
+
+    def test_upstream_calls_are_labelled_by_provider_and_outcome(self):
+        transport = InstrumentedTransport(
+            httpx.MockTransport(lambda request: httpx.Response(429))
+        )
+        labels = {"provider": "tomorrow_io", "outcome": "429"}
+        before = sample("upstream_request_duration_seconds_count", **labels)
+
+        async def call():
+            async with httpx.AsyncClient(transport=transport) as client:
+                await client.get("https://api.tomorrow.io/v4/weather/realtime")
+
+        asyncio.run(call())
+        self.assertEqual(
+            sample("upstream_request_duration_seconds_count", **labels), before + 1
+        )
+
+    def test_named_caches_count_hits_and_misses(self):
+        cache = TTLCache(10, 60, name="test")
+        cache.get("key")
+        cache.set("key", "value")
+        cache.get("key")
+        cache.get("key")
+        self.assertEqual(sample("cache_lookups_total", cache="test", result="hit"), 2)
+        self.assertEqual(sample("cache_lookups_total", cache="test", result="miss"), 1)
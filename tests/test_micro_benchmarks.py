@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+
+import unittest
+
+from benchmarks.micro import compare_results
+
+
+class TestCompareResults(unittest.TestCase):
+    def test_flags_regressions_beyond_tolerance(self):
+        baseline = {"results": {"a": {"best_us": 10.0}, "b": {"best_us": 10.0}}}
+        current = {
+            "results": {
+                "a": {"best_us": 12.0},
+                "b": {"best_us": 14.0},
+                "new": {"best_us": 1.0},
+            }
+        }
+        rows = {row["name"]: row for row in compare_results(baseline, current, 0.3)}
+        self.assertEqual(set(rows), {"a", "b"})
+        self.assertFalse(rows["a"]["regressed"])
+        self.assertTrue(rows["b"]["regressed"])
+        self.assertEqual(rows["b"]["change"], 0.4)
+
+
+if __name__ == "__main__":
+    unittest.main()
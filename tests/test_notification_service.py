@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+import os
+import unittest
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import text
+
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+import crud
+import models.location
+import models.notification
+import models.user
+from database_case import DatabaseTestCase
+from services.notification_service import evaluate_thresholds
+
+
+class TestEvaluateThresholds(unittest.TestCase):
+    def test_first_period_over_threshold_per_location(self):
+        alerts = evaluate_thresholds(
+            np.array([1, 1, 1, 2, 2, 3]),
+            {
+                "rain": np.array([10.0, 70.0, 90.0, np.nan, 65.0, 20.0]),
+                "heat": np.array([31.0, 25.0, 35.0, 20.0, 22.0, np.nan]),
+            },
+            {"rain": 60, "heat": 30},
+        )
+        locations, rows = alerts["rain"]
+        self.assertEqual(locations.tolist(), [1, 2])
+        self.assertEqual(rows.tolist(), [1, 4])
+        locations, rows = alerts["heat"]
+        self.assertEqual(locations.tolist(), [1])
+        self.assertEqual(rows.tolist(), [0])
+
+    def test_no_forecasts(self):
+        alerts = evaluate_thresholds(
+            np.array([], dtype=np.int64), {"rain": np.array([])}, {"rain": 60}
+        )
+        self.assertEqual(alerts["rain"][0].tolist(), [])
+
+    def test_rejects_unknown_kinds(self):
+        with self.assertRaises(ValueError):
+            evaluate_thresholds(
+                np.array([1]), {"snow": np.array([1.0])}, {"snow": 0.5}
+            )
+
+
+class TestDeleteUser(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.db.execute(text("PRAGMA foreign_keys=ON"))
+
+    def test_deletes_the_queued_notifications_of_the_user(self):
+        user = models.user.User(phone="0700000001", password="x")
+        location = models.location.Location(name="nairobi", city_name="Nairobi")
+        self.db.add_all([user, location])
+        self.db.commit()
+        self.db.add(
+            models.notification.Notification(
+                user_id=user.user_id,
+                location_id=location.location_id,
+                kind="rain",
+                forecast_start=datetime.now(),
+                created_at=datetime.now(),
+            )
+        )
+        self.db.commit()
+        crud.delete_user(self.db, user.user_id)
+        self.assertEqual(self.db.query(models.notification.Notification).count(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+import base64
+import os
+import unittest
+
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+from database_case import DatabaseTestCase
+from models.user import User
+from pagination import decode_cursor, encode_cursor, estimate_row_count
+
+
+def b64(payload: bytes) -> str:
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+class TestCursors(unittest.TestCase):
+    def test_round_trip(self):
+        for after_id in (0, 1, 123456789):
+            cursor = encode_cursor(after_id)
+            self.assertNotIn("=", cursor)
+            self.assertEqual(decode_cursor(cursor), after_id)
+
+    def test_tampered_cursors_are_rejected(self):
+        for cursor in (
+            "",
+            "not a cursor!",
+            encode_cursor(42)[:-2],
+            b64(b"[42]"),
+            b64(b'{"before":42}'),
+            b64(b'{"after":"42"}'),
+            b64(b'{"after":4.2}'),
+        ):
+            with self.assertRaises(ValueError, msg=cursor):
+                decode_cursor(cursor)
+
+
+class TestEstimateRowCount(DatabaseTestCase):
+    def test_uses_the_highest_key_on_sqlite(self):
+        self.assertEqual(estimate_row_count(self.db, User.__table__), 0)
+        self.db.add_all(
+            User(user_id=i, phone=str(i), password="x") for i in (1, 2, 7)
+        )
+        self.db.commit()
+        self.assertEqual(estimate_row_count(self.db, User.__table__), 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+import profiling
+from config import settings
+from throttle import SlidingWindowLimiter
+
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        patches = [
+            mock.patch.object(settings, "PROFILING_TOKEN", "token"),
+            mock.patch.object(settings, "PROFILING_DIR", directory),
+            mock.patch.object(settings, "PROFILING_MAX_PER_WINDOW", 2),
+            mock.patch.object(
+                profiling,
+                "profile_limiter",
+                SlidingWindowLimiter(os.path.join(directory, "limits.db"), 60),
+            ),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        app = FastAPI()
+        app.add_middleware(profiling.ProfilingMiddleware)
+        app.add_api_route("/profiles/{profile_id}", profiling.download_profile)
+
+        @app.get("/slow")
+        async def slow():
+            await asyncio.sleep(0.01)
+            return {}
+
+        self.client = TestClient(app)
+
+    def profile(self, token: str = "token"):
+        return self.client.get(
+            "/slow", params={"profile": ""}, headers={"X-Profile-Token": token}
+        )
+
+    def test_profiles_requests_with_the_token(self):
+        response = self.profile()
+        profile_id = response.headers["X-Profile-Id"]
+        path = f"/profiles/{profile_id}"
+        download = self.client.get(path, headers={"X-Profile-Token": "token"})
+        self.assertEqual(download.status_code, 200)
+        self.assertIn(b"slow", download.content)
+        self.assertEqual(self.client.get(path).status_code, 404)
+        # The token is not accepted in the URL.
+        self.assertEqual(
+            self.client.get(path, params={"token": "token"}).status_code, 404
+        )
+
+    def test_ignores_requests_without_the_token(self):
+        for response in (
+            self.profile("wrong"),
+            # The token is only read from the header.
+            self.client.get("/slow", params={"profile": "token"}),
+            # The header alone does not select a request.
+            self.client.get("/slow", headers={"X-Profile-Token": "token"}),
+        ):
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("X-Profile-Id", response.headers)
+
+    def test_rate_limits_profiled_requests(self):
+        statuses = [self.profile().status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+import asyncio
+import os
+from datetime import datetime
+
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+import models.location
+import models.weather
+from database_case import DatabaseTestCase
+from query_tracking import QueryBudgetWarning, install_query_tracking, track_queries
+from services.weather_service import parse_weather_data
+
+
+class TestQueryTracking(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        install_query_tracking(self.engine)
+        now = datetime(2024, 3, 20)
+        for number in range(6):
+            location = models.location.Location(name=f"city-{number}")
+            self.db.add(
+                models.weather.Weather_Forecast(
+                    location=location, date_time=now, start_time=now, end_time=now
+                )
+            )
+        self.db.commit()
+        self.db.expire_all()
+
+    def test_counts_queries_and_flags_lazy_loads(self):
+        with self.assertLogs("query_tracking", "WARNING") as logs:
+            with track_queries("forecasts") as stats:
+                forecasts = self.db.query(models.weather.Weather_Forecast).all()
+                names = [forecast.location.name for forecast in forecasts]
+        self.assertEqual(len(names), 6)
+        self.assertEqual(stats.count, 7)
+        self.assertIn(
+            "Possible N+1 query in forecasts, executed 6 times", logs.output[0]
+        )
+
+    def test_parsing_a_daily_forecast_reloads_the_rows_at_once(self):
+        location = self.db.query(models.location.Location).first()
+        days = [
+            {
+                "time": f"2024-03-2{day}T06:00:00+00:00",
+                "values": {
+                    "humidityAvg": 60,
+                    "temperatureAvg": 24,
+                    "windSpeedAvg": 3,
+                    "precipitationProbabilityAvg": 10,
+                },
+            }
+            for day in range(6)
+        ]
+        with track_queries("daily forecast") as stats:
+            forecasts = asyncio.run(
+                parse_weather_data(
+                    {"timelines": {"daily": days}}, location, "5d", self.db
+                )
+            )
+            temperatures = [forecast.temperature for forecast in forecasts]
+        self.assertEqual(temperatures, [24] * 6)
+        self.assertEqual(stats.repeated(2), [])
+
+    def test_warns_over_budget(self):
+        with self.assertWarns(QueryBudgetWarning):
+            with track_queries("forecasts", budget=1):
+                self.db.query(models.location.Location).all()
+                self.db.query(models.weather.Weather_Forecast).all()
+
+    def test_feeds_the_query_duration_histogram(self):
+        name, labels = "db_query_duration_seconds_count", {"operation": "SELECT"}
+        before = REGISTRY.get_sample_value(name, labels) or 0.0
+        with track_queries("locations") as stats:
+            self.db.query(models.location.Location).all()
+        self.assertEqual(stats.count, 1)
+        self.assertEqual(REGISTRY.get_sample_value(name, labels), before + 1)
+
+    def test_failed_statements_leave_no_state_behind(self):
+        with track_queries("failing") as stats:
+            with self.assertRaises(OperationalError):
+                self.db.execute(text("SELECT * FROM missing"))
+            self.db.rollback()
+            self.db.query(models.location.Location).all()
+        self.assertEqual(stats.count, 1)
+        connection = self.db.connection()
+        self.assertFalse([key for key in connection.info if key.endswith("started")])
+
+    def test_queries_outside_a_block_are_not_tracked(self):
+        with track_queries("empty") as stats:
+            pass
+        self.db.query(models.location.Location).all()
+        self.assertEqual(stats.count, 0)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+import asyncio
+import os
+import unittest
+
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+from query_tracking import _current, track_queries
+from services.realtime_service import RealtimeHub, Subscription
+
+
+class TestSubscription(unittest.IsolatedAsyncioTestCase):
+    async def test_drops_oldest_updates_when_behind(self):
+        subscription = Subscription("nairobi", max_size=2, max_pending_bytes=1024)
+        for payload in (b"1", b"2", b"3"):
+            subscription.offer(payload)
+        self.assertEqual(subscription.dropped, 1)
+        self.assertEqual(await subscription.get(), b"2")
+        self.assertEqual(await subscription.get(), b"3")
+        self.assertIsNone(await subscription.get(timeout=0.01))
+
+    async def test_closes_when_update_exceeds_memory_cap(self):
+        subscription = Subscription("nairobi", max_size=2, max_pending_bytes=4)
+        subscription.offer(b"too large")
+        self.assertTrue(subscription.closed)
+        self.assertIsNone(await subscription.get())
+
+
+class TestRealtimeHub(unittest.IsolatedAsyncioTestCase):
+    async def test_one_poller_fans_out_to_all_subscribers(self):
+        calls = []
+
+        async def fetch(location_name):
+            calls.append(location_name)
+            return b'{"temperature": "21.00"}'
+
+        hub = RealtimeHub(fetch=fetch, poll_interval=60)
+        first = hub.subscribe("Nairobi")
+        second = hub.subscribe("nairobi ")
+        self.assertEqual(await first.get(timeout=1), b'{"temperature": "21.00"}')
+        self.assertEqual(await second.get(timeout=1), b'{"temperature": "21.00"}')
+        self.assertEqual(calls, ["nairobi"])
+
+        hub.unsubscribe(first)
+        hub.unsubscribe(second)
+        await asyncio.sleep(0)
+        self.assertEqual(hub.subscribers, {})
+
+    async def test_poller_queries_are_not_counted_in_the_request(self):
+        pollers_stats = []
+
+        async def fetch(location_name):
+            pollers_stats.append(_current.get())
+            return b"{}"
+
+        hub = RealtimeHub(fetch=fetch, poll_interval=60)
+        with track_queries("GET /api/v1/realtime"):
+            subscription = hub.subscribe("nairobi")
+        await subscription.get(timeout=1)
+        hub.unsubscribe(subscription)
+        self.assertEqual(pollers_stats, [None])
+
+
+if __name__ == "__main__":
+    unittest.main()
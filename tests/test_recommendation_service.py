@@ -1,7 +1,11 @@
 #!/usr/bin/env python3
 
 import unittest
-from services.recommendation_service import WeatherAnalyzer, WeatherRecommender
+from services.recommendation_service import (
+    WeatherAnalyzer,
+    WeatherRecommender,
+    analyze_forecasts,
+)
 
 
 class TestWeatherAnalyzer(unittest.TestCase):
@@ -25,5 +29,20 @@ class TestWeatherAnalyzer(unittest.TestCase):
         self.assertIn("weather_descriptions", recommendations)
 
 
+class TestAnalyzeForecasts(unittest.TestCase):
+    def test_matches_single_analysis(self):
+        readings = [(28.70, 84.40, 0.00), (5, 20, 75), (28.70, 84.40, 0.00)]
+        results = analyze_forecasts(readings)
+        self.assertEqual(len(results), len(readings))
+        for reading, result in zip(readings, results):
+            analysis = WeatherAnalyzer().analyze_weather(*reading)
+            expected = WeatherRecommender().generate_recommendations(**analysis)
+            self.assertEqual(result, expected)
+
+    def test_rejects_missing_values(self):
+        with self.assertRaises(ValueError):
+            analyze_forecasts([(None, 50, 10)])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+import asyncio
+import functools
+import io
+import os
+from unittest import mock
+
+from sqlalchemy import func
+
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+import models.location
+import models.weather
+from database_case import DatabaseTestCase
+from services import report_ingestion_service
+from services.report_ingestion_service import (
+    ReportIngester,
+    ingest_provider_history,
+    read_archive,
+)
+
+ARCHIVE = (
+    b"location,start_time,temperature,humidity,wind_speed,precipitation_probability\n"
+    b"nairobi,2024-03-20T00:00:00Z,77,60,10,20\n"
+    b"atlantis,2024-03-20T00:00:00Z,70,60,10,20\n"
+    b"nairobi,2024-03-21T03:00:00+03:00,86,55,5,10\n"
+    b'"-1.2833,36.8167",2024-03-22T00:00:00Z,68,50,0,0\n'
+)
+
+
+class TestReportIngester(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.db.add(
+            models.location.Location(
+                name="nairobi", latitude=-1.2833, longitude=36.8167
+            )
+        )
+        self.db.commit()
+
+    def ingest(self, archive: bytes, batch_size: int = 2) -> dict:
+        ingester = ReportIngester(
+            self.db, "archive.csv", units="imperial", batch_size=batch_size
+        )
+        records = read_archive(io.BytesIO(archive), "csv", ingester.position)
+        return ingester.ingest(records)
+
+    def reports(self) -> list:
+        return (
+            self.db.query(models.weather.Weather_Report)
+            .order_by(models.weather.Weather_Report.start_time)
+            .all()
+        )
+
+    def test_normalizes_units_times_and_locations(self):
+        report = self.ingest(ARCHIVE)
+        self.assertEqual(report["written"], 3)
+        self.assertEqual(report["failed"], 1)
+        first, second, third = self.reports()
+        self.assertEqual(float(first.temperature), 25.0)
+        self.assertEqual(float(first.wind_speed), 4.47)
+        self.assertEqual(second.start_time.isoformat(), "2024-03-21T00:00:00")
+        self.assertEqual(second.end_time.isoformat(), "2024-03-22T00:00:00")
+        self.assertEqual(third.location_id, first.location_id)
+
+    def test_resumes_after_the_last_written_batch(self):
+        lines = ARCHIVE.splitlines(keepends=True)
+        self.ingest(b"".join(lines[:3]))
+        report = self.ingest(ARCHIVE)
+        self.assertEqual(report["records"], 4)
+        self.assertEqual(report["written"], 2)
+        self.ingest(ARCHIVE)
+        self.assertEqual(
+            self.db.query(func.count(models.weather.Weather_Report.report_id)).scalar(),
+            3,
+        )
+
+
+class TestIngestProviderHistory(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.db.add_all(
+            models.location.Location(
+                location_id=location_id,
+                name=f"city-{location_id}",
+                latitude=0,
+                longitude=0,
+            )
+            for location_id in (1, 2, 3)
+        )
+        self.db.commit()
+
+    async def fetch(self, location):
+        return [
+            {
+                "location_id": location.location_id,
+                "start_time": f"2024-03-{day:02}T00:00:00Z",
+                "temperature": 20,
+            }
+            for day in (18, 19, 20)
+        ]
+
+    def ingest(self) -> dict:
+        with mock.patch.object(
+            report_ingestion_service, "fetch_recent_history", side_effect=self.fetch
+        ), mock.patch.object(
+            report_ingestion_service,
+            "ReportIngester",
+            functools.partial(ReportIngester, batch_size=2),
+        ):
+            return asyncio.run(ingest_provider_history(self.db, concurrency=3))
+
+    def test_checkpoints_only_whole_locations(self):
+        written = []
+        write = ReportIngester.write
+
+        def fail_after_first_batch(ingester, batch, position):
+            if written:
+                raise RuntimeError("database went away")
+            written.append((len(batch), position))
+            write(ingester, batch, position)
+
+        with mock.patch.object(ReportIngester, "write", fail_after_first_batch):
+            with self.assertRaises(RuntimeError):
+                self.ingest()
+        # The first batch holds every report of location 1, not just two.
+        self.assertEqual(written, [(3, 1)])
+
+        report = self.ingest()
+        self.assertEqual(report["written"], 6)
+        Weather_Report = models.weather.Weather_Report
+        counts = dict(
+            self.db.query(
+                Weather_Report.location_id, func.count(Weather_Report.report_id)
+            ).group_by(Weather_Report.location_id)
+        )
+        self.assertEqual(counts, {1: 3, 2: 3, 3: 3})
+
+    def test_skips_the_history_fetched_again_on_the_next_day(self):
+        self.ingest()
+        # The next day's run has a checkpoint of its own.
+        self.db.query(models.weather.Ingestion_Checkpoint).delete()
+        self.db.commit()
+        report = self.ingest()
+        self.assertEqual((report["written"], report["duplicates"]), (0, 9))
+        self.assertEqual(self.db.query(models.weather.Weather_Report).count(), 9)
+        Rollup = models.weather.Daily_Report_Rollup
+        counts = {
+            count
+            for (count,) in self.db.query(Rollup.count).filter(
+                Rollup.measurement == "temperature"
+            )
+        }
+        self.assertEqual(counts, {1})
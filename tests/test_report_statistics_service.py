@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+import os
+import random
+import statistics
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func
+
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+import models.location
+import models.weather
+from database_case import DatabaseTestCase
+from services.report_ingestion_service import ReportIngester
+from services.report_statistics_service import query_statistics, rebuild_rollups
+
+
+class TestReportStatistics(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.db.add(models.location.Location(name="nairobi"))
+        self.db.commit()
+        # Three hourly reports a day from mid January to mid March.
+        rng = random.Random(7)
+        start = datetime(2024, 1, 15)
+        self.reports = [
+            {
+                "location": "nairobi",
+                "start_time": (start + timedelta(hours=8 * i)).isoformat(),
+                "temperature": round(rng.uniform(10, 30), 2),
+                "humidity": round(rng.uniform(20, 90), 2),
+                "precipitation_probability": rng.randrange(0, 101),
+            }
+            for i in range(3 * 60)
+        ]
+        ingester = ReportIngester(self.db, "test", batch_size=50)
+        ingester.ingest((i, report) for i, report in enumerate(self.reports, 1))
+
+    def expected(self, start_date: date, end_date: date) -> list[float]:
+        return [
+            report["temperature"]
+            for report in self.reports
+            if start_date
+            <= datetime.fromisoformat(report["start_time"]).date()
+            <= end_date
+        ]
+
+    def test_range_statistics_match_the_reports(self):
+        start_date, end_date = date(2024, 1, 20), date(2024, 3, 5)
+        result = query_statistics(self.db, 1, start_date, end_date, [50])
+        temperatures = self.expected(start_date, end_date)
+        self.assertEqual(result["months"], 1)
+        self.assertEqual(result["days"], 12 + 5)
+        temperature = result["temperature"]
+        self.assertEqual(temperature["count"], len(temperatures))
+        self.assertEqual(temperature["min"], min(temperatures))
+        self.assertEqual(temperature["max"], max(temperatures))
+        self.assertAlmostEqual(temperature["mean"], statistics.mean(temperatures), 2)
+        self.assertAlmostEqual(
+            temperature["percentiles"]["p50"], statistics.median(temperatures), 0
+        )
+
+    def test_rebuild_matches_the_incremental_rollups(self):
+        def rollups():
+            return [
+                (row.period_start, row.measurement, row.count, row.histogram)
+                for row in self.db.query(models.weather.Daily_Report_Rollup)
+                .order_by("period_start", "measurement")
+                .all()
+            ]
+
+        incremental = rollups()
+        self.assertEqual(rebuild_rollups(self.db), len(self.reports))
+        self.assertEqual(rollups(), incremental)
+        self.assertEqual(
+            self.db.query(func.count(models.weather.Monthly_Report_Rollup.location_id))
+            .scalar(),
+            3 * 3,
+        )
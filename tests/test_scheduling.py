@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+import asyncio
+import os
+import subprocess
+import sys
+import unittest
+import uuid
+
+from scheduling import LeaderLock, run_periodically
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestLeaderLock(unittest.TestCase):
+    def setUp(self):
+        self.name = f"test-{uuid.uuid4().hex}"
+        self.lock = LeaderLock(self.name)
+        self.addCleanup(self.cleanup)
+
+    def cleanup(self):
+        self.lock.release()
+        if os.path.exists(self.lock.path):
+            os.remove(self.lock.path)
+
+    def acquired_by_another_worker(self) -> bool:
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys; from scheduling import LeaderLock; "
+                "print(LeaderLock(sys.argv[1]).acquire())",
+                self.name,
+            ],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return result.stdout.strip() == "True"
+
+    def test_a_second_worker_does_not_acquire_the_lock(self):
+        self.assertTrue(self.lock.acquire())
+        self.assertTrue(self.lock.acquire())
+        self.assertFalse(LeaderLock(self.name).acquire())
+        self.assertFalse(self.acquired_by_another_worker())
+
+    def test_another_worker_takes_over_after_release(self):
+        self.assertTrue(self.lock.acquire())
+        self.lock.release()
+        self.assertFalse(self.lock.held)
+        self.assertTrue(self.acquired_by_another_worker())
+
+
+class TestRunPeriodically(unittest.IsolatedAsyncioTestCase):
+    async def test_only_the_leader_runs_the_job(self):
+        name = f"test-{uuid.uuid4().hex}"
+        runs = []
+
+        def job(worker):
+            async def run():
+                runs.append(worker)
+
+            return run
+
+        tasks = [
+            asyncio.create_task(run_periodically(name, job(worker), 0.01))
+            for worker in ("first", "second")
+        ]
+        await asyncio.sleep(0.1)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        os.remove(LeaderLock(name).path)
+        self.assertGreater(len(runs), 1)
+        self.assertEqual(set(runs), {"first"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+import gzip
+import json
+import unittest
+import zlib
+from datetime import datetime
+from decimal import Decimal
+
+import brotli
+
+from streaming import (
+    compress_chunks,
+    json_array_chunks,
+    ndjson_chunks,
+    negotiate_encoding,
+)
+
+
+class TestStreaming(unittest.TestCase):
+    rows = [
+        {"id": i, "time": datetime(2024, 1, 1, i), "temperature": Decimal("21.50")}
+        for i in range(5)
+    ]
+
+    def test_ndjson_chunks(self):
+        lines = b"".join(ndjson_chunks(self.rows)).splitlines()
+        self.assertEqual(len(lines), len(self.rows))
+        self.assertEqual(
+            json.loads(lines[1]),
+            {"id": 1, "time": "2024-01-01T01:00:00", "temperature": "21.50"},
+        )
+
+    def test_json_array_chunks(self):
+        self.assertEqual(len(json.loads(b"".join(json_array_chunks(self.rows)))), 5)
+        self.assertEqual(json.loads(b"".join(json_array_chunks([]))), [])
+
+    def test_gzip_round_trip(self):
+        body = b"".join(compress_chunks(ndjson_chunks(self.rows), "gzip"))
+        self.assertEqual(gzip.decompress(body), b"".join(ndjson_chunks(self.rows)))
+
+    def test_brotli_round_trip(self):
+        body = b"".join(compress_chunks(ndjson_chunks(self.rows), "br"))
+        self.assertEqual(brotli.decompress(body), b"".join(ndjson_chunks(self.rows)))
+
+    def test_first_row_is_sent_at_once(self):
+        first_line = next(ndjson_chunks(self.rows))
+        self.assertEqual(json.loads(first_line)["id"], 0)
+        self.assertTrue(next(json_array_chunks(self.rows)).startswith(b'[{"id":0'))
+
+    def test_first_compressed_chunk_decodes_on_its_own(self):
+        first_line = next(ndjson_chunks(self.rows))
+        chunk = next(compress_chunks(ndjson_chunks(self.rows), "gzip"))
+        self.assertEqual(zlib.decompressobj(wbits=31).decompress(chunk), first_line)
+        chunk = next(compress_chunks(ndjson_chunks(self.rows), "br"))
+        self.assertEqual(brotli.Decompressor().process(chunk), first_line)
+
+    def test_negotiate_encoding(self):
+        self.assertIsNone(negotiate_encoding(None))
+        self.assertIsNone(negotiate_encoding("identity"))
+        self.assertIsNone(negotiate_encoding("gzip;q=0"))
+        self.assertEqual(negotiate_encoding("deflate, gzip;q=0.8"), "gzip")
+        self.assertEqual(negotiate_encoding("gzip, br"), "br")
+        self.assertEqual(negotiate_encoding("gzip, br;q=0"), "gzip")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+import asyncio
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+import throttle
+from throttle import SlidingWindowLimiter
+
+
+class TestSlidingWindowLimiter(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.limiter = SlidingWindowLimiter(
+            os.path.join(directory.name, "counters.db"), 60
+        )
+        # The start of a window, so that the previous one fully overlaps.
+        self.now = 60.0 * 1000
+
+    def hit(self, phone: str = "0700000001", limit: int = 3) -> int | None:
+        with mock.patch.object(throttle.time, "time", return_value=self.now):
+            return self.limiter.hit([("phone", phone, limit), ("ip", "10.0.0.1", 10)])
+
+    def counter_buckets(self) -> list[int]:
+        rows = self.limiter._connect().execute("SELECT DISTINCT bucket FROM counters")
+        return sorted(bucket for (bucket,) in rows)
+
+    def test_rejects_over_the_limit(self):
+        self.assertEqual([self.hit() for _ in range(3)], [None] * 3)
+        self.assertEqual(self.hit(), 60)
+        self.assertIsNone(self.hit(phone="0700000002"))
+        self.assertEqual(
+            self.limiter.stats(),
+            {"phone": {"allowed": 4, "rejected": 1}, "ip": {"allowed": 4}},
+        )
+
+    def test_previous_window_is_weighted_by_its_overlap(self):
+        for _ in range(3):
+            self.hit()
+        # A quarter into the next window, 3 * 0.75 earlier events still count.
+        self.now += 75
+        self.assertEqual(self.hit(limit=2), 45)
+        self.assertIsNone(self.hit(limit=3))
+
+    def test_reset_forgets_a_key(self):
+        for _ in range(3):
+            self.hit()
+        self.limiter.reset("phone", "0700000001")
+        self.assertIsNone(self.hit())
+
+    def test_old_counters_are_deleted_once_per_cleanup_window(self):
+        self.now = 60.0 * 1599
+        self.hit()
+        self.now = 60.0 * 1600
+        self.hit()
+        self.assertEqual(self.counter_buckets(), [1599, 1600])
+        # Counters left by another worker are not deleted again in this window.
+        self.limiter._connect().execute("INSERT INTO counters VALUES ('x', 'y', 1, 1)")
+        self.hit()
+        self.assertEqual(self.counter_buckets(), [1, 1599, 1600])
+        self.now = 60.0 * 1616
+        self.hit()
+        self.assertEqual(self.counter_buckets(), [1616])
+
+    def test_ahit_runs_concurrently_off_the_event_loop(self):
+        async def hit_many():
+            with mock.patch.object(throttle.time, "time", return_value=self.now):
+                return await asyncio.gather(
+                    *(self.limiter.ahit([("phone", "0700000001", 5)]) for _ in range(8))
+                )
+
+        results = asyncio.run(hit_many())
+        self.assertEqual(results.count(None), 5)
+        self.assertEqual(self.limiter.stats()["phone"], {"allowed": 5, "rejected": 3})
+
+    def test_fails_open(self):
+        with mock.patch.object(
+            self.limiter, "_connect", side_effect=sqlite3.OperationalError("locked")
+        ):
+            self.assertIsNone(self.hit())
+
+
+if __name__ == "__main__":
+    unittest.main()
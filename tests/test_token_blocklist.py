@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+import os
+import unittest
+from datetime import datetime, timedelta
+
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+from database_case import DatabaseTestCase
+from models.token_blocklist import BlocklistIndex, TokenBlocklist
+
+
+class TestBlocklistIndex(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.later = datetime.now() + timedelta(hours=1)
+        self.add("active", self.later)
+        self.add("expired", datetime.now() - timedelta(hours=1))
+        # Refresh on every check and never reload, unless a test says otherwise.
+        self.index = BlocklistIndex(refresh_seconds=0, reload_seconds=3600, overlap=10)
+
+    def add(self, jti: str, exp: datetime, row_id: int | None = None) -> None:
+        TokenBlocklist(id=row_id, jti=jti, token_type="bearer", exp=exp).save(self.db)
+
+    def check(self, jti: str | None, index: BlocklistIndex | None = None) -> bool:
+        if index is None:
+            index = self.index
+        index.sync(self.db)
+        return index.is_blocklisted(jti, self.db)
+
+    def test_load_skips_expired_tokens(self):
+        self.assertTrue(self.check("active"))
+        self.assertFalse(self.check("expired"))
+        self.assertFalse(self.check(None))
+        self.assertEqual(len(self.index), 1)
+
+    def test_queries_the_database_until_loaded(self):
+        self.assertTrue(self.index.is_blocklisted("active", self.db))
+        self.assertFalse(self.index.loaded)
+
+    def test_refresh_picks_up_revocations_from_other_workers(self):
+        self.assertFalse(self.check("revoked"))
+        self.add("revoked", self.later)
+        self.assertTrue(self.check("revoked"))
+
+    def test_refresh_picks_up_rows_committed_out_of_id_order(self):
+        self.add("third", self.later, row_id=30)
+        self.index.load(self.db)
+        # A transaction that took id 25 before id 30 committed only now.
+        self.add("late", self.later, row_id=25)
+        self.assertTrue(self.check("late"))
+
+    def test_revocation_waits_for_the_refresh_interval(self):
+        index = BlocklistIndex(refresh_seconds=3600, reload_seconds=3600)
+        self.assertFalse(self.check("revoked", index))
+        self.add("revoked", self.later)
+        self.assertFalse(self.check("revoked", index))
+        # The worker that revoked the token knows about it at once.
+        index.add("revoked", self.later)
+        self.assertTrue(self.check("revoked", index))
+
+    def test_reload_forgets_deleted_rows(self):
+        index = BlocklistIndex(refresh_seconds=0, reload_seconds=0)
+        self.assertTrue(self.check("active", index))
+        self.db.query(TokenBlocklist).filter_by(jti="active").delete()
+        self.db.commit()
+        self.assertFalse(self.check("active", index))
+
+
+class TestCleanBlockList(DatabaseTestCase):
+    def add(self, count: int, exp: datetime) -> None:
+        self.db.add_all(
+            TokenBlocklist(jti=f"{exp:%H%M%S}-{i}", token_type="bearer", exp=exp)
+            for i in range(count)
+        )
+        self.db.commit()
+
+    def test_removes_every_expired_entry_in_batches(self):
+        self.add(25, datetime.now() - timedelta(hours=1))
+        self.add(3, datetime.now() + timedelta(hours=1))
+        self.assertEqual(TokenBlocklist.clean_block_list(self.db, batch_size=10), 25)
+        self.assertEqual(self.db.query(TokenBlocklist).count(), 3)
+
+    def test_stops_when_the_backlog_is_a_multiple_of_the_batch_size(self):
+        self.add(20, datetime.now() - timedelta(hours=1))
+        self.assertEqual(TokenBlocklist.clean_block_list(self.db, batch_size=10), 20)
+        self.assertEqual(TokenBlocklist.clean_block_list(self.db, batch_size=10), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+import asyncio
+import os
+import unittest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+import tracing
+from services.realtime_service import RealtimeHub
+from tracing import TracingMiddleware, span, to_otlp, traced
+
+
+@traced()
+async def fetch():
+    await asyncio.sleep(0.01)
+
+
+@traced()
+async def lookup():
+    await fetch()
+
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        app = FastAPI()
+        app.add_middleware(TracingMiddleware)
+
+        @app.get("/forecast")
+        async def forecast():
+            await lookup()
+            with span("build_response"):
+                return {}
+
+        self.client = TestClient(app)
+
+    def test_server_timing_summarizes_the_spans(self):
+        response = self.client.get("/forecast")
+        timing = response.headers["Server-Timing"]
+        for name in ("lookup;dur=", "fetch;dur=", "build_response;dur=", "total;dur="):
+            self.assertIn(name, timing)
+
+    def test_spans_nest_and_continue_the_incoming_trace(self):
+        captured = []
+
+        @traced()
+        async def outer():
+            with span("inner") as inner:
+                captured.append(inner)
+
+        app = FastAPI()
+        app.add_middleware(TracingMiddleware)
+
+        @app.get("/")
+        async def root():
+            await outer()
+            return {}
+
+        trace_id = "0af7651916cd43dd8448eb211c80319c"
+        TestClient(app).get(
+            "/", headers={"traceparent": f"00-{trace_id}-b7ad6b7169203331-01"}
+        )
+        inner = captured[0]
+        self.assertEqual(inner.trace_id, trace_id)
+        self.assertIsNotNone(inner.parent_id)
+        self.assertGreater(inner.end_ns, inner.start_ns)
+
+    def test_pollers_do_not_write_into_the_request_trace(self):
+        traces, polls = [], []
+
+        @traced()
+        async def fetch_realtime(location_name):
+            polls.append(location_name)
+            return f"{len(polls)}".encode()
+
+        hub = RealtimeHub(fetch=fetch_realtime, poll_interval=0.001)
+        app = FastAPI()
+        app.add_middleware(TracingMiddleware)
+
+        @app.get("/realtime")
+        async def realtime():
+            traces.append(tracing._trace.get())
+            subscription = hub.subscribe("nairobi")
+            await subscription.get(timeout=1)
+            await subscription.get(timeout=1)
+            return {}
+
+        with TestClient(app) as client:
+            client.get("/realtime")
+            # The poller still runs after the response was sent.
+            client.portal.call(asyncio.sleep, 0.05)
+        self.assertGreater(len(polls), 2)
+        self.assertEqual(traces[0].spans, [])
+
+    def test_spans_of_a_closed_trace_record_nothing(self):
+        trace = tracing.Trace("0af7651916cd43dd8448eb211c80319c", closed=True)
+        token = tracing._trace.set(trace)
+        try:
+            with span("late") as current:
+                self.assertIsNone(current)
+        finally:
+            tracing._trace.reset(token)
+        self.assertEqual(trace.spans, [])
+
+    def test_spans_outside_a_request_record_nothing(self):
+        with span("background") as current:
+            self.assertIsNone(current)
+
+    def test_otlp_export_request(self):
+        captured = []
+
+        @traced()
+        async def outer():
+            with span("inner", periods=6) as inner:
+                captured.append(inner)
+
+        app = FastAPI()
+        app.add_middleware(TracingMiddleware)
+
+        @app.get("/")
+        async def root():
+            await outer()
+            return {}
+
+        TestClient(app).get("/")
+        body = to_otlp(captured)
+        otlp_span = body["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+        self.assertEqual(otlp_span["name"], "inner")
+        self.assertEqual(otlp_span["parentSpanId"], captured[0].parent_id)
+        self.assertEqual(
+            otlp_span["attributes"], [{"key": "periods", "value": {"intValue": "6"}}]
+        )
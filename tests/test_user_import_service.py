@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+import io
+import json
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from unittest import mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+import auth
+import database
+import models.user
+from database_case import DatabaseTestCase
+from models.user import Hasher
+from routes import user_routes
+from services import user_import_service
+from services.user_import_service import UserImporter, create_hashing_pool, parse_rows
+
+CSV = """phone,email,password,gender
+0700000001,a@example.com,secret,female
+0700000002,,secret,
+0700000001,c@example.com,secret,male
+0700000003,a@example.com,secret,
+0700000004,,,
+0700000009,,secret,
+"""
+
+NDJSON = """{"phone": "0700000001", "password": "secret"}
+not json
+[1, 2]
+
+{"phone": "0700000002", "password": "secret", "gender": "unknown"}
+{"phone": "0700000009", "password": "secret"}
+"""
+
+
+class ImportTestCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        # A user registered before the import.
+        self.db.add(models.user.User(phone="0700000009", password="x"))
+        self.db.commit()
+        self.executor = ThreadPoolExecutor(2)
+        self.addCleanup(self.executor.shutdown)
+
+    def phones(self) -> list[str]:
+        return sorted(phone for (phone,) in self.db.query(models.user.User.phone))
+
+    def assert_csv_report(self, report: dict) -> None:
+        self.assertEqual(report["created"], 2)
+        errors = {error["row"]: error["error"] for error in report["errors"]}
+        self.assertEqual(sorted(errors), [3, 4, 5, 6])
+        self.assertEqual(errors[3], "Phone or email already registered")
+        self.assertEqual(errors[4], "Phone or email already registered")
+        self.assertEqual(errors[5], "Field required")
+        self.assertEqual(self.phones(), ["0700000001", "0700000002", "0700000009"])
+
+
+class TestUserImporter(ImportTestCase):
+    def test_imports_csv_with_partial_failures(self):
+        importer = UserImporter(self.db, self.executor, batch_size=2)
+        report = importer.import_rows(parse_rows(io.StringIO(CSV), "csv"))
+        self.assert_csv_report(report)
+        user = self.db.query(models.user.User).filter_by(phone="0700000001").one()
+        self.assertEqual((user.email, user.gender), ("a@example.com", "female"))
+        self.assertTrue(Hasher.verify_password("secret", user.password))
+
+    def test_imports_ndjson_with_malformed_lines(self):
+        importer = UserImporter(self.db, self.executor)
+        report = importer.import_rows(parse_rows(io.StringIO(NDJSON), "ndjson"))
+        self.assertEqual(report["created"], 1)
+        errors = {error["row"]: error["error"] for error in report["errors"]}
+        self.assertEqual(sorted(errors), [2, 3, 4, 5])
+        self.assertTrue(errors[2].startswith("Invalid JSON"))
+        self.assertEqual(errors[3], "Expected a JSON object")
+        self.assertEqual(errors[5], "Phone or email already registered")
+
+    def test_reports_only_the_first_errors(self):
+        importer = UserImporter(self.db, self.executor)
+        with mock.patch.object(user_import_service, "MAX_REPORTED_ERRORS", 2):
+            report = importer.import_rows(parse_rows(io.StringIO(CSV), "csv"))
+        self.assertEqual(report["failed"], 4)
+        self.assertEqual(len(report["errors"]), 2)
+
+    def test_hashes_on_spawned_processes(self):
+        with create_hashing_pool() as executor:
+            importer = UserImporter(self.db, executor)
+            report = importer.import_rows(
+                [(1, {"phone": "0700000001", "password": "secret"})]
+            )
+        self.assertEqual(report["created"], 1)
+
+
+class TestImportEndpoint(ImportTestCase):
+    def setUp(self):
+        super().setUp()
+        app = FastAPI()
+        app.include_router(user_routes.router, prefix="/api/v1")
+        app.dependency_overrides[database.get_db] = lambda: self.db
+        app.dependency_overrides[auth.get_current_user] = lambda: None
+        self.client = TestClient(app)
+        patcher = mock.patch.object(
+            user_routes, "get_hashing_pool", return_value=self.executor
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_streamed_csv(self):
+        response = self.client.post(
+            "/api/v1/users/import",
+            content=CSV.encode(),
+            headers={"Content-Type": "text/csv"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assert_csv_report(response.json())
+
+    def test_streamed_ndjson(self):
+        response = self.client.post("/api/v1/users/import", content=NDJSON.encode())
+        self.assertEqual(response.json()["created"], 1)
+        self.assertEqual(response.json()["failed"], 4)
+
+
+class TestImportCommand(ImportTestCase):
+    def test_reports_and_fails_on_rejected_rows(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as source:
+            source.write(CSV)
+        self.addCleanup(os.remove, source.name)
+        output = io.StringIO()
+        with mock.patch.object(
+            user_import_service.database, "SessionLocal", self.Session
+        ), mock.patch.object(
+            user_import_service, "create_hashing_pool", return_value=self.executor
+        ), redirect_stdout(output):
+            status = user_import_service.main([source.name, "--batch-size", "2"])
+        self.assertEqual(status, 1)
+        self.assert_csv_report(json.loads(output.getvalue()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+import auth
+import crud
+import database
+import models.user
+import schemas
+from config import settings
+from database_case import DatabaseTestCase
+from models.user import Hasher
+from routes import auth_routes, user_routes
+from throttle import SlidingWindowLimiter
+
+NEW_USER = {"phone": "0700000002", "email": "b@example.com", "password": "secret"}
+
+
+class TestPasswordHashingRoutes(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = crud.create_user(
+            self.db, schemas.UserCreate(phone="0700000001", password="secret")
+        )
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        limiter = SlidingWindowLimiter(os.path.join(directory.name, "t.db"), 60)
+        patcher = mock.patch.object(auth_routes, "login_limiter", limiter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        app = FastAPI()
+        app.include_router(auth_routes.router, prefix="/api/v1/auth")
+        app.include_router(user_routes.router, prefix="/api/v1")
+        app.dependency_overrides[database.get_db] = lambda: self.db
+        app.dependency_overrides[auth.get_current_user] = lambda: self.user
+        self.client = TestClient(app)
+
+    def saturated(self):
+        return mock.patch.object(
+            Hasher, "_pending", settings.PASSWORD_HASH_MAX_PENDING
+        )
+
+    def assert_retry_later(self, response):
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "1")
+
+    def test_saturated_pool_answers_503(self):
+        with self.saturated():
+            self.assert_retry_later(
+                self.client.post(
+                    "/api/v1/auth/login",
+                    data={"username": "0700000001", "password": "secret"},
+                )
+            )
+            self.assert_retry_later(
+                self.client.post("/api/v1/register", json=NEW_USER)
+            )
+            self.assert_retry_later(
+                self.client.put(
+                    f"/api/v1/users/{self.user.user_id}", json={"password": "new!"}
+                )
+            )
+        self.assertIsNone(crud.get_user_by_phone(self.db, "0700000002"))
+
+    def test_register_and_change_password(self):
+        response = self.client.post("/api/v1/register", json=NEW_USER)
+        self.assertEqual(response.status_code, 200)
+        user = crud.get_user_by_phone(self.db, "0700000002")
+        self.assertTrue(Hasher.verify_password("secret", user.password))
+
+        response = self.client.put(
+            f"/api/v1/users/{self.user.user_id}", json={"password": "changed"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.db.refresh(self.user)
+        self.assertTrue(Hasher.verify_password("changed", self.user.password))
+
+
+class TestReadUsers(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.db.add_all(
+            models.user.User(phone=f"07000000{i:02}", password="x") for i in range(5)
+        )
+        self.db.commit()
+
+        app = FastAPI()
+        app.include_router(user_routes.router, prefix="/api/v1")
+        app.dependency_overrides[database.get_db] = lambda: self.db
+        app.dependency_overrides[auth.get_current_user] = lambda: None
+        self.client = TestClient(app)
+
+    def test_pages_end_without_a_cursor(self):
+        phones, params = [], {"limit": 2}
+        while True:
+            response = self.client.get("/api/v1/users", params=params)
+            self.assertEqual(response.status_code, 200)
+            phones += [user["phone"] for user in response.json()]
+            if "X-Next-Cursor" not in response.headers:
+                break
+            params["cursor"] = response.headers["X-Next-Cursor"]
+        self.assertEqual(phones, [f"07000000{i:02}" for i in range(5)])
+
+    def test_exact_last_page_has_no_cursor(self):
+        response = self.client.get(
+            "/api/v1/users", params={"limit": 5, "include_total": True}
+        )
+        self.assertEqual(len(response.json()), 5)
+        self.assertNotIn("X-Next-Cursor", response.headers)
+        self.assertEqual(response.headers["X-Total-Count-Estimate"], "5")
+
+    def test_large_limits_are_accepted(self):
+        response = self.client.get("/api/v1/users", params={"limit": 5000})
+        self.assertEqual(response.status_code, 200)
+
+    def test_invalid_cursor_is_a_client_error(self):
+        response = self.client.get("/api/v1/users", params={"cursor": "tampered"})
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+import os
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+import database
+import models.location
+import models.weather
+from database_case import DatabaseTestCase
+from routes import weather_routes
+
+
+class TestWeatherRoutes(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        location = models.location.Location(
+            name="nairobi", city_name="Nairobi", latitude=-1.2833, longitude=36.8167
+        )
+        now = datetime.now()
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        # Six daily forecasts and a recent realtime reading, so that no
+        # upstream call is made.
+        periods = [
+            (today + timedelta(days=offset), now - timedelta(hours=1))
+            for offset in range(6)
+        ]
+        periods.append((now - timedelta(minutes=5), now - timedelta(minutes=1)))
+        for start, fetched in periods:
+            self.db.add(
+                models.weather.Weather_Forecast(
+                    location=location,
+                    date_time=fetched,
+                    start_time=start,
+                    end_time=start + timedelta(days=1),
+                    temperature=20,
+                    humidity=60,
+                    wind_speed=3,
+                    precipitation_probability=10,
+                )
+            )
+        self.db.commit()
+
+        app = FastAPI()
+        app.include_router(weather_routes.router, prefix="/api/v1")
+        app.dependency_overrides[database.get_db] = lambda: self.db
+        self.client = TestClient(app)
+
+    def assert_revalidates(self, path: str, **params) -> None:
+        params.setdefault("location_name", "nairobi")
+        first = self.client.get(path, params=params)
+        self.assertEqual(first.status_code, 200, path)
+        etag = first.headers["ETag"]
+        self.assertIn("max-age", first.headers["Cache-Control"])
+        second = self.client.get(path, params=params, headers={"If-None-Match": etag})
+        self.assertEqual(second.status_code, 304, path)
+        self.assertEqual(second.headers["ETag"], etag)
+        self.assertEqual(second.content, b"")
+        since = self.client.get(
+            path,
+            params=params,
+            headers={"If-Modified-Since": first.headers["Last-Modified"]},
+        )
+        self.assertEqual(since.status_code, 304, path)
+
+    def test_current_weather_revalidates(self):
+        self.assert_revalidates("/api/v1/current_weather")
+
+    def test_five_day_weather_revalidates(self):
+        self.assert_revalidates("/api/v1/five-day_weather")
+
+    def test_a_days_weather_revalidates(self):
+        tomorrow = (datetime.now() + timedelta(days=1)).date().isoformat()
+        self.assert_revalidates("/api/v1/a_days_weather", day=tomorrow)
+
+    def test_weather_and_recommendations_revalidates(self):
+        for forecast_type in ("current_weather", "five-day_weather"):
+            self.assert_revalidates(
+                f"/api/v1/weather_and_recommendations/{forecast_type}"
+            )
+
+    def test_variants_have_distinct_etags(self):
+        params = {"location_name": "nairobi"}
+        five_day = self.client.get("/api/v1/five-day_weather", params=params)
+        recommendations = self.client.get(
+            "/api/v1/weather_and_recommendations/five-day_weather", params=params
+        )
+        self.assertNotEqual(five_day.headers["ETag"], recommendations.headers["ETag"])
+
+    def test_malformed_location_is_a_client_error(self):
+        response = self.client.get(
+            "/api/v1/weather_and_recommendations/five-day_weather",
+            params={"location_name": "1,2,3"},
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_server_side_value_errors_are_server_errors(self):
+        with mock.patch.object(
+            weather_routes,
+            "build_forecast_recommendations",
+            side_effect=ValueError("bad forecast"),
+        ):
+            response = self.client.get(
+                "/api/v1/weather_and_recommendations/five-day_weather",
+                params={"location_name": "nairobi"},
+            )
+        self.assertEqual(response.status_code, 500)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+
+"""Module to throttle requests with sliding-window counters shared across workers."""
+
+import asyncio
+import logging
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def default_counters_path(name: str = "throttle") -> str:
+    """
+    Place the shared counters on tmpfs when available so they stay in memory.
+
+    Each limiter needs a file of its own, since its counters are cleaned up
+    by window number and limiters may use windows of different lengths.
+    """
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, f"forecast-planner-{name}.db")
+
+
+class SlidingWindowLimiter:
+    """
+    Limit the rate of events per key over a sliding window.
+
+    The sliding window is approximated from the counts of the current and
+    previous fixed windows, weighting the previous one by how much of it still
+    overlaps the sliding window. Counters live in a small SQLite database on
+    tmpfs, so every worker process on the host sees the same counts without
+    touching the application database.
+
+    The SQLite calls may wait on the other workers' transactions, so async
+    code uses `ahit` and `areset`, which run them on a thread. Counters older
+    than the previous window are deleted once per 16 windows by each worker.
+    """
+
+    def __init__(self, path: str, window_seconds: float):
+        self.path = path
+        self.window_seconds = window_seconds
+        self._connection: sqlite3.Connection | None = None
+        self._pid: int | None = None
+        # The connection is shared by the threads running `ahit` and `areset`.
+        self._lock = threading.Lock()
+        self._cleaned_bucket: int | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # A connection must not be shared with forked worker processes.
+        if self._connection is None or self._pid != os.getpid():
+            connection = sqlite3.connect(
+                self.path, timeout=1, isolation_level=None, check_same_thread=False
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS counters ("
+                "scope TEXT, key TEXT, bucket INTEGER, count INTEGER, "
+                "PRIMARY KEY (scope, key, bucket))"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS outcomes ("
+                "scope TEXT, outcome TEXT, count INTEGER, "
+                "PRIMARY KEY (scope, outcome))"
+            )
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    def hit(self, limits: list[tuple[str, str, int]]) -> int | None:
+        """
+        Record an event against several keys, unless one of them is over its limit.
+
+        Args:
+            limits (list[tuple[str, str, int]]): (scope, key, limit) triples,
+              e.g. [("phone", "0712345678", 5), ("ip", "10.0.0.1", 20)].
+
+        Returns:
+            int | None: None if the event is allowed, otherwise the number of
+              seconds after which it may be retried.
+        """
+        now = time.time()
+        bucket = int(now // self.window_seconds)
+        overlap = 1 - (now % self.window_seconds) / self.window_seconds
+        try:
+            with self._lock:
+                return self._hit(limits, bucket, overlap)
+        except sqlite3.Error as e:
+            # Fail open: a broken limiter must not lock every user out.
+            logger.error(f"Login throttle unavailable: {e}")
+        return None
+
+    async def ahit(self, limits: list[tuple[str, str, int]]) -> int | None:
+        """Record an event like `hit`, without blocking the event loop."""
+        return await asyncio.to_thread(self.hit, limits)
+
+    def _hit(
+        self, limits: list[tuple[str, str, int]], bucket: int, overlap: float
+    ) -> int | None:
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            for scope, key, limit in limits:
+                counts = dict(
+                    connection.execute(
+                        "SELECT bucket, count FROM counters "
+                        "WHERE scope = ? AND key = ? AND bucket >= ?",
+                        (scope, key, bucket - 1),
+                    ).fetchall()
+                )
+                estimate = counts.get(bucket - 1, 0) * overlap + counts.get(bucket, 0)
+                if estimate >= limit:
+                    self._count_outcome(connection, scope, "rejected")
+                    connection.execute("COMMIT")
+                    return math.ceil(self.window_seconds * overlap) or 1
+            for scope, key, _ in limits:
+                connection.execute(
+                    "INSERT INTO counters VALUES (?, ?, ?, 1) "
+                    "ON CONFLICT (scope, key, bucket) "
+                    "DO UPDATE SET count = count + 1",
+                    (scope, key, bucket),
+                )
+                self._count_outcome(connection, scope, "allowed")
+            cleanup = bucket % 16 == 0 and bucket != self._cleaned_bucket
+            if cleanup:
+                connection.execute(
+                    "DELETE FROM counters WHERE bucket < ?", (bucket - 1,)
+                )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        if cleanup:
+            self._cleaned_bucket = bucket
+        return None
+
+    def reset(self, scope: str, key: str) -> None:
+        """Forget the events recorded for a key."""
+        try:
+            with self._lock:
+                self._connect().execute(
+                    "DELETE FROM counters WHERE scope = ? AND key = ?", (scope, key)
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Login throttle unavailable: {e}")
+
+    async def areset(self, scope: str, key: str) -> None:
+        """Forget the events recorded for a key, without blocking the event loop."""
+        await asyncio.to_thread(self.reset, scope, key)
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """Report the allowed and rejected events per scope, across all workers."""
+        stats: dict[str, dict[str, int]] = {}
+        try:
+            with self._lock:
+                rows = self._connect().execute(
+                    "SELECT scope, outcome, count FROM outcomes"
+                ).fetchall()
+            for scope, outcome, count in rows:
+                stats.setdefault(scope, {})[outcome] = count
+        except sqlite3.Error as e:
+            logger.error(f"Login throttle unavailable: {e}")
+        return stats
+
+    @staticmethod
+    def _count_outcome(connection: sqlite3.Connection, scope: str, outcome: str):
+        connection.execute(
+            "INSERT INTO outcomes VALUES (?, ?, 1) "
+            "ON CONFLICT (scope, outcome) DO UPDATE SET count = count + 1",
+            (scope, outcome),
+        )
+
+
+login_limiter = SlidingWindowLimiter(
+    settings.LOGIN_THROTTLE_PATH or default_counters_path(),
+    settings.LOGIN_THROTTLE_WINDOW_SECONDS,
+)
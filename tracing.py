@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+
+"""Module to trace where the time of a request goes.
+
+`TracingMiddleware` opens a trace for every HTTP request, and functions
+decorated with `traced`, or blocks wrapped in `span`, record a span in it.
+The current trace and span are held in context variables, so spans nest
+across awaits and follow the request into threadpool calls. Outside of a
+request, spans cost a context variable lookup and record nothing.
+
+Every response carries a `Server-Timing` header with the total duration of
+each kind of span finished before the response started. Finished traces are
+exported by `export_periodically` when `TRACING_EXPORTER` is set:
+- "file" appends one JSON span per line to `TRACING_FILE`;
+- "otlp" posts OTLP/HTTP JSON to `TRACING_OTLP_ENDPOINT`, e.g.
+  "http://localhost:4318/v1/traces" for an OpenTelemetry collector.
+An incoming W3C `traceparent` header is continued rather than starting a new
+trace.
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import random
+import re
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator
+
+import httpx
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+@dataclass
+class Span:
+    """
+    A timed operation within a trace.
+
+    Attributes:
+        name (str): What was done, e.g. "query_tomorrow_io".
+        trace_id (str): The 32 hex digit trace identifier.
+        span_id (str): The 16 hex digit span identifier.
+        parent_id (str | None): The span this one ran within, if any.
+        start_ns (int): When the span started, in nanoseconds since the epoch.
+        end_ns (int): When the span ended, 0 while it is running.
+        attributes (dict): Details of the operation.
+        error (str | None): The exception that ended the span, if any.
+        server (bool): Whether the span is a whole request served by the app.
+    """
+
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    start_ns: int
+    end_ns: int = 0
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: str | None = None
+    server: bool = False
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+
+@dataclass
+class Trace:
+    """The spans recorded while serving a request, until it is closed."""
+
+    trace_id: str
+    spans: list[Span] = field(default_factory=list)
+    closed: bool = False
+
+
+_trace: ContextVar[Trace | None] = ContextVar("trace", default=None)
+_span: ContextVar[Span | None] = ContextVar("span", default=None)
+_pending: list[Span] = []
+
+
+def _new_id(digits: int) -> str:
+    return f"{random.getrandbits(digits * 4):0{digits}x}"
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span | None]:
+    """
+    Record a span around a block, when a trace is open.
+
+    Args:
+        name (str): What the block does.
+        **attributes: Details of the operation, exported with the span.
+
+    Yields:
+        Span | None: The span, to add attributes to, or None outside a trace,
+          including in tasks that outlive the request that started them.
+
+    Examples:
+        ```python
+        with span("build_response", periods=len(forecasts)):
+            ...
+        ```
+    """
+    trace = _trace.get()
+    if trace is None or trace.closed:
+        yield None
+        return
+    parent = _span.get()
+    current = Span(
+        name=name,
+        trace_id=trace.trace_id,
+        span_id=_new_id(16),
+        parent_id=parent.span_id if parent else None,
+        start_ns=time.time_ns(),
+        attributes=attributes,
+    )
+    token = _span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _span.reset(token)
+        trace.spans.append(current)
+
+
+def traced(name: str | None = None) -> Callable:
+    """Record a span around every call of the decorated function or coroutine."""
+
+    def decorate(function: Callable) -> Callable:
+        span_name = name or function.__name__
+        if asyncio.iscoroutinefunction(function):
+
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await function(*args, **kwargs)
+
+        else:
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with span(span_name):
+                    return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def server_timing(spans: list[Span], total_ms: float) -> str:
+    """
+    Summarize spans as a `Server-Timing` header value.
+
+    Spans of the same name are added up; nested spans overlap their parent.
+
+    Args:
+        spans (list[Span]): The finished spans.
+        total_ms (float): The duration of the whole request so far.
+
+    Returns:
+        str: e.g. "get_or_create_location;dur=1.2, total;dur=130.4".
+    """
+    durations: dict[str, float] = defaultdict(float)
+    for finished in spans:
+        durations[finished.name] += finished.duration_ms
+    entries = [f"{name};dur={duration:.1f}" for name, duration in durations.items()]
+    entries.append(f"total;dur={total_ms:.1f}")
+    return ", ".join(entries)
+
+
+class TracingMiddleware:
+    """Open a trace for every HTTP request and add its `Server-Timing` header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trace_id, parent_id = None, None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                match = _TRACEPARENT.match(value.decode("latin-1"))
+                if match:
+                    trace_id, parent_id = match.groups()
+                break
+        trace = Trace(trace_id or _new_id(32))
+        root = Span(
+            name="request",
+            trace_id=trace.trace_id,
+            span_id=_new_id(16),
+            parent_id=parent_id,
+            start_ns=time.time_ns(),
+            attributes={"http.method": scope["method"], "http.target": scope["path"]},
+            server=True,
+        )
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                root.attributes["http.status_code"] = message["status"]
+                timing = server_timing(
+                    trace.spans, (time.perf_counter() - started) * 1000
+                )
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"server-timing", timing.encode()),
+                ]
+            await send(message)
+
+        trace_token = _trace.set(trace)
+        span_token = _span.set(root)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        except BaseException as e:
+            root.error = type(e).__name__
+            raise
+        finally:
+            root.end_ns = time.time_ns()
+            trace.closed = True
+            _span.reset(span_token)
+            _trace.reset(trace_token)
+            route = scope.get("route")
+            if route is not None:
+                root.name = f"{scope['method']} {route.path}"
+            if settings.TRACING_EXPORTER:
+                _pending.extend(trace.spans)
+                _pending.append(root)
+                # Drop the oldest spans rather than grow without bound.
+                del _pending[: max(0, len(_pending) - settings.TRACING_MAX_PENDING)]
+
+
+def span_to_dict(finished: Span) -> dict:
+    """Serialize a span for the file exporter."""
+    return {
+        "name": finished.name,
+        "trace_id": finished.trace_id,
+        "span_id": finished.span_id,
+        "parent_id": finished.parent_id,
+        "start_ns": finished.start_ns,
+        "duration_ms": round(finished.duration_ms, 3),
+        "attributes": finished.attributes,
+        "error": finished.error,
+    }
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(spans: list[Span]) -> dict:
+    """Build an OTLP/HTTP JSON export request for spans."""
+    otlp_spans = []
+    for finished in spans:
+        otlp_span = {
+            "traceId": finished.trace_id,
+            "spanId": finished.span_id,
+            "name": finished.name,
+            # 2 is a server span, 1 an internal one.
+            "kind": 2 if finished.server else 1,
+            "startTimeUnixNano": str(finished.start_ns),
+            "endTimeUnixNano": str(finished.end_ns),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)}
+                for key, value in finished.attributes.items()
+            ],
+            # 2 is an error status, 0 an unset one.
+            "status": {"code": 2, "message": finished.error}
+            if finished.error
+            else {"code": 0},
+        }
+        if finished.parent_id:
+            otlp_span["parentSpanId"] = finished.parent_id
+        otlp_spans.append(otlp_span)
+    resource = [
+        {"key": "service.name", "value": {"stringValue": settings.TRACING_SERVICE_NAME}}
+    ]
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": resource},
+                "scopeSpans": [{"scope": {"name": __name__}, "spans": otlp_spans}],
+            }
+        ]
+    }
+
+
+async def export_pending() -> int:
+    """
+    Export the spans of the finished requests.
+
+    Returns:
+        int: The number of spans exported.
+    """
+    spans = _pending[:]
+    del _pending[: len(spans)]
+    if not spans:
+        return 0
+    if settings.TRACING_EXPORTER == "file":
+        lines = "".join(json.dumps(span_to_dict(s)) + "\n" for s in spans)
+
+        def append():
+            with open(settings.TRACING_FILE, "a") as file:
+                file.write(lines)
+
+        await asyncio.to_thread(append)
+    elif settings.TRACING_EXPORTER == "otlp":
+        async with httpx.AsyncClient(timeout=10) as client:
+            response = await client.post(
+                settings.TRACING_OTLP_ENDPOINT, json=to_otlp(spans)
+            )
+        response.raise_for_status()
+    return len(spans)
+
+
+async def export_periodically() -> None:
+    """Export the pending spans every `TRACING_EXPORT_INTERVAL_SECONDS`."""
+    while True:
+        await asyncio.sleep(settings.TRACING_EXPORT_INTERVAL_SECONDS)
+        try:
+            await export_pending()
+        except (OSError, httpx.HTTPError) as e:
+            logger.error(f"Could not export traces: {e}")